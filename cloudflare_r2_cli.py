@@ -0,0 +1,435 @@
+"""Cloudflare R2 命令行工具
+
+不导入 PyQt6，直接复用 cloudflare_r2_core 中的上传、分片上传、下载、列表和同步引擎，
+可以在 CI 等没有图形界面的环境中使用。进度和结果以 JSON Lines 写到标准输出，每行一个事件。
+
+用法:
+    python -m cloudflare_r2_cli [--config 配置文件] [--bucket 存储桶] 命令 ...
+
+    ls   [前缀] [-r]                      列出目录，-r 递归列出全部对象
+    put  本地路径 [对象键或目录/]            上传文件或文件夹
+    get  对象键或目录/ [本地路径]            下载对象或整个目录
+    sync 本地文件夹 目录/ [--delete]        只上传新增或变化的文件，可删除远端多余文件
+    rm   对象键或目录/ ... [-r]             删除对象，-r 删除目录下的全部对象
+    du   [前缀]                           统计对象数和总大小
+
+凭证优先读取环境变量 R2_ENDPOINT_URL、R2_ACCESS_KEY_ID、R2_ACCESS_KEY_SECRET 和 R2_BUCKET，
+未设置时使用图形界面的配置文件 cloudflare_r2_manager.json。
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cloudflare_r2_core import (
+    MULTIPART_THRESHOLD, DEFAULT_PART_CONCURRENCY, DEFAULT_PART_MEMORY_LIMIT, DEFAULT_FILE_CONCURRENCY,
+    DEFAULT_DOWNLOAD_CONCURRENCY, DEFAULT_DELETE_CONCURRENCY, DEFAULT_LIST_CONCURRENCY,
+    format_size, local_path_for_key, etag_matches, HashCache, delete_keys_batched, BandwidthLimiter,
+    RangedDownloader, TransferTelemetry, S3ClientRegistry, DirectoryListing, iter_directory_pages,
+    iter_bucket_pages, plan_folder_sync, UploadJournal, MultipartUploader
+)
+
+DEFAULT_PROGRESS_INTERVAL = 1.0  # 默认每隔多少秒输出一次进度事件
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class EventWriter:
+    """把事件逐行写成 JSON，可在多个线程中调用"""
+
+    def __init__(self, stream=sys.stdout):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def emit(self, event, **fields):
+        line = json.dumps(dict(event=event, **fields), ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+class TransferRunner:
+    """在有界线程池中执行一组文件传输
+
+    每个任务为 (名称, 字节数, 函数)，函数接收进度回调，返回 False 表示已跳过；
+    传输字节计入 TransferTelemetry，按固定间隔输出一次汇总进度。
+    """
+
+    def __init__(self, events, max_workers=DEFAULT_FILE_CONCURRENCY, interval=DEFAULT_PROGRESS_INTERVAL,
+                 limiter=None):
+        self.events = events
+        self.max_workers = max(1, max_workers)
+        self.interval = interval
+        self.limiter = limiter
+        self.telemetry = TransferTelemetry()
+
+    def run(self, label, tasks, done_event):
+        """执行全部任务，返回 (完成数, 跳过数, [(名称, 错误)])"""
+        self.telemetry.begin_group(label, label, sum(size for _, size, _ in tasks))
+        stop = threading.Event()
+        reporter = threading.Thread(target=self._report, args=(stop,), daemon=True)
+        reporter.start()
+
+        completed, skipped, errors = 0, 0, []
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {executor.submit(self._run_one, label, task): task for task in tasks}
+                for future in as_completed(futures):
+                    name, size, _ = futures[future]
+                    try:
+                        if future.result() is False:
+                            skipped += 1
+                            self.events.emit('skipped', key=name, size=size)
+                        else:
+                            completed += 1
+                            self.events.emit(done_event, key=name, size=size)
+                    except Exception as e:
+                        errors.append((name, str(e)))
+                        self.events.emit('error', key=name, message=str(e))
+        finally:
+            stop.set()
+            reporter.join()
+            self.telemetry.end_group(label)
+            self._emit_progress()
+        return completed, skipped, errors
+
+    def _run_one(self, label, task):
+        name, size, function = task
+
+        def callback(bytes_amount):
+            self.telemetry.add(task, bytes_amount)
+            return True
+
+        self.telemetry.begin(task, label, name, size)
+        try:
+            return function(callback)
+        finally:
+            self.telemetry.end(task)
+
+    def _report(self, stop):
+        while not stop.wait(self.interval):
+            self._emit_progress()
+
+    def _emit_progress(self):
+        for progress in self.telemetry.sample().values():
+            self.events.emit(
+                'progress',
+                label=progress.label,
+                transferred=progress.transferred,
+                total=progress.total,
+                percent=progress.percentage,
+                speed=int(progress.speed),
+                eta=None if progress.eta is None else round(progress.eta, 1)
+            )
+
+class R2Cli:
+    """各子命令的实现，共用一个 S3 客户端、限速和配置"""
+
+    def __init__(self, args, events):
+        self.args = args
+        self.events = events
+        self.config = self._load_config(args.config)
+        self.bucket_name, bucket_config = self._resolve_bucket(args.bucket)
+        credentials = [
+            os.environ.get(env) or bucket_config.get(field) or self.config.get(field)
+            for env, field in (('R2_ENDPOINT_URL', 'endpoint_url'),
+                               ('R2_ACCESS_KEY_ID', 'access_key_id'),
+                               ('R2_ACCESS_KEY_SECRET', 'access_key_secret'))
+        ]
+        if not all(credentials):
+            raise Exception("缺少必需的R2凭证配置")
+
+        self.jobs = args.jobs or int(self.config.get('file_concurrency', DEFAULT_FILE_CONCURRENCY))
+        self.part_concurrency = int(self.config.get('part_concurrency', DEFAULT_PART_CONCURRENCY))
+        self.s3_client = S3ClientRegistry(
+            max(10, self.jobs * self.part_concurrency + DEFAULT_LIST_CONCURRENCY)
+        ).get(*credentials)
+
+        limit_mb = args.limit if args.limit is not None else float(self.config.get('bandwidth_limit_mb', 0))
+        self.limiter = BandwidthLimiter(int(limit_mb * 1024 * 1024)) if limit_mb > 0 else None
+        self.runner = TransferRunner(events, self.jobs, args.progress_interval, self.limiter)
+
+    def _load_config(self, config_path):
+        if not os.path.exists(config_path):
+            return {}
+        with open(config_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _resolve_bucket(self, bucket):
+        """按存储桶标识查找配置；不在配置中时视为实际的存储桶名称，未指定时使用第一个存储桶"""
+        buckets = self.config.get('buckets', {})
+        bucket = bucket or os.environ.get('R2_BUCKET')
+        if bucket is None:
+            if not buckets:
+                raise Exception("未指定存储桶，请使用 --bucket 或设置 R2_BUCKET")
+            bucket = next(iter(buckets))
+        if bucket in buckets:
+            return buckets[bucket]['bucket_name'], buckets[bucket]
+        return bucket, {}
+
+    def _list_objects(self, prefix):
+        """列出前缀下的全部对象"""
+        objects = []
+        for contents in iter_bucket_pages(
+                self.s3_client, self.bucket_name, prefix,
+                int(self.config.get('list_concurrency', DEFAULT_LIST_CONCURRENCY))):
+            objects.extend(contents)
+        return objects
+
+    def ls(self):
+        prefix = self.args.prefix.lstrip('/')
+        count = 0
+        if self.args.recursive:
+            for contents in iter_bucket_pages(
+                    self.s3_client, self.bucket_name, prefix,
+                    int(self.config.get('list_concurrency', DEFAULT_LIST_CONCURRENCY))):
+                for obj in contents:
+                    count += 1
+                    self.events.emit('entry', type='file', key=obj['Key'], size=obj['Size'],
+                                     modified=obj['LastModified'].isoformat(), etag=obj['ETag'].strip('"'))
+        else:
+            listing = DirectoryListing(prefix)
+            for page in iter_directory_pages(self.s3_client, self.bucket_name, prefix):
+                for name, key, size, mtime, is_dir, etag in listing.parse_page(page):
+                    count += 1
+                    if is_dir:
+                        self.events.emit('entry', type='dir', key=key)
+                    else:
+                        self.events.emit('entry', type='file', key=key, size=size,
+                                         modified=datetime.fromtimestamp(mtime, timezone.utc).isoformat(),
+                                         etag=etag)
+        self.events.emit('summary', command='ls', prefix=prefix, entries=count)
+        return 0
+
+    def _upload_task(self, local_path, key, journal):
+        size = os.path.getsize(local_path)
+
+        def upload(callback):
+            if size > MULTIPART_THRESHOLD:
+                memory_limit_mb = int(self.config.get('part_memory_limit_mb',
+                                                      DEFAULT_PART_MEMORY_LIMIT // 1024 // 1024))
+                MultipartUploader(
+                    self.s3_client,
+                    self.bucket_name,
+                    key,
+                    local_path,
+                    max_concurrency=self.part_concurrency,
+                    max_memory=max(1, memory_limit_mb) * 1024 * 1024,
+                    journal=journal,
+                    limiter=self.limiter
+                ).upload(callback)
+            else:
+                def throttled(bytes_amount):
+                    if self.limiter:
+                        self.limiter.consume(bytes_amount)
+                    return callback(bytes_amount)
+                self.s3_client.upload_file(local_path, self.bucket_name, key, Callback=throttled)
+
+        return key, size, upload
+
+    def _upload(self, label, items):
+        """上传 [(本地路径, 对象键)]，返回 (完成数, 跳过数, 错误)"""
+        # 与图形界面共用断点记录（SQLite，可同时运行），中断的分片上传可以在任一端继续
+        journal = UploadJournal(os.path.join(SCRIPT_DIR, "cloudflare_r2_manager_uploads.db"),
+                                os.path.join(SCRIPT_DIR, "cloudflare_r2_manager_uploads.json"))
+        try:
+            tasks = []
+            errors = []
+            for local_path, key in items:
+                try:
+                    tasks.append(self._upload_task(local_path, key, journal))
+                except OSError as e:
+                    errors.append((key, str(e)))
+                    self.events.emit('error', key=key, message=str(e))
+            completed, skipped, upload_errors = self.runner.run(label, tasks, 'uploaded')
+        finally:
+            journal.close()
+        return completed, skipped, errors + upload_errors
+
+    def put(self):
+        local_path = self.args.local
+        remote = self.args.remote.lstrip('/')
+        if os.path.isdir(local_path):
+            prefix = remote if remote else os.path.basename(os.path.normpath(local_path)) + '/'
+            prefix = prefix if prefix.endswith('/') else prefix + '/'
+            items = []
+            for root, _, files in os.walk(local_path):
+                for file in files:
+                    path = os.path.join(root, file)
+                    items.append((path, f"{prefix}{os.path.relpath(path, local_path)}".replace('\\', '/')))
+        elif os.path.isfile(local_path):
+            key = remote if remote and not remote.endswith('/') else remote + os.path.basename(local_path)
+            items = [(local_path, key)]
+        else:
+            raise Exception(f"本地路径不存在: {local_path}")
+
+        completed, _, errors = self._upload(local_path, items)
+        self.events.emit('summary', command='put', uploaded=completed, failed=len(errors))
+        return 1 if errors else 0
+
+    def get(self):
+        remote = self.args.remote.lstrip('/')
+        download_concurrency = int(self.config.get('download_concurrency', DEFAULT_DOWNLOAD_CONCURRENCY))
+        hash_cache = HashCache(os.path.join(SCRIPT_DIR, "cloudflare_r2_manager_hashes.db"))
+
+        def download_task(key, local_path, size, etag, max_concurrency):
+            def download(callback):
+                if key.endswith('/'):
+                    os.makedirs(local_path, exist_ok=True)
+                    return False
+                if os.path.isfile(local_path) and os.path.getsize(local_path) == size:
+                    md5, multipart_etag = hash_cache.get_hashes([local_path])[os.path.abspath(local_path)]
+                    if etag_matches(md5, multipart_etag, etag):
+                        return False
+                os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+                RangedDownloader(
+                    self.s3_client, self.bucket_name, key, local_path,
+                    max_concurrency=max_concurrency, limiter=self.limiter
+                ).download(callback, head={'ContentLength': size, 'ETag': etag})
+            return key, size, download
+
+        try:
+            if remote.endswith('/') or self.args.recursive:
+                prefix = remote if remote.endswith('/') or not remote else remote + '/'
+                local_folder = self.args.local or '.'
+                tasks = []
+                for obj in self._list_objects(prefix):
+                    local_path = local_path_for_key(local_folder, prefix, obj['Key'])
+                    tasks.append(download_task(obj['Key'], local_path, obj['Size'], obj['ETag'], 1))
+            else:
+                head = self.s3_client.head_object(Bucket=self.bucket_name, Key=remote)
+                local_path = self.args.local or os.path.basename(remote)
+                if os.path.isdir(local_path):
+                    local_path = os.path.join(local_path, os.path.basename(remote))
+                tasks = [download_task(remote, local_path, head['ContentLength'], head['ETag'],
+                                       download_concurrency)]
+            completed, skipped, errors = self.runner.run(remote or '/', tasks, 'downloaded')
+        finally:
+            hash_cache.close()
+        self.events.emit('summary', command='get', downloaded=completed, skipped=skipped, failed=len(errors))
+        return 1 if errors else 0
+
+    def sync(self):
+        local_folder = self.args.local
+        if not os.path.isdir(local_folder):
+            raise Exception(f"本地文件夹不存在: {local_folder}")
+        prefix = self.args.remote.strip('/')
+        prefix = prefix + '/' if prefix else ''
+
+        hash_cache = HashCache(os.path.join(SCRIPT_DIR, "cloudflare_r2_manager_hashes.db"))
+        try:
+            plan = plan_folder_sync(
+                self.s3_client, self.bucket_name, local_folder, prefix, self.args.delete, hash_cache)
+        finally:
+            hash_cache.close()
+        self.events.emit('plan', new=plan.new_files, changed=plan.changed_files,
+                         unchanged=len(plan.skipped), extra=len(plan.to_delete))
+
+        completed, _, errors = self._upload(local_folder, plan.to_upload)
+        deleted = []
+        if plan.to_delete:
+            if errors:
+                self.events.emit('warning', message='存在上传失败，跳过删除远端多余文件')
+            else:
+                deleted, delete_errors = delete_keys_batched(
+                    self.s3_client, self.bucket_name, plan.to_delete,
+                    max_concurrency=int(self.config.get('delete_concurrency', DEFAULT_DELETE_CONCURRENCY))
+                )
+                for key in deleted:
+                    self.events.emit('deleted', key=key)
+                for key, error in delete_errors:
+                    self.events.emit('error', key=key, message=error)
+                errors += delete_errors
+        self.events.emit('summary', command='sync', uploaded=completed, unchanged=len(plan.skipped),
+                         deleted=len(deleted), failed=len(errors))
+        return 1 if errors else 0
+
+    def rm(self):
+        keys = []
+        for target in self.args.keys:
+            target = target.lstrip('/')
+            if target.endswith('/') or self.args.recursive:
+                prefix = target if target.endswith('/') or not target else target + '/'
+                keys.extend(obj['Key'] for obj in self._list_objects(prefix))
+            else:
+                keys.append(target)
+
+        deleted, errors = delete_keys_batched(
+            self.s3_client, self.bucket_name, keys,
+            max_concurrency=int(self.config.get('delete_concurrency', DEFAULT_DELETE_CONCURRENCY))
+        )
+        for key in deleted:
+            self.events.emit('deleted', key=key)
+        for key, error in errors:
+            self.events.emit('error', key=key, message=error)
+        self.events.emit('summary', command='rm', deleted=len(deleted), failed=len(errors))
+        return 1 if errors else 0
+
+    def du(self):
+        prefix = self.args.prefix.lstrip('/')
+        objects, total_bytes = 0, 0
+        for contents in iter_bucket_pages(
+                self.s3_client, self.bucket_name, prefix,
+                int(self.config.get('list_concurrency', DEFAULT_LIST_CONCURRENCY))):
+            objects += len(contents)
+            total_bytes += sum(obj['Size'] for obj in contents)
+        self.events.emit('summary', command='du', prefix=prefix, objects=objects, bytes=total_bytes,
+                         size=format_size(total_bytes))
+        return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m cloudflare_r2_cli',
+        description='Cloudflare R2 命令行工具，进度和结果以 JSON Lines 输出'
+    )
+    parser.add_argument('--config', default=os.path.join(SCRIPT_DIR, "cloudflare_r2_manager.json"),
+                        help='配置文件路径，默认使用图形界面的 cloudflare_r2_manager.json')
+    parser.add_argument('--bucket', help='存储桶标识（配置中的名称）或实际的存储桶名称，默认使用第一个存储桶')
+    parser.add_argument('--jobs', type=int, help='同时传输的文件数，默认使用配置中的 file_concurrency')
+    parser.add_argument('--limit', type=float, help='限速（MB/s），0 表示不限速，默认使用配置中的 bandwidth_limit_mb')
+    parser.add_argument('--progress-interval', type=float, default=DEFAULT_PROGRESS_INTERVAL,
+                        help='输出进度事件的间隔（秒）')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ls_parser = commands.add_parser('ls', help='列出目录')
+    ls_parser.add_argument('prefix', nargs='?', default='')
+    ls_parser.add_argument('-r', '--recursive', action='store_true', help='递归列出全部对象')
+
+    put_parser = commands.add_parser('put', help='上传文件或文件夹')
+    put_parser.add_argument('local')
+    put_parser.add_argument('remote', nargs='?', default='', help='对象键，或以 / 结尾的目标目录')
+
+    get_parser = commands.add_parser('get', help='下载对象或目录')
+    get_parser.add_argument('remote', help='对象键，或以 / 结尾的目录')
+    get_parser.add_argument('local', nargs='?', help='保存路径，下载目录时为保存位置')
+    get_parser.add_argument('-r', '--recursive', action='store_true', help='把 remote 作为目录下载')
+
+    sync_parser = commands.add_parser('sync', help='把本地文件夹同步到目录')
+    sync_parser.add_argument('local')
+    sync_parser.add_argument('remote')
+    sync_parser.add_argument('--delete', action='store_true', help='删除远端多余的文件')
+
+    rm_parser = commands.add_parser('rm', help='删除对象')
+    rm_parser.add_argument('keys', nargs='+')
+    rm_parser.add_argument('-r', '--recursive', action='store_true', help='删除目录下的全部对象')
+
+    du_parser = commands.add_parser('du', help='统计对象数和总大小')
+    du_parser.add_argument('prefix', nargs='?', default='')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    events = EventWriter()
+    try:
+        cli = R2Cli(args, events)
+        return getattr(cli, args.command)()
+    except KeyboardInterrupt:
+        events.emit('error', message='已中断')
+        return 130
+    except Exception as e:
+        events.emit('error', message=str(e))
+        return 1
+
+if __name__ == '__main__':
+    sys.exit(main())
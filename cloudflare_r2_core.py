@@ -0,0 +1,2326 @@
+"""Cloudflare R2 存储管理器的传输引擎
+
+不依赖 PyQt6：上传（含并发分片上传和断点续传）、分段下载、列表、同步计划、服务端复制、
+批量删除、限速和持久化记录都在这里实现，由图形界面 cloudflare_r2_manager.py
+和命令行工具 cloudflare_r2_cli.py 共用。
+"""
+import os
+import warnings
+import urllib3
+import boto3
+from botocore.config import Config
+import json
+import time
+import math
+import bisect
+import threading
+import re
+import datetime
+import hashlib
+import sqlite3
+import gzip
+import io
+import csv
+from array import array
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from botocore.exceptions import ClientError
+
+# 禁用 SSL 警告
+warnings.filterwarnings('ignore', category=urllib3.exceptions.InsecureRequestWarning)
+
+# 分片上传参数
+MULTIPART_THRESHOLD = 50 * 1024 * 1024  # 大于50MB使用分片上传
+MULTIPART_CHUNK_SIZE = 20 * 1024 * 1024  # 20MB
+DEFAULT_PART_CONCURRENCY = 4  # 默认同时上传的分片数
+DEFAULT_PART_MEMORY_LIMIT = 256 * 1024 * 1024  # 默认在途分片占用内存上限
+DEFAULT_FILE_CONCURRENCY = 8  # 默认同时上传的文件数
+DOWNLOAD_CHUNK_SIZE = 16 * 1024 * 1024  # 分段下载时每个 Range 请求的大小
+DOWNLOAD_STREAM_SIZE = 1024 * 1024  # 流式写入磁盘时每次读取的字节数
+DEFAULT_DOWNLOAD_CONCURRENCY = 4  # 默认同时下载的分段数
+DELETE_BATCH_SIZE = 1000  # delete_objects 单次请求最多删除的对象数
+DEFAULT_DELETE_CONCURRENCY = 4  # 默认同时进行的批量删除请求数
+COPY_OBJECT_MAX_SIZE = 5 * 1024 * 1024 * 1024  # copy_object 单次可复制的最大对象大小
+COPY_PART_SIZE = 512 * 1024 * 1024  # 大对象服务端分片复制时每个分片的大小
+MAX_UPLOAD_PARTS = 10000  # 分片上传最多的分片数
+DEFAULT_COPY_CONCURRENCY = 16  # 移动或复制时默认同时复制的对象数
+DEFAULT_COPY_PART_CONCURRENCY = 8  # 大对象服务端复制时默认同时复制的分片数
+DEFAULT_MIGRATION_CONCURRENCY = 8  # 跨存储桶迁移时默认同时复制的对象数
+DEFAULT_LISTING_CACHE_TTL = 300  # 目录列表缓存的默认有效期（秒）
+BOTO3_MULTIPART_THRESHOLD = 8 * 1024 * 1024  # 达到此大小时 boto3 upload_file 使用分片上传
+BOTO3_MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024  # boto3 upload_file 默认的分片大小
+HASH_READ_SIZE = 1024 * 1024  # 计算哈希时每次读取的字节数
+SEARCH_PAGE_SIZE = 1000  # 搜索结果每页的行数
+DEFAULT_LIST_CONCURRENCY = 8  # 遍历整个存储桶时默认同时进行的列表请求数
+SHARD_KEY_DIGITS = 8  # 计算键范围拆分点时使用的前缀字符数
+TELEMETRY_SMOOTHING = 0.3  # 传输速度指数平滑系数，越大越跟随瞬时速度
+WARM_UP_CONNECTIONS = 4  # 选择存储桶时预先建立的连接数
+BANDWIDTH_BURST_SECONDS = 1.0  # 限速时允许的突发量，相当于按限速传输多少秒的数据
+BANDWIDTH_WAIT_SLICE = 0.1  # 等待令牌时每次休眠的最长时间（秒），以便及时响应限速调整
+
+def format_size(size_in_bytes):
+    """格式化文件大小"""
+    try:
+        # 定义单位和转换基数
+        units = ['B', 'KB', 'MB', 'GB', 'TB']
+        base = 1024
+        
+        # 如果小于1024字节，直接返回字节大小
+        if size_in_bytes < base:
+            return f"{size_in_bytes:.2f} B"
+        
+        # 计算合适的单位级别
+        exp = int(math.log(size_in_bytes, base))
+        if exp >= len(units):
+            exp = len(units) - 1
+            
+        # 计算最终大小
+        final_size = size_in_bytes / (base ** exp)
+        return f"{final_size:.2f} {units[exp]}"
+        
+    except Exception as e:
+        return "计算错误"
+
+def format_duration(seconds):
+    """格式化剩余时间，未知时返回 --"""
+    if seconds is None:
+        return "--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}小时{seconds % 3600 // 60}分"
+    if seconds >= 60:
+        return f"{seconds // 60}分{seconds % 60}秒"
+    return f"{seconds}秒"
+
+def etag_part_size(file_size):
+    """返回本工具上传该大小文件时使用的分片大小，单次上传返回 None"""
+    if file_size > MULTIPART_THRESHOLD:
+        return MULTIPART_CHUNK_SIZE  # MultipartUploader
+    if file_size >= BOTO3_MULTIPART_THRESHOLD:
+        return BOTO3_MULTIPART_CHUNK_SIZE  # boto3 upload_file
+    return None
+
+def calculate_file_hashes(file_path, part_size=None):
+    """读取一遍文件，同时计算整体 MD5 和分片上传的 ETag
+
+    part_size 为 None 时按本工具上传该大小文件时使用的分片大小计算。
+    返回 (路径, 大小, mtime_ns, inode, MD5, 分片ETag)，单次上传的文件分片ETag为 None。
+    该函数会在子进程中执行，必须保持为模块级函数。
+    """
+    stat = os.stat(file_path)
+    part_size = part_size or etag_part_size(stat.st_size)
+    whole_md5 = hashlib.md5()
+    part_digests = []
+    part_md5 = hashlib.md5()
+    part_filled = 0
+
+    with open(file_path, 'rb') as f:
+        for data in iter(lambda: f.read(HASH_READ_SIZE), b''):
+            whole_md5.update(data)
+            if part_size is None:
+                continue
+            # 按分片边界切分数据
+            view = memoryview(data)
+            while view:
+                take = min(len(view), part_size - part_filled)
+                part_md5.update(view[:take])
+                part_filled += take
+                view = view[take:]
+                if part_filled == part_size:
+                    part_digests.append(part_md5.digest())
+                    part_md5 = hashlib.md5()
+                    part_filled = 0
+
+    multipart_etag = None
+    if part_size is not None:
+        if part_filled:
+            part_digests.append(part_md5.digest())
+        multipart_etag = f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+    return (file_path, stat.st_size, stat.st_mtime_ns, stat.st_ino,
+            whole_md5.hexdigest(), multipart_etag)
+
+def etag_matches(md5, multipart_etag, remote_etag):
+    """比较本地哈希与远端对象的 ETag"""
+    remote_etag = remote_etag.strip('"')
+    if '-' in remote_etag:
+        return multipart_etag == remote_etag
+    return md5 == remote_etag
+
+class HashCache:
+    """本地文件哈希缓存
+
+    使用 SQLite 按 (路径, 大小, mtime_ns, inode) 缓存文件的 MD5 和分片 ETag，
+    文件未变化时无需再次读取；未命中的文件使用进程池并行计算。
+    """
+
+    # 未命中文件少于该数量时直接在当前进程计算，避免启动进程池的开销
+    PARALLEL_MIN_FILES = 4
+
+    def __init__(self, db_path=':memory:', max_workers=None):
+        self.db_path = db_path
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                inode INTEGER NOT NULL,
+                md5 TEXT NOT NULL,
+                multipart_etag TEXT
+            )"""
+        )
+        self.conn.commit()
+
+    def _lookup(self, file_path, stat):
+        """查询缓存，文件属性不一致时视为未命中"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT md5, multipart_etag FROM file_hashes "
+                "WHERE path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+                (file_path, stat.st_size, stat.st_mtime_ns, stat.st_ino)
+            ).fetchone()
+        return row
+
+    def _store(self, results):
+        """写入新计算的哈希"""
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO file_hashes "
+                "(path, size, mtime_ns, inode, md5, multipart_etag) VALUES (?, ?, ?, ?, ?, ?)",
+                results
+            )
+            self.conn.commit()
+
+    def get_hashes(self, file_paths):
+        """返回 {路径: (MD5, 分片ETag)}，未命中的文件并行计算后写入缓存"""
+        hashes = {}
+        missing = []
+        for file_path in file_paths:
+            file_path = os.path.abspath(file_path)
+            row = self._lookup(file_path, os.stat(file_path))
+            if row:
+                hashes[file_path] = row
+            else:
+                missing.append(file_path)
+
+        if not missing:
+            return hashes
+
+        if len(missing) < self.PARALLEL_MIN_FILES or self.max_workers == 1:
+            results = [calculate_file_hashes(file_path) for file_path in missing]
+        else:
+            with ProcessPoolExecutor(max_workers=min(self.max_workers, len(missing))) as executor:
+                results = list(executor.map(calculate_file_hashes, missing, chunksize=8))
+
+        self._store(results)
+        for file_path, _, _, _, md5, multipart_etag in results:
+            hashes[file_path] = (md5, multipart_etag)
+        return hashes
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+def delete_keys_batched(s3_client, bucket_name, keys, batch_size=DELETE_BATCH_SIZE,
+                        max_concurrency=DEFAULT_DELETE_CONCURRENCY, progress_callback=None):
+    """使用 delete_objects 批量删除对象，多个批次并发执行
+
+    keys 可以是任意可迭代对象（例如边列出边产生的键）。
+    progress_callback(已删除数) 返回 False 时停止提交新的批次。
+    返回 ([成功删除的键], [(键, 错误信息)])
+    """
+    deleted_keys = []
+    errors = []
+    cancelled = False
+
+    def delete_batch(batch_keys):
+        try:
+            response = s3_client.delete_objects(
+                Bucket=bucket_name,
+                Delete={'Objects': [{'Key': key} for key in batch_keys], 'Quiet': True}
+            )
+        except Exception as e:
+            # 整个请求失败时该批次所有键都记为失败
+            return [], [(key, str(e)) for key in batch_keys]
+        batch_errors = [
+            (error['Key'], f"{error.get('Code', '')} {error.get('Message', '')}".strip())
+            for error in response.get('Errors', [])
+        ]
+        failed_keys = {key for key, _ in batch_errors}
+        return [key for key in batch_keys if key not in failed_keys], batch_errors
+
+    def collect(done):
+        nonlocal cancelled
+        for future in done:
+            batch_deleted, batch_errors = future.result()
+            deleted_keys.extend(batch_deleted)
+            errors.extend(batch_errors)
+        if progress_callback and progress_callback(len(deleted_keys)) is False:
+            cancelled = True
+
+    pending = set()
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        batch_keys = []
+        for key in keys:
+            batch_keys.append(key)
+            if len(batch_keys) < batch_size:
+                continue
+            while len(pending) >= max_concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            if cancelled:
+                batch_keys = []
+                break
+            pending.add(executor.submit(delete_batch, batch_keys))
+            batch_keys = []
+
+        if batch_keys and not cancelled:
+            pending.add(executor.submit(delete_batch, batch_keys))
+        done, _ = wait(pending)
+        collect(done)
+
+    return deleted_keys, errors
+
+def object_content_args(response):
+    """从 head_object/get_object 结果中取出复制时需要保留的 Content-Type 和自定义元数据"""
+    args = {'Metadata': response.get('Metadata', {})}
+    if response.get('ContentType'):
+        args['ContentType'] = response['ContentType']
+    return args
+
+def is_access_denied(error):
+    """ClientError 是否表示没有权限，HEAD 请求没有响应体，只能得到 403 状态码"""
+    code = error.response.get('Error', {}).get('Code')
+    return code in ('AccessDenied', '403', 'Forbidden')
+
+def copy_object_server_side(s3_client, source_bucket, source_key, dest_bucket, dest_key, size=None,
+                            max_concurrency=DEFAULT_COPY_PART_CONCURRENCY):
+    """在服务端复制一个对象，数据不经过本机
+
+    不超过 5GB 的对象使用一次 copy_object；更大的对象创建分片上传，按范围并发 upload_part_copy，
+    并保留原对象的 Content-Type 和自定义元数据。
+    """
+    copy_source = {'Bucket': source_bucket, 'Key': source_key}
+    if size is not None and size <= COPY_OBJECT_MAX_SIZE:
+        s3_client.copy_object(Bucket=dest_bucket, Key=dest_key, CopySource=copy_source)
+        return
+
+    head = s3_client.head_object(Bucket=source_bucket, Key=source_key)
+    size = head['ContentLength']
+    if size <= COPY_OBJECT_MAX_SIZE:
+        s3_client.copy_object(Bucket=dest_bucket, Key=dest_key, CopySource=copy_source)
+        return
+
+    part_size = max(COPY_PART_SIZE, -(-size // MAX_UPLOAD_PARTS))
+    part_count = -(-size // part_size)
+    upload_id = s3_client.create_multipart_upload(
+        Bucket=dest_bucket, Key=dest_key, **object_content_args(head))['UploadId']
+
+    def copy_part(part_number):
+        start = (part_number - 1) * part_size
+        end = min(start + part_size, size) - 1
+        response = s3_client.upload_part_copy(
+            Bucket=dest_bucket,
+            Key=dest_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            CopySource=copy_source,
+            CopySourceRange=f"bytes={start}-{end}",
+            # 复制过程中源对象被覆盖时失败，避免拼出混合内容
+            CopySourceIfMatch=head['ETag']
+        )
+        return {'PartNumber': part_number, 'ETag': response['CopyPartResult']['ETag']}
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            parts = list(executor.map(copy_part, range(1, part_count + 1)))
+        s3_client.complete_multipart_upload(
+            Bucket=dest_bucket,
+            Key=dest_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+    except Exception:
+        try:
+            s3_client.abort_multipart_upload(Bucket=dest_bucket, Key=dest_key, UploadId=upload_id)
+        except Exception:
+            pass
+        raise
+
+def copy_objects(s3_client, bucket_name, copies, dest_bucket=None, delete_source=False,
+                 max_concurrency=DEFAULT_COPY_CONCURRENCY, delete_concurrency=DEFAULT_DELETE_CONCURRENCY,
+                 progress_callback=None):
+    """在服务端并发复制一组对象，delete_source 为 True 时在全部复制完成后批量删除源对象（即移动）
+
+    copies 为 [(源键, 目标键, 大小)]，源键与目标键相同的项直接跳过。
+    progress_callback(阶段, 已完成数) 的阶段为 'copy' 或 'delete'，返回 False 时停止提交新的复制，
+    已复制的源对象仍会删除，保证每个对象只存在于一处。
+    返回 ([已完成的 (源键, 目标键, 大小)], [(键, 错误信息)])
+    """
+    dest_bucket = dest_bucket or bucket_name
+    copied = []
+    errors = []
+    cancelled = False
+
+    def copy_one(copy):
+        source_key, dest_key, size = copy
+        try:
+            copy_object_server_side(s3_client, bucket_name, source_key, dest_bucket, dest_key, size)
+        except Exception as e:
+            return copy, str(e)
+        return copy, None
+
+    def collect(done):
+        nonlocal cancelled
+        for future in done:
+            copy, error = future.result()
+            if error is None:
+                copied.append(copy)
+            else:
+                errors.append((copy[0], error))
+        if progress_callback and progress_callback('copy', len(copied) + len(errors)) is False:
+            cancelled = True
+
+    pending = set()
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        for copy in copies:
+            if dest_bucket == bucket_name and copy[0] == copy[1]:
+                continue
+            while len(pending) >= max_concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            if cancelled:
+                break
+            pending.add(executor.submit(copy_one, copy))
+        done, _ = wait(pending)
+        collect(done)
+
+    if not delete_source or not copied:
+        return copied, errors
+
+    def delete_progress(deleted_count):
+        if progress_callback:
+            progress_callback('delete', deleted_count)
+
+    deleted_keys, delete_errors = delete_keys_batched(
+        s3_client, bucket_name, [source_key for source_key, _, _ in copied],
+        max_concurrency=delete_concurrency, progress_callback=delete_progress
+    )
+    deleted = set(deleted_keys)
+    errors.extend((key, f"已复制到新位置，但删除源文件失败：{error}") for key, error in delete_errors)
+    return [copy for copy in copied if copy[0] in deleted], errors
+
+def stream_copy_object(source_client, source_bucket, source_key, dest_client, dest_bucket, dest_key, size,
+                       max_concurrency=DEFAULT_PART_CONCURRENCY):
+    """在不同账户的存储桶之间复制一个对象
+
+    数据从源 GET 后直接 PUT 到目标，只在内存中经过，不写本地临时文件。大对象按分片并发
+    Range GET → upload_part，同时在内存中的数据不超过 max_concurrency 个分片。
+    """
+    if size <= MULTIPART_THRESHOLD:
+        response = source_client.get_object(Bucket=source_bucket, Key=source_key)
+        dest_client.put_object(Bucket=dest_bucket, Key=dest_key, Body=response['Body'].read(),
+                               **object_content_args(response))
+        return
+
+    head = source_client.head_object(Bucket=source_bucket, Key=source_key)
+    size = head['ContentLength']
+    part_size = max(MULTIPART_CHUNK_SIZE, -(-size // MAX_UPLOAD_PARTS))
+    part_count = -(-size // part_size)
+    upload_id = dest_client.create_multipart_upload(
+        Bucket=dest_bucket, Key=dest_key, **object_content_args(head))['UploadId']
+
+    def copy_part(part_number):
+        start = (part_number - 1) * part_size
+        end = min(start + part_size, size) - 1
+        data = source_client.get_object(
+            Bucket=source_bucket,
+            Key=source_key,
+            Range=f"bytes={start}-{end}",
+            IfMatch=head['ETag']
+        )['Body'].read()
+        response = dest_client.upload_part(
+            Bucket=dest_bucket,
+            Key=dest_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=data
+        )
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            parts = list(executor.map(copy_part, range(1, part_count + 1)))
+        dest_client.complete_multipart_upload(
+            Bucket=dest_bucket,
+            Key=dest_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+    except Exception:
+        try:
+            dest_client.abort_multipart_upload(Bucket=dest_bucket, Key=dest_key, UploadId=upload_id)
+        except Exception:
+            pass
+        raise
+
+class MigrationStore:
+    """跨存储桶迁移任务的检查点（SQLite）
+
+    记录每个任务的源/目标存储桶标识、前缀和已列出的最后一个键，以及每个对象是否已复制完成。
+    中断后从检查点继续：已复制的对象不再传输，源前缀从上次的位置继续列出。
+    """
+
+    def __init__(self, db_path=':memory:'):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.executescript(
+            """CREATE TABLE IF NOT EXISTS migration_jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source_bucket_id TEXT NOT NULL,
+                dest_bucket_id TEXT NOT NULL,
+                prefix TEXT NOT NULL,
+                dest_prefix TEXT NOT NULL,
+                last_listed_key TEXT NOT NULL DEFAULT '',
+                listing_done INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS migration_items (
+                job_id INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_id, key)
+            );"""
+        )
+        self.conn.commit()
+
+    def create(self, source_bucket_id, dest_bucket_id, prefix, dest_prefix):
+        """创建新任务，返回任务编号"""
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT INTO migration_jobs (source_bucket_id, dest_bucket_id, prefix, dest_prefix, created) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (source_bucket_id, dest_bucket_id, prefix, dest_prefix, time.time())
+            )
+            self.conn.commit()
+            return cursor.lastrowid
+
+    def jobs(self):
+        """列出所有未完成的任务"""
+        with self._lock:
+            rows = self.conn.execute("SELECT job_id FROM migration_jobs ORDER BY job_id").fetchall()
+        return [self.get(job_id) for job_id, in rows]
+
+    def get(self, job_id):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT source_bucket_id, dest_bucket_id, prefix, dest_prefix, last_listed_key, listing_done "
+                "FROM migration_jobs WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ('source_bucket_id', 'dest_bucket_id', 'prefix', 'dest_prefix', 'last_listed_key', 'listing_done')
+        return dict(zip(keys, row), job_id=job_id)
+
+    def add_items(self, job_id, objects, last_key):
+        """记录新列出的一页对象 [(键, 大小)] 和列出的位置"""
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO migration_items (job_id, key, size) VALUES (?, ?, ?)",
+                ((job_id, key, size) for key, size in objects)
+            )
+            self.conn.execute(
+                "UPDATE migration_jobs SET last_listed_key = ? WHERE job_id = ?", (last_key, job_id))
+            self.conn.commit()
+
+    def finish_listing(self, job_id):
+        with self._lock:
+            self.conn.execute("UPDATE migration_jobs SET listing_done = 1 WHERE job_id = ?", (job_id,))
+            self.conn.commit()
+
+    def pending_items(self, job_id, after_key='', limit=SEARCH_PAGE_SIZE):
+        """按键顺序返回 after_key 之后尚未完成的对象 [(键, 大小)]"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT key, size FROM migration_items WHERE job_id = ? AND done = 0 AND key > ? "
+                "ORDER BY key LIMIT ?",
+                (job_id, after_key, limit)
+            ).fetchall()
+
+    def mark_done(self, job_id, keys):
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE migration_items SET done = 1 WHERE job_id = ? AND key = ?",
+                ((job_id, key) for key in keys)
+            )
+            self.conn.commit()
+
+    def progress(self, job_id):
+        """返回 (已完成对象数, 已完成字节数, 已列出对象数)"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT COALESCE(SUM(done), 0), COALESCE(SUM(size * done), 0), COUNT(*) "
+                "FROM migration_items WHERE job_id = ?",
+                (job_id,)
+            ).fetchone()
+        return tuple(row)
+
+    def remove(self, job_id):
+        """任务全部完成后删除其检查点"""
+        with self._lock:
+            self.conn.execute("DELETE FROM migration_items WHERE job_id = ?", (job_id,))
+            self.conn.execute("DELETE FROM migration_jobs WHERE job_id = ?", (job_id,))
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+def migrate_objects(store, job_id, source_client, source_bucket, dest_client, dest_bucket, server_side,
+                    max_concurrency=DEFAULT_MIGRATION_CONCURRENCY, progress_callback=None):
+    """执行或继续一个迁移任务
+
+    先提交检查点中已列出但尚未完成的对象，再从上次列出的位置继续列出源前缀，边列出边复制。
+    server_side 为 True（两个存储桶属于同一账户）时使用服务端复制，目标凭证无权读取源存储桶时
+    自动改为经本机内存转发。
+    progress_callback(已完成对象数, 已完成字节数, 已列出对象数) 返回 False 时停止提交新的对象。
+    返回 (是否已全部处理完, [(键, 错误信息)])
+    """
+    job = store.get(job_id)
+    prefix, dest_prefix = job['prefix'], job['dest_prefix']
+    done_count, done_bytes, listed = store.progress(job_id)
+    errors = []
+    cancelled = False
+    use_server_side = server_side
+
+    def copy_one(key, size):
+        nonlocal use_server_side
+        dest_key = dest_prefix + key[len(prefix):]
+        try:
+            if use_server_side:
+                try:
+                    copy_object_server_side(dest_client, source_bucket, key, dest_bucket, dest_key, size)
+                    return key, size, None
+                except ClientError as e:
+                    # 超过 5GB 的对象先 HEAD 源对象，无权读取时在这里就会失败
+                    if not is_access_denied(e):
+                        raise
+                    use_server_side = False
+            stream_copy_object(source_client, source_bucket, key, dest_client, dest_bucket, dest_key, size)
+        except Exception as e:
+            return key, size, str(e)
+        return key, size, None
+
+    def collect(done):
+        nonlocal cancelled, done_count, done_bytes
+        finished_keys = []
+        for future in done:
+            key, size, error = future.result()
+            if error is None:
+                finished_keys.append(key)
+                done_count += 1
+                done_bytes += size
+            else:
+                errors.append((key, error))
+        store.mark_done(job_id, finished_keys)
+        if progress_callback and progress_callback(done_count, done_bytes, listed) is False:
+            cancelled = True
+
+    pending = set()
+
+    def submit_all(executor, objects):
+        nonlocal pending
+        for key, size in objects:
+            while len(pending) >= max_concurrency:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            if cancelled:
+                return
+            pending.add(executor.submit(copy_one, key, size))
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        # 检查点中已列出但尚未完成的对象（包括上次失败的对象）
+        after_key = ''
+        while not cancelled:
+            rows = store.pending_items(job_id, after_key)
+            if not rows:
+                break
+            submit_all(executor, rows)
+            after_key = rows[-1][0]
+
+        if not job['listing_done'] and not cancelled:
+            paginator = source_client.get_paginator('list_objects_v2')
+            pages = paginator.paginate(Bucket=source_bucket, Prefix=prefix, StartAfter=job['last_listed_key'])
+            for page in pages:
+                objects = [(obj['Key'], obj['Size']) for obj in page.get('Contents', [])]
+                if objects:
+                    store.add_items(job_id, objects, objects[-1][0])
+                    listed += len(objects)
+                submit_all(executor, objects)
+                if cancelled:
+                    break
+            else:
+                store.finish_listing(job_id)
+
+        done, _ = wait(pending)
+        collect(done)
+
+    return not cancelled and not errors, errors
+
+def local_path_for_key(local_folder, prefix, key):
+    """把前缀下的对象键映射为本地路径，保留前缀的最后一级目录名，拒绝越出目标目录的键"""
+    stripped_prefix = prefix.rstrip('/')
+    parent_prefix = stripped_prefix[:stripped_prefix.rfind('/') + 1]
+    relative_path = key[len(parent_prefix):]
+    local_path = os.path.normpath(os.path.join(local_folder, *relative_path.split('/')))
+    root = os.path.normpath(local_folder)
+    if os.path.commonpath([root, local_path]) != root:
+        raise Exception(f"非法的对象路径: {key}")
+    return local_path
+
+class TransferStore:
+    """传输队列的持久化记录（SQLite）
+
+    每个批次（一次上传、下载、复制/移动或删除操作）记录类型、存储桶、优先级和选项，
+    批次中的每个对象是一个任务，状态为 pending / done / failed / cancelled。
+    执行中的任务仍记为 pending，程序退出或崩溃后在下次启动时重新执行；批次全部结束后删除其记录。
+    """
+
+    def __init__(self, db_path=':memory:'):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        # 每个任务结束都会写一次状态，WAL 模式下提交不必每次同步到磁盘
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """CREATE TABLE IF NOT EXISTS transfer_batches (
+                batch_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                label TEXT NOT NULL,
+                bucket_id TEXT NOT NULL,
+                bucket_name TEXT NOT NULL,
+                priority INTEGER NOT NULL DEFAULT 0,
+                options TEXT NOT NULL DEFAULT '{}',
+                created REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS transfer_jobs (
+                job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                batch_id INTEGER NOT NULL,
+                source TEXT NOT NULL,
+                dest TEXT NOT NULL,
+                size INTEGER NOT NULL DEFAULT 0,
+                etag TEXT NOT NULL DEFAULT '',
+                state TEXT NOT NULL DEFAULT 'pending',
+                error TEXT NOT NULL DEFAULT ''
+            );
+            CREATE INDEX IF NOT EXISTS transfer_jobs_batch ON transfer_jobs (batch_id, state);"""
+        )
+        self.conn.commit()
+
+    def create_batch(self, kind, label, bucket_id, bucket_name, priority=0, options=None):
+        """创建批次，返回批次编号"""
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT INTO transfer_batches (kind, label, bucket_id, bucket_name, priority, options, created) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, label, bucket_id, bucket_name, priority, json.dumps(options or {}), time.time())
+            )
+            self.conn.commit()
+            return cursor.lastrowid
+
+    def add_jobs(self, batch_id, jobs):
+        """把 [(源, 目标, 大小, ETag)] 加入批次，返回各任务的编号"""
+        with self._lock:
+            job_ids = [
+                self.conn.execute(
+                    "INSERT INTO transfer_jobs (batch_id, source, dest, size, etag) VALUES (?, ?, ?, ?, ?)",
+                    (batch_id, source, dest, size, etag)
+                ).lastrowid
+                for source, dest, size, etag in jobs
+            ]
+            self.conn.commit()
+            return job_ids
+
+    def set_state(self, job_id, state, error=''):
+        with self._lock:
+            self.conn.execute(
+                "UPDATE transfer_jobs SET state = ?, error = ? WHERE job_id = ?", (state, error, job_id))
+            self.conn.commit()
+
+    def set_states(self, states):
+        """在一个事务中写入多个任务的结果，states 为 [(编号, 状态, 错误信息)]"""
+        with self._lock:
+            self.conn.executemany(
+                "UPDATE transfer_jobs SET state = ?, error = ? WHERE job_id = ?",
+                ((state, error, job_id) for job_id, state, error in states)
+            )
+            self.conn.commit()
+
+    def cancel_pending(self, batch_id):
+        """把批次中尚未结束的任务标记为已取消"""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE transfer_jobs SET state = 'cancelled' WHERE batch_id = ? AND state = 'pending'", (batch_id,))
+            self.conn.commit()
+
+    def set_priority(self, batch_id, priority):
+        with self._lock:
+            self.conn.execute("UPDATE transfer_batches SET priority = ? WHERE batch_id = ?", (priority, batch_id))
+            self.conn.commit()
+
+    def unfinished_batches(self):
+        """返回仍有未结束任务的批次
+
+        每项包含批次的各字段，以及 jobs [(编号, 源, 目标, 大小, ETag)]、
+        counts {状态: 任务数} 和 failed [(源, 目标, 错误)]
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT batch_id, kind, label, bucket_id, bucket_name, priority, options FROM transfer_batches "
+                "WHERE batch_id IN (SELECT batch_id FROM transfer_jobs WHERE state = 'pending') "
+                "ORDER BY batch_id"
+            ).fetchall()
+            batches = []
+            for batch_id, kind, label, bucket_id, bucket_name, priority, options in rows:
+                batches.append({
+                    'batch_id': batch_id,
+                    'kind': kind,
+                    'label': label,
+                    'bucket_id': bucket_id,
+                    'bucket_name': bucket_name,
+                    'priority': priority,
+                    'options': json.loads(options),
+                    'jobs': self.conn.execute(
+                        "SELECT job_id, source, dest, size, etag FROM transfer_jobs "
+                        "WHERE batch_id = ? AND state = 'pending' ORDER BY job_id",
+                        (batch_id,)
+                    ).fetchall(),
+                    'counts': dict(self.conn.execute(
+                        "SELECT state, COUNT(*) FROM transfer_jobs WHERE batch_id = ? GROUP BY state",
+                        (batch_id,)
+                    ).fetchall()),
+                    'failed': self.conn.execute(
+                        "SELECT source, dest, error FROM transfer_jobs WHERE batch_id = ? AND state = 'failed'",
+                        (batch_id,)
+                    ).fetchall()
+                })
+        return batches
+
+    def remove_finished(self):
+        """删除已没有未结束任务的批次（批次结束时未来得及删除的记录）"""
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM transfer_batches WHERE batch_id NOT IN "
+                "(SELECT batch_id FROM transfer_jobs WHERE state = 'pending')")
+            self.conn.execute(
+                "DELETE FROM transfer_jobs WHERE batch_id NOT IN (SELECT batch_id FROM transfer_batches)")
+            self.conn.commit()
+
+    def remove_batch(self, batch_id):
+        """批次全部结束后删除其记录"""
+        with self._lock:
+            self.conn.execute("DELETE FROM transfer_jobs WHERE batch_id = ?", (batch_id,))
+            self.conn.execute("DELETE FROM transfer_batches WHERE batch_id = ?", (batch_id,))
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+class BandwidthLimiter:
+    """所有上传和下载共享的令牌桶限速器
+
+    令牌按限速（字节/秒）持续补充，桶容量为 BANDWIDTH_BURST_SECONDS 秒的流量，空闲后允许短时突发。
+    传输线程每读写一段数据前调用 consume()，令牌不足时阻塞；rate 为 0 表示不限速。
+    单次请求量超过桶容量时先等桶装满再透支，长时间平均速率仍等于限速。
+    """
+
+    def __init__(self, rate=0, burst_seconds=BANDWIDTH_BURST_SECONDS):
+        self.burst_seconds = burst_seconds
+        self._lock = threading.Lock()
+        self.rate = 0
+        self.capacity = 0
+        self.tokens = 0
+        self.updated = time.monotonic()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        """调整限速（字节/秒），正在等待的线程会在下一次检查时按新限速继续"""
+        with self._lock:
+            self._refill()
+            was_unlimited = not self.rate
+            self.rate = max(0, rate)
+            self.capacity = self.rate * self.burst_seconds
+            # 由不限速切换过来时从满桶开始，否则保留的令牌不超过新的容量
+            self.tokens = self.capacity if was_unlimited else min(self.tokens, self.capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, amount):
+        """取出 amount 字节的令牌，不足时阻塞直到补足"""
+        if amount <= 0:
+            return
+        while True:
+            with self._lock:
+                if not self.rate:
+                    return
+                self._refill()
+                needed = min(amount, self.capacity)
+                if self.tokens >= needed:
+                    self.tokens -= amount
+                    return
+                delay = (needed - self.tokens) / self.rate
+            time.sleep(min(delay, BANDWIDTH_WAIT_SLICE))
+
+class ThrottledReader:
+    """按限速读取内存中的分片数据，作为 upload_part 的 Body
+
+    与 s3transfer 的限速流相同，在 HTTP 客户端读取请求体时消耗令牌；
+    计算校验和后回到开头重新读取的部分不再重复计费。
+    """
+
+    def __init__(self, data, limiter):
+        self._stream = io.BytesIO(data)
+        self._limiter = limiter
+        self._charged = 0
+
+    def read(self, size=-1):
+        data = self._stream.read(size)
+        end = self._stream.tell()
+        if end > self._charged:
+            self._limiter.consume(end - self._charged)
+            self._charged = end
+        return data
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        return self._stream.seek(offset, whence)
+
+    def tell(self):
+        return self._stream.tell()
+
+    def __len__(self):
+        return len(self._stream.getbuffer())
+
+class RangedDownloader:
+    """流式分段下载
+
+    小对象直接流式写入磁盘；大对象拆分为多个 Range 请求并发写入预分配的 .part 文件，
+    已完成的分段记录在 .part.json 中，中断后可从断点继续。下载完成后校验 ETag。
+    """
+
+    def __init__(self, s3_client, bucket_name, object_key, save_path,
+                 chunk_size=DOWNLOAD_CHUNK_SIZE, max_concurrency=DEFAULT_DOWNLOAD_CONCURRENCY, limiter=None):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.object_key = object_key
+        self.save_path = save_path
+        self.chunk_size = chunk_size
+        self.max_concurrency = max(1, max_concurrency)
+        self.limiter = limiter
+        self.part_path = save_path + '.part'
+        self.state_path = save_path + '.part.json'
+        self._state_lock = threading.Lock()
+
+    def download(self, progress_callback=None, head=None):
+        """执行下载，progress_callback(bytes) 返回 False 表示取消，返回对象大小
+
+        head 为已获取的 head_object 结果，未提供时自动请求。
+        """
+        if head is None:
+            head = self.s3_client.head_object(Bucket=self.bucket_name, Key=self.object_key)
+        size = head['ContentLength']
+        etag = head['ETag']
+
+        state = self._load_state(size, etag)
+        total_chunks = max(1, (size + self.chunk_size - 1) // self.chunk_size)
+        completed = set(state['completed'])
+        if progress_callback and completed:
+            # 已下载的分段计入进度
+            progress_callback(sum(end - start + 1 for start, end in
+                                  (self._chunk_range(index, size) for index in completed)))
+
+        # 预分配 .part 文件
+        mode = 'r+b' if os.path.exists(self.part_path) else 'wb'
+        with open(self.part_path, mode) as f:
+            f.truncate(size)
+
+        if size > 0:
+            pending_chunks = [index for index in range(total_chunks) if index not in completed]
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, max(1, len(pending_chunks)))) as executor:
+                futures = [
+                    executor.submit(self._download_chunk, index, size, etag, state, progress_callback)
+                    for index in pending_chunks
+                ]
+                try:
+                    for future in futures:
+                        future.result()
+                except Exception:
+                    for future in futures:
+                        future.cancel()
+                    raise
+
+        self._verify(size, etag)
+        os.replace(self.part_path, self.save_path)
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        return size
+
+    def _chunk_range(self, index, size):
+        """返回分段的 (起始字节, 结束字节)，均包含"""
+        start = index * self.chunk_size
+        return start, min(size, start + self.chunk_size) - 1
+
+    def _load_state(self, size, etag):
+        """读取断点记录，对象已变化时重新开始"""
+        if os.path.exists(self.state_path) and os.path.exists(self.part_path):
+            try:
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                if (state.get('etag') == etag and state.get('size') == size
+                        and state.get('chunk_size') == self.chunk_size):
+                    return state
+            except Exception:
+                pass
+
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+        state = {'etag': etag, 'size': size, 'chunk_size': self.chunk_size, 'completed': []}
+        self._save_state(state)
+        return state
+
+    def _save_state(self, state):
+        temp_path = self.state_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    def _download_chunk(self, index, size, etag, state, progress_callback):
+        """下载一个分段并写入 .part 文件的对应位置"""
+        start, end = self._chunk_range(index, size)
+        response = self.s3_client.get_object(
+            Bucket=self.bucket_name,
+            Key=self.object_key,
+            Range=f"bytes={start}-{end}",
+            IfMatch=etag
+        )
+
+        with open(self.part_path, 'r+b') as f:
+            f.seek(start)
+            for data in response['Body'].iter_chunks(DOWNLOAD_STREAM_SIZE):
+                if self.limiter:
+                    self.limiter.consume(len(data))
+                f.write(data)
+                if progress_callback and progress_callback(len(data)) is False:
+                    response['Body'].close()
+                    raise Exception("下载已取消")
+
+        with self._state_lock:
+            state['completed'].append(index)
+            self._save_state(state)
+
+    def _verify(self, size, etag):
+        """校验下载结果的大小和 ETag"""
+        actual_size = os.path.getsize(self.part_path)
+        if actual_size != size:
+            raise Exception(f"下载文件大小不一致：期望 {size}，实际 {actual_size}")
+
+        remote_etag = etag.strip('"')
+        part_size = None
+        if '-' in remote_etag:
+            part_size = self._remote_part_size(size, int(remote_etag.split('-')[1]))
+            if part_size is None:
+                # 分片大小未知的分片上传对象无法重算 ETag，只校验大小
+                return
+        _, _, _, _, md5, multipart_etag = calculate_file_hashes(self.part_path, part_size)
+        if not etag_matches(md5, multipart_etag, remote_etag):
+            # 内容损坏，删除断点记录以便重新下载
+            if os.path.exists(self.state_path):
+                os.remove(self.state_path)
+            raise Exception("下载文件 ETag 校验失败")
+
+    def _remote_part_size(self, size, part_count):
+        """分片上传对象的分片大小
+
+        分片数相同的对象可能使用了不同的分片大小，只凭 ETag 中的分片数无法确定，
+        因此用 HeadObject(PartNumber=1) 读取第一个分片的大小。请求失败，或按该大小
+        切分得不到同样的分片数（各分片大小不一）时返回 None。
+        """
+        try:
+            head = self.s3_client.head_object(Bucket=self.bucket_name, Key=self.object_key, PartNumber=1)
+        except Exception:
+            return None
+        part_size = head.get('ContentLength')
+        if not part_size or -(-size // part_size) != part_count:
+            return None
+        return part_size
+
+class TransferProgress:
+    """一组传输（一个上传批次或一次下载）在某一时刻的进度快照"""
+
+    def __init__(self, label, transferred, total, speed, files):
+        self.label = label
+        self.transferred = transferred
+        self.total = total
+        self.speed = speed  # 平滑后的速度（字节/秒）
+        self.files = files  # 进行中的文件 [(名称, 已传输字节, 总字节)]
+
+    @property
+    def percentage(self):
+        if not self.total:
+            return 0
+        return min(int(self.transferred / self.total * 100), 100)
+
+    @property
+    def eta(self):
+        """预计剩余秒数，速度未知时为 None"""
+        if not self.speed:
+            return None
+        return max(self.total - self.transferred, 0) / self.speed
+
+class TransferTelemetry:
+    """汇总任意数量并行传输的字节数
+
+    传输回调只在锁内累加计数，不发信号也不计算速度；由调用方按固定间隔调用
+    sample() 取得各组的进度快照，速度按采样间隔内的字节数做指数平滑。
+    """
+
+    def __init__(self, smoothing=TELEMETRY_SMOOTHING):
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self.groups = {}  # 组 -> [名称, 总字节, 已传输字节, 上次采样字节, 上次采样时间, 平滑速度]
+        self.transfers = {}  # 传输 -> [组, 名称, 总字节, 已传输字节]
+        self.finished_groups = []  # 已结束但还未在快照中报告最终状态的组
+
+    def begin_group(self, group, label, total_bytes=0):
+        """登记一组传输，已存在时累加总字节数"""
+        with self._lock:
+            state = self.groups.get(group)
+            if state is None:
+                self.groups[group] = [label, total_bytes, 0, 0, time.monotonic(), None]
+            else:
+                state[1] += total_bytes
+
+    def end_group(self, group):
+        with self._lock:
+            if group in self.groups:
+                self.finished_groups.append(group)
+
+    def begin(self, transfer, group, label, total_bytes):
+        """登记组中的一个文件传输"""
+        with self._lock:
+            self.transfers[transfer] = [group, label, total_bytes, 0]
+
+    def add(self, transfer, bytes_amount):
+        """累加已传输字节，可在任意线程中调用"""
+        with self._lock:
+            state = self.transfers.get(transfer)
+            if state is None:
+                return
+            state[3] += bytes_amount
+            group = self.groups.get(state[0])
+            if group is not None:
+                group[2] += bytes_amount
+
+    def end(self, transfer):
+        with self._lock:
+            self.transfers.pop(transfer, None)
+
+    def has_groups(self):
+        with self._lock:
+            return bool(self.groups)
+
+    def sample(self):
+        """返回 {组: TransferProgress}，并移除已结束的组"""
+        now = time.monotonic()
+        snapshot = {}
+        with self._lock:
+            files = {}
+            for group, label, total, done in self.transfers.values():
+                files.setdefault(group, []).append((label, done, total))
+            for group, state in self.groups.items():
+                label, total, transferred, last_bytes, last_time, speed = state
+                interval = now - last_time
+                if interval > 0:
+                    current = (transferred - last_bytes) / interval
+                    speed = current if speed is None else (
+                        self.smoothing * current + (1 - self.smoothing) * speed)
+                    state[3:] = [transferred, now, speed]
+                snapshot[group] = TransferProgress(label, transferred, total, speed or 0, files.get(group, []))
+            for group in self.finished_groups:
+                self.groups.pop(group, None)
+            self.finished_groups = []
+        return snapshot
+
+class S3ClientRegistry:
+    """按 (端点, 访问密钥) 缓存长期使用的 S3 客户端
+
+    boto3 客户端可以在线程间共享，同一组凭证的所有请求共用一个客户端和它的连接池，
+    切换存储桶时复用已建立的连接。连接池大小按配置的最大并发请求数设置，
+    避免并发传输在连接池上排队。
+    """
+
+    def __init__(self, max_pool_connections=10):
+        self.max_pool_connections = max_pool_connections
+        self._lock = threading.Lock()
+        self.clients = {}
+
+    def get(self, endpoint_url, access_key_id, access_key_secret):
+        """返回该端点和凭证对应的客户端，首次使用时创建"""
+        key = (endpoint_url, access_key_id, access_key_secret)
+        with self._lock:
+            client = self.clients.get(key)
+            if client is None:
+                client = boto3.client(
+                    service_name='s3',
+                    endpoint_url=endpoint_url,
+                    aws_access_key_id=access_key_id,
+                    aws_secret_access_key=access_key_secret,
+                    config=Config(
+                        signature_version='s3v4',
+                        retries={'max_attempts': 3},
+                        max_pool_connections=self.max_pool_connections,
+                    ),
+                    region_name='auto',
+                    verify=False
+                )
+                self.clients[key] = client
+            return client
+
+    def set_max_pool_connections(self, max_pool_connections):
+        """修改连接池大小，之后获取的客户端按新大小重新创建（进行中的请求继续使用旧客户端）"""
+        with self._lock:
+            if max_pool_connections != self.max_pool_connections:
+                self.max_pool_connections = max_pool_connections
+                self.clients.clear()
+
+def warm_up_connections(s3_client, bucket_name, connections=WARM_UP_CONNECTIONS):
+    """并发发出 head_bucket，预先建立连接并验证存储桶可以访问，失败时抛出第一个错误"""
+    with ThreadPoolExecutor(max_workers=max(1, connections)) as executor:
+        futures = [executor.submit(s3_client.head_bucket, Bucket=bucket_name) for _ in range(max(1, connections))]
+        for future in futures:
+            future.result()
+
+class BucketStats:
+    """持久化的存储桶统计（总字节数和对象数）
+
+    通过本工具进行的上传和删除以增量方式更新统计，只在需要时才完整遍历存储桶重新统计。
+    """
+
+    def __init__(self, stats_path):
+        self.stats_path = stats_path
+        self._lock = threading.Lock()
+        self.stats = {}
+        if os.path.exists(stats_path):
+            try:
+                with open(stats_path, 'r', encoding='utf-8') as f:
+                    self.stats = json.load(f)
+            except Exception as e:
+                print(f"加载存储桶统计失败: {str(e)}")
+                self.stats = {}
+
+    def _save(self):
+        temp_path = self.stats_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.stats, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.stats_path)
+
+    def get(self, bucket_name):
+        """返回存储桶统计，未统计过时返回 None"""
+        with self._lock:
+            entry = self.stats.get(bucket_name)
+            return dict(entry) if entry else None
+
+    def set_full(self, bucket_name, total_bytes, object_count):
+        """写入一次完整统计的结果"""
+        with self._lock:
+            self.stats[bucket_name] = {
+                'total_bytes': total_bytes,
+                'object_count': object_count,
+                'last_full_scan': time.time()
+            }
+            self._save()
+
+    def apply_delta(self, bucket_name, bytes_delta, count_delta):
+        """按增量更新统计，存储桶尚未完整统计时忽略"""
+        if not bytes_delta and not count_delta:
+            return
+        with self._lock:
+            entry = self.stats.get(bucket_name)
+            if not entry:
+                return
+            entry['total_bytes'] = max(0, entry['total_bytes'] + bytes_delta)
+            entry['object_count'] = max(0, entry['object_count'] + count_delta)
+            self._save()
+
+    def is_stale(self, bucket_name, max_age):
+        """统计不存在或超过 max_age 秒未完整统计"""
+        entry = self.get(bucket_name)
+        return entry is None or time.time() - entry.get('last_full_scan', 0) > max_age
+
+class DirectoryListing:
+    """一个目录（Delimiter='/'）的列表，也用于显示搜索结果
+
+    各行以并行数组紧凑存储，名称为键去掉 prefix 后的部分，目录行的大小和修改时间为 0、ETag 为空。
+    complete 为 True 表示已取得全部分页。
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.names = []
+        self.keys = []
+        self.sizes = array('q')
+        self.mtimes = array('d')
+        self.is_dirs = bytearray()
+        self.etags = []
+        self.complete = False
+
+    def __len__(self):
+        return len(self.keys)
+
+    def parse_page(self, page):
+        """把一页 list_objects_v2 结果解析为行 (名称, 键, 大小, 修改时间戳, 是否目录, ETag)，文件在前"""
+        rows = []
+        for obj in page.get('Contents', []):
+            if obj['Key'] == self.prefix or obj['Key'].endswith('/'):
+                continue
+            rows.append((obj['Key'][len(self.prefix):], obj['Key'], obj['Size'],
+                         obj['LastModified'].timestamp(), 0, (obj.get('ETag') or '').strip('"')))
+        for prefix_obj in page.get('CommonPrefixes', []):
+            rows.append((prefix_obj['Prefix'].rstrip('/').split('/')[-1] + '/',
+                         prefix_obj['Prefix'], 0, 0.0, 1, ''))
+        return rows
+
+    def extend(self, rows):
+        for name, key, size, mtime, is_dir, etag in rows:
+            self.names.append(name)
+            self.keys.append(key)
+            self.sizes.append(size)
+            self.mtimes.append(mtime)
+            self.is_dirs.append(is_dir)
+            self.etags.append(etag)
+
+    def sorted_default(self):
+        """返回按默认顺序排列的副本：文件按修改时间降序排在前面，目录排在后面"""
+        order = sorted(range(len(self.keys)), key=lambda i: (self.is_dirs[i], -self.mtimes[i]))
+        result = DirectoryListing(self.prefix)
+        result.names = [self.names[i] for i in order]
+        result.keys = [self.keys[i] for i in order]
+        result.sizes = array('q', (self.sizes[i] for i in order))
+        result.mtimes = array('d', (self.mtimes[i] for i in order))
+        result.is_dirs = bytearray(self.is_dirs[i] for i in order)
+        result.etags = [self.etags[i] for i in order]
+        result.complete = self.complete
+        return result
+
+def iter_directory_pages(s3_client, bucket_name, prefix):
+    """按需逐页列出一个目录，每次迭代才发起一次请求"""
+    paginator = s3_client.get_paginator('list_objects_v2')
+    return iter(paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter='/'))
+
+def list_directory(s3_client, bucket_name, prefix):
+    """分页列出一个目录下的全部文件和子目录，返回完整的 DirectoryListing"""
+    listing = DirectoryListing(prefix)
+    for page in iter_directory_pages(s3_client, bucket_name, prefix):
+        listing.extend(listing.parse_page(page))
+    listing.complete = True
+    return listing.sorted_default()
+
+def _common_length(a, b):
+    common = 0
+    while common < min(len(a), len(b)) and a[common] == b[common]:
+        common += 1
+    return common
+
+# 没有可参考的键时计算拆分点使用的数位：全部可打印 ASCII 字符
+PRINTABLE_KEY_ALPHABET = ''.join(chr(code) for code in range(0x20, 0x7f))
+
+def key_alphabet(keys):
+    """返回一页键中除去首尾键共同前缀后出现过的全部字符，排序后作为计算拆分点时的数位
+
+    按序号或十六进制命名的键只用到少数几个字符，在这些字符组成的数位上等分，
+    拆分点才会落在确实有键的位置，而不是大多落在没有键的字符范围内。
+    """
+    keys = list(keys)
+    common = _common_length(keys[0], keys[-1]) if keys else 0
+    return ''.join(sorted(set(''.join(key[common:] for key in keys))))
+
+def _key_to_number(text, common, alphabet):
+    """把 text 中第 common 个字符起的 SHARD_KEY_DIGITS 个字符按在 alphabet 中的位置看作 len(alphabet) 进制数
+
+    不在 alphabet 中的字符按其插入位置近似，不足的位数用最小的字符补齐。
+    """
+    value = 0
+    for i in range(common, common + SHARD_KEY_DIGITS):
+        digit = bisect.bisect_left(alphabet, text[i]) if i < len(text) else 0
+        value = value * len(alphabet) + min(digit, len(alphabet) - 1)
+    return value
+
+def _number_to_key(base, common, value, alphabet):
+    chars = []
+    for _ in range(SHARD_KEY_DIGITS):
+        value, digit = divmod(value, len(alphabet))
+        chars.append(alphabet[digit])
+    return base[:common] + ''.join(reversed(chars))
+
+def key_split_points(low, high=None, parts=2, alphabet=PRINTABLE_KEY_ALPHABET):
+    """返回字典序严格介于 low 和 high 之间、递增排列的至多 parts - 1 个拆分点，high 为 None 表示没有上界
+
+    从 low 和 high 第一个不同的字符开始，把其后 SHARD_KEY_DIGITS 个字符按 alphabet
+    看作多进制数等分；两者太接近时可能返回空列表。
+    """
+    if len(alphabet) < 2:
+        return []
+    common = _common_length(low, high) if high is not None else 0
+    low_value = _key_to_number(low, common, alphabet)
+    high_value = (_key_to_number(high, common, alphabet) if high is not None
+                  else len(alphabet) ** SHARD_KEY_DIGITS - 1)
+    points = []
+    for i in range(1, parts):
+        point = _number_to_key(low, common, low_value + (high_value - low_value) * i // parts, alphabet)
+        if point > low and (high is None or point < high) and (not points or point > points[-1]):
+            points.append(point)
+    return points
+
+def prefix_level_points(page_first, page_last, count, alphabet=PRINTABLE_KEY_ALPHABET):
+    """没有上界时的拆分点：依次跳过 page_last 由长到短的各级前缀下的全部键，不足 count 个时把其后的范围等分
+
+    一页的首尾键共同的前缀下通常还有少量键，更短的前缀下依次有更多的键，
+    这样新分段的范围逐级扩大，不会像等分整个字符范围那样大多落在没有键的位置（如按序号命名的键）。
+    """
+    points = []
+    for length in range(_common_length(page_first, page_last), 0, -1):
+        point = page_last[:length] + MAX_KEY_CHAR
+        if not points or point > points[-1]:
+            points.append(point)
+        if len(points) == count:
+            return points
+    return points + key_split_points(points[-1] if points else page_last, None, count - len(points) + 1, alphabet)
+
+def estimate_remaining_pages(page_first, page_last, high=None, alphabet=PRINTABLE_KEY_ALPHABET):
+    """按一页从 page_first 到 page_last 覆盖的键范围，估计 (page_last, high] 中还有多少页，high 为 None 表示没有上界"""
+    if len(alphabet) < 2:
+        return 0
+    common = _common_length(page_first, high) if high is not None else 0
+    first_value = _key_to_number(page_first, common, alphabet)
+    last_value = _key_to_number(page_last, common, alphabet)
+    high_value = (_key_to_number(high, common, alphabet) if high is not None
+                  else len(alphabet) ** SHARD_KEY_DIGITS - 1)
+    return (high_value - last_value) // max(1, last_value - first_value)
+
+# 大于任何实际键中字符的码位，用于跳过某个目录下的全部键
+MAX_KEY_CHAR = '\U0010ffff'
+SHARD_DISCOVERY_DEPTH = 5  # 只有一个子目录时最多向下查找的层数
+SHARD_SEQUENTIAL_PAGES = 4  # 拆分分段前先顺序列出的页数，较小的存储桶在这里就已列完
+SHARD_PROBE_FACTOR = 1  # 一次遍历中最多允许并发数的多少倍个只列出一页就结束的新分段，超过后不再拆分
+SHARD_MIN_PAGES = 3  # 拆分有上界的分段时，每个新分段至少应有的估计页数；每多一个分段就多一次越过上界的请求
+
+class ListShard:
+    """整个存储桶遍历中的一段：prefix 下 start_after < 键 <= end 的对象，end 为 None 表示没有上界"""
+
+    def __init__(self, prefix, start_after=None, end=None):
+        self.prefix = prefix
+        self.start_after = start_after
+        self.end = end
+        self.pages = 0  # 已列出的页数
+
+def _list_shard_page(s3_client, bucket_name, shard, continuation_token):
+    """列出一个分段的一页，返回 (分段, 对象列表, 下一页令牌)，该段结束时令牌为 None"""
+    params = {'Bucket': bucket_name, 'Prefix': shard.prefix}
+    if continuation_token:
+        params['ContinuationToken'] = continuation_token
+    elif shard.start_after:
+        params['StartAfter'] = shard.start_after
+    response = s3_client.list_objects_v2(**params)
+    contents = response.get('Contents', [])
+    if shard.end is not None and contents and contents[-1]['Key'] > shard.end:
+        # 已越过该段的上界，剩余部分由其他分段负责
+        return shard, [obj for obj in contents if obj['Key'] <= shard.end], None
+    next_token = response.get('NextContinuationToken') if response.get('IsTruncated') else None
+    return shard, contents, next_token
+
+def _discover_shards(s3_client, bucket_name, prefix, max_shards, start_after=None):
+    """用 Delimiter='/' 列出 prefix 中 start_after 之后的第一页，把其余键空间按子目录划分为至多 max_shards 个相邻的分段
+
+    只有一个子目录时继续向下查找。没有子目录时这一页就是普通的一页，直接返回其中的对象，
+    尚未列出的部分作为一个分段。返回 (对象列表, 分段列表)。
+    """
+    for _ in range(SHARD_DISCOVERY_DEPTH):
+        params = {'Bucket': bucket_name, 'Prefix': prefix, 'Delimiter': '/'}
+        if start_after:
+            params['StartAfter'] = start_after
+        response = s3_client.list_objects_v2(**params)
+        contents = response.get('Contents', [])
+        sub_prefixes = [item['Prefix'] for item in response.get('CommonPrefixes', [])]
+        if contents or len(sub_prefixes) != 1 or response.get('IsTruncated'):
+            break
+        prefix = sub_prefixes[0]
+
+    if not sub_prefixes:
+        if not response.get('IsTruncated'):
+            return contents, []
+        return contents, [ListShard(prefix, contents[-1]['Key'])]
+
+    # 相邻的子目录合并为一段，各段首尾相接覆盖 prefix 下的全部键（包括直接位于 prefix 下的对象）
+    group_count = max(1, min(len(sub_prefixes), max_shards))
+    boundaries = [sub_prefixes[len(sub_prefixes) * (i + 1) // group_count - 1] + MAX_KEY_CHAR
+                  for i in range(group_count - 1)]
+    starts = [start_after] + boundaries
+    ends = boundaries + [None]
+    return [], [ListShard(prefix, start, end) for start, end in zip(starts, ends)]
+
+def iter_bucket_pages(s3_client, bucket_name, prefix='', max_workers=DEFAULT_LIST_CONCURRENCY):
+    """并行遍历 prefix 下的全部对象，逐页返回 list_objects_v2 的 Contents 列表
+
+    先顺序列出前 SHARD_SEQUENTIAL_PAGES 页，较小的存储桶不会产生任何额外请求。仍未列完时用 Delimiter='/'
+    找出其余部分的子目录，按子目录把键空间划分为初始分段并发列出；每当某段返回一页且还有空闲并发时，
+    再用 StartAfter 把该段尚未列出的范围（按这一页键中出现过的字符）等分给空闲的并发，使同时进行的
+    列表请求保持在 max_workers 个左右。落在没有对象的范围内的分段只需一次请求就会结束；这样只列出一页
+    就结束的新分段超过 max_workers * SHARD_PROBE_FACTOR 个后不再拆分，各段按顺序列完。
+    与顺序列出相比，额外的请求约为每个分段最后一次越过上界的请求（至多 页数 // SHARD_MIN_PAGES 次左右）
+    加上没有收益的探测（至多 max_workers * (SHARD_PROBE_FACTOR + 1) 次）。
+    各页的返回顺序不确定，调用方在同一线程中逐页处理。
+    """
+    shard = ListShard(prefix)
+    next_token = None
+    last_key = None
+    for _ in range(SHARD_SEQUENTIAL_PAGES):
+        shard, contents, next_token = _list_shard_page(s3_client, bucket_name, shard, next_token)
+        if contents:
+            last_key = contents[-1]['Key']
+            yield contents
+        if next_token is None:
+            return
+
+    contents, shards = _discover_shards(s3_client, bucket_name, prefix, max_workers, last_key)
+    if contents:
+        yield contents
+
+    probes_left = max_workers * SHARD_PROBE_FACTOR
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = {executor.submit(_list_shard_page, s3_client, bucket_name, shard, None) for shard in shards}
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    shard, contents, next_token = future.result()
+                    shard.pages += 1
+                    if contents:
+                        yield contents
+                    if next_token is None:
+                        if shard.pages == 1 and shard.start_after is not None:
+                            # 拆分出的分段只列出一页就结束，记为一次没有收益的探测
+                            probes_left -= 1
+                        continue
+                    idle = max_workers - len(pending) - 1 if probes_left > 0 else 0
+                    if contents and idle > 0:
+                        first_key = contents[0]['Key'][len(shard.prefix):]
+                        last_key = contents[-1]['Key'][len(shard.prefix):]
+                        alphabet = key_alphabet(obj['Key'][len(shard.prefix):] for obj in contents)
+                        if shard.end is None:
+                            points = prefix_level_points(first_key, last_key, idle, alphabet)
+                        else:
+                            # 按这一页的键密度估计剩余页数，只拆出每段至少有 SHARD_MIN_PAGES 页的分段，避免大量只有一页的请求
+                            end = shard.end[len(shard.prefix):]
+                            parts = min(idle + 1, estimate_remaining_pages(first_key, last_key, end, alphabet)
+                                        // SHARD_MIN_PAGES)
+                            points = key_split_points(last_key, end, parts, alphabet)
+                        points = [shard.prefix + point for point in points]
+                        # 当前段继续列出到第一个拆分点，其后的范围交给新的分段
+                        for start_after, new_end in zip(points, points[1:] + [shard.end]):
+                            pending.add(executor.submit(
+                                _list_shard_page, s3_client, bucket_name,
+                                ListShard(shard.prefix, start_after, new_end), None))
+                        if points:
+                            shard.end = points[0]
+                    pending.add(executor.submit(_list_shard_page, s3_client, bucket_name, shard, next_token))
+        finally:
+            # 调用方提前停止遍历时不再发起新的请求
+            for future in pending:
+                future.cancel()
+
+def parent_prefixes(key):
+    """返回对象键所有上级目录前缀（含根目录 ''），这些目录的列表会因该对象的增删而变化"""
+    parts = key.rstrip('/').split('/')[:-1]
+    return [''] + ['/'.join(parts[:i]) + '/' for i in range(1, len(parts) + 1)]
+
+class ListingCache:
+    """按 (存储桶, 前缀) 缓存完整的目录列表
+
+    缓存在有效期后过期；本工具上传或删除对象时只失效受影响的目录。
+    """
+
+    def __init__(self, ttl=DEFAULT_LISTING_CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, bucket_name, prefix):
+        """返回未过期的完整 DirectoryListing，没有时返回 None"""
+        with self._lock:
+            entry = self.entries.get((bucket_name, prefix))
+            if entry and time.time() - entry[0] < self.ttl:
+                return entry[1]
+            return None
+
+    def put(self, bucket_name, prefix, listing):
+        with self._lock:
+            self.entries[(bucket_name, prefix)] = (time.time(), listing)
+
+    def invalidate_keys(self, bucket_name, keys):
+        """对象被上传或删除后，失效其所有上级目录的缓存"""
+        prefixes = set()
+        for key in keys:
+            prefixes.update(parent_prefixes(key))
+            if key.endswith('/'):
+                prefixes.add(key)
+        with self._lock:
+            for prefix in prefixes:
+                self.entries.pop((bucket_name, prefix), None)
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+def key_extension(key):
+    """返回对象键的扩展名（小写，不含点号）"""
+    return os.path.splitext(key.rsplit('/', 1)[-1])[1].lower().lstrip('.')
+
+SIZE_UNITS = {'B': 1, 'K': 1024, 'KB': 1024, 'M': 1024 ** 2, 'MB': 1024 ** 2,
+              'G': 1024 ** 3, 'GB': 1024 ** 3, 'T': 1024 ** 4, 'TB': 1024 ** 4}
+
+def parse_size(text):
+    """把 10MB、1.5G、512 这样的大小解析为字节数"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([A-Za-z]*)\s*', text)
+    unit = match.group(2).upper() if match else ''
+    if not match or (unit and unit not in SIZE_UNITS):
+        raise ValueError(f"无法识别的大小：{text}")
+    return int(float(match.group(1)) * SIZE_UNITS.get(unit, 1))
+
+def parse_search_query(text):
+    """解析搜索框中的查询
+
+    支持的写法（可组合，空格分隔）：
+      关键字           键中包含该文本（不区分大小写）
+      ext:jpg,png 或 *.jpg   扩展名
+      >10MB  <1GB  size>=1M   大小范围
+      after:2024-01-01  before:2024-06-30   修改日期（UTC）
+    """
+    query = {'terms': [], 'extensions': [], 'min_size': None, 'max_size': None,
+             'after': None, 'before': None}
+    for token in text.split():
+        lowered = token.lower()
+        size_match = re.fullmatch(r'(?:size)?([<>]=?)(.+)', lowered)
+        if lowered.startswith('ext:'):
+            query['extensions'].extend(ext.lstrip('.') for ext in lowered[4:].split(',') if ext)
+        elif lowered.startswith('*.') and '/' not in lowered:
+            query['extensions'].append(lowered[2:])
+        elif size_match:
+            size = parse_size(size_match.group(2))
+            if size_match.group(1).startswith('>'):
+                query['min_size'] = size + (0 if size_match.group(1) == '>=' else 1)
+            else:
+                query['max_size'] = size - (0 if size_match.group(1) == '<=' else 1)
+        elif lowered.startswith(('after:', 'before:')):
+            name, value = lowered.split(':', 1)
+            try:
+                date = datetime.datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
+            except ValueError:
+                raise ValueError(f"无法识别的日期：{value}，请使用 YYYY-MM-DD 格式")
+            if name == 'before':
+                date += datetime.timedelta(days=1)
+            query[name] = date.timestamp()
+        else:
+            query['terms'].append(token)
+    return query
+
+class ObjectIndex:
+    """整个存储桶的本地对象索引
+
+    使用 SQLite 保存每个对象的键、大小、ETag 和修改时间，搜索时不再请求 R2。
+    refresh() 重新分页遍历存储桶，只更新有变化的行，最后删除已不存在的对象；
+    本工具上传、复制或删除对象后通过 upsert_many()/remove() 立即更新。
+    """
+
+    def __init__(self, db_path=':memory:'):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        # 传输完成后会频繁写入少量行，使用 WAL 并降低同步级别，避免每次提交都等待磁盘
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """CREATE TABLE IF NOT EXISTS objects (
+                bucket TEXT NOT NULL,
+                key TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified REAL NOT NULL,
+                ext TEXT NOT NULL,
+                scan_id INTEGER,
+                PRIMARY KEY (bucket, key)
+            );
+            CREATE INDEX IF NOT EXISTS objects_ext ON objects (bucket, ext);
+            CREATE INDEX IF NOT EXISTS objects_size ON objects (bucket, size);
+            CREATE INDEX IF NOT EXISTS objects_modified ON objects (bucket, last_modified);
+            CREATE TABLE IF NOT EXISTS index_state (
+                bucket TEXT PRIMARY KEY,
+                last_scan REAL NOT NULL
+            );"""
+        )
+        self.conn.commit()
+
+    def last_scan(self, bucket_name):
+        """返回上次完整遍历的时间戳，从未遍历时返回 None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT last_scan FROM index_state WHERE bucket = ?", (bucket_name,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def refresh(self, s3_client, bucket_name, progress_callback=None, max_workers=DEFAULT_LIST_CONCURRENCY,
+                prefix='', page_callback=None):
+        """并行遍历存储桶（或其中 prefix 下的部分）更新索引，返回 (总字节数, 对象数)
+
+        每收到一页都会先调用 page_callback(对象列表)，供导出等功能边遍历边处理。
+        progress_callback(已遍历对象数) 返回 False 时中止，索引保留已更新的部分并返回 None。
+        """
+        scan_started = time.time()
+        scan_id = int(scan_started * 1000)
+        total_size = 0
+        object_count = 0
+        for contents in iter_bucket_pages(s3_client, bucket_name, prefix, max_workers=max_workers):
+            if page_callback:
+                page_callback(contents)
+            rows = []
+            for obj in contents:
+                if obj['Key'].endswith('/'):  # 排除目录
+                    continue
+                rows.append((bucket_name, obj['Key'], obj['Size'], obj.get('ETag', '').strip('"'),
+                             obj['LastModified'].timestamp(), key_extension(obj['Key']), scan_id))
+                total_size += obj['Size']
+                object_count += 1
+            with self._lock:
+                self.conn.executemany(
+                    "INSERT INTO objects (bucket, key, size, etag, last_modified, ext, scan_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (bucket, key) DO UPDATE SET size = excluded.size, etag = excluded.etag, "
+                    "last_modified = excluded.last_modified, scan_id = excluded.scan_id",
+                    rows
+                )
+                self.conn.commit()
+            if progress_callback and progress_callback(object_count) is False:
+                return None
+
+        with self._lock:
+            # 本次没有遍历到的对象已被删除（同时进行的更晚的遍历标记过的行 scan_id 更大，不受影响）；
+            # 遍历期间本工具新上传的对象 scan_id 为空，予以保留
+            self.conn.execute(
+                "DELETE FROM objects WHERE bucket = ? AND key >= ? AND key < ? AND "
+                "(scan_id < ? OR (scan_id IS NULL AND last_modified < ?))",
+                (bucket_name, prefix, prefix + MAX_KEY_CHAR, scan_id, scan_started)
+            )
+            if not prefix:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO index_state (bucket, last_scan) VALUES (?, ?)",
+                    (bucket_name, scan_started)
+                )
+            self.conn.commit()
+        return total_size, object_count
+
+    def upsert(self, bucket_name, key, size, etag=None, last_modified=None):
+        """记录本工具上传的对象"""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO objects (bucket, key, size, etag, last_modified, ext, scan_id) "
+                "VALUES (?, ?, ?, ?, ?, ?, NULL)",
+                (bucket_name, key, size, etag, last_modified or time.time(), key_extension(key))
+            )
+            self.conn.commit()
+
+    def upsert_many(self, bucket_name, objects):
+        """记录本工具上传、复制或移动产生的对象，objects 为 [(键, 大小)]"""
+        now = time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO objects (bucket, key, size, etag, last_modified, ext, scan_id) "
+                "VALUES (?, ?, ?, NULL, ?, ?, NULL)",
+                ((bucket_name, key, size, now, key_extension(key)) for key, size in objects)
+            )
+            self.conn.commit()
+
+    def remove(self, bucket_name, keys):
+        """删除本工具删除的对象"""
+        with self._lock:
+            self.conn.executemany(
+                "DELETE FROM objects WHERE bucket = ? AND key = ?",
+                ((bucket_name, key) for key in keys)
+            )
+            self.conn.commit()
+
+    def get_sizes(self, bucket_name, keys):
+        """返回索引中已记录对象的大小 {键: 大小}，未记录的键不在结果中"""
+        keys = list(keys)
+        sizes = {}
+        with self._lock:
+            # 分组查询，避免超过 SQLite 的参数个数上限
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                sizes.update(self.conn.execute(
+                    f"SELECT key, size FROM objects WHERE bucket = ? AND key IN ({', '.join('?' * len(chunk))})",
+                    [bucket_name] + chunk
+                ).fetchall())
+        return sizes
+
+    def _where(self, bucket_name, query, prefix=''):
+        clauses = ["bucket = ?"]
+        params = [bucket_name]
+        if prefix:
+            clauses.append("key >= ? AND key < ?")
+            params += [prefix, prefix + MAX_KEY_CHAR]
+        for term in query.get('terms', []):
+            escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            clauses.append("key LIKE ? ESCAPE '\\'")
+            params.append(f'%{escaped}%')
+        if query.get('extensions'):
+            clauses.append(f"ext IN ({', '.join('?' * len(query['extensions']))})")
+            params += query['extensions']
+        for column, name, operator in (('size', 'min_size', '>='), ('size', 'max_size', '<='),
+                                       ('last_modified', 'after', '>='), ('last_modified', 'before', '<')):
+            if query.get(name) is not None:
+                clauses.append(f"{column} {operator} ?")
+                params.append(query[name])
+        return ' AND '.join(clauses), params
+
+    def search_page(self, bucket_name, query, after_key='', limit=SEARCH_PAGE_SIZE, prefix=''):
+        """返回键大于 after_key 的一页结果 [(键, 大小, ETag, 修改时间戳)]，按键排序"""
+        where, params = self._where(bucket_name, query, prefix)
+        with self._lock:
+            return self.conn.execute(
+                f"SELECT key, size, etag, last_modified FROM objects WHERE {where} AND key > ? "
+                f"ORDER BY key LIMIT ?",
+                params + [after_key, limit]
+            ).fetchall()
+
+    def iter_search_pages(self, bucket_name, query):
+        """以 list_objects_v2 分页的格式逐页返回搜索结果，供文件列表按需加载"""
+        after_key = ''
+        while True:
+            rows = self.search_page(bucket_name, query, after_key)
+            yield {
+                'Contents': [
+                    {'Key': key, 'Size': size, 'ETag': etag,
+                     'LastModified': datetime.datetime.fromtimestamp(last_modified, datetime.timezone.utc)}
+                    for key, size, etag, last_modified in rows
+                ],
+                'IsTruncated': len(rows) == SEARCH_PAGE_SIZE,
+            }
+            if len(rows) < SEARCH_PAGE_SIZE:
+                return
+            after_key = rows[-1][0]
+
+    def iter_objects(self, bucket_name, prefix='', query=None):
+        """按键顺序逐行返回 (键, 大小, ETag, 修改时间戳)，内存占用与对象数无关"""
+        query = query or {}
+        after_key = ''
+        while True:
+            rows = self.search_page(bucket_name, query, after_key, prefix=prefix)
+            yield from rows
+            if len(rows) < SEARCH_PAGE_SIZE:
+                return
+            after_key = rows[-1][0]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+class UrlExportWriter:
+    """把对象的访问 URL 逐行写入 CSV 或 JSON Lines 文件（可 gzip 压缩），不在内存中累积
+
+    fmt 为 EXPORT_FORMATS 中的键；extensions 不为空时只写出这些扩展名的文件。
+    """
+    EXPORT_FORMATS = {
+        'csv': ('CSV', '.csv'),
+        'csv.gz': ('CSV（gzip 压缩）', '.csv.gz'),
+        'jsonl': ('JSON Lines', '.jsonl'),
+        'jsonl.gz': ('JSON Lines（gzip 压缩）', '.jsonl.gz'),
+    }
+
+    def __init__(self, path, fmt, base_url, extensions=None):
+        self.path = path
+        self.fmt = fmt
+        self.base_url = base_url
+        self.extensions = {ext.lower().lstrip('.') for ext in extensions} if extensions else None
+        self.written = 0
+        # CSV 使用带 BOM 的 utf-8，便于 Excel 直接打开
+        encoding = 'utf-8-sig' if fmt.startswith('csv') else 'utf-8'
+        if fmt.endswith('.gz'):
+            self.file = gzip.open(path, 'wt', encoding=encoding, newline='')
+        else:
+            self.file = open(path, 'w', encoding=encoding, newline='')
+        self.csv_writer = None
+        if fmt.startswith('csv'):
+            self.csv_writer = csv.writer(self.file)
+            self.csv_writer.writerow(['文件名', '文件路径', 'URL', '文件大小', '字节数', '修改时间'])
+
+    def write_objects(self, contents):
+        """写出一页 list_objects_v2 的对象，返回本页写出的行数"""
+        written = 0
+        for obj in contents:
+            key = obj['Key']
+            if key.endswith('/'):  # 排除目录
+                continue
+            if self.extensions is not None and key_extension(key) not in self.extensions:
+                continue
+            url = self.base_url + key
+            last_modified = obj['LastModified'].strftime('%Y-%m-%d %H:%M:%S')
+            if self.csv_writer:
+                self.csv_writer.writerow([
+                    os.path.basename(key), key, url, format_size(obj['Size']), obj['Size'], last_modified
+                ])
+            else:
+                self.file.write(json.dumps({
+                    'name': os.path.basename(key), 'key': key, 'url': url,
+                    'size': obj['Size'], 'last_modified': last_modified
+                }, ensure_ascii=False) + '\n')
+            written += 1
+        self.written += written
+        return written
+
+    def close(self):
+        self.file.close()
+
+class SyncPlan:
+    """文件夹同步计划：需要上传、可跳过和需要删除的文件"""
+
+    def __init__(self, local_folder, target_prefix):
+        self.local_folder = local_folder
+        self.target_prefix = target_prefix
+        self.to_upload = []  # (本地路径, 目标键)
+        self.skipped = []  # 目标键
+        self.to_delete = []  # 远端多余的键
+        self.remote_sizes = {}  # 将被覆盖或删除的远端对象大小，用于更新桶统计
+        self.new_files = 0
+        self.changed_files = 0
+
+def plan_folder_sync(s3_client, bucket_name, local_folder, target_prefix, delete_extra=False,
+                     hash_cache=None):
+    """列出目标前缀一次，与本地文件比较大小、修改时间和 ETag，生成同步计划"""
+    remote_objects = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=target_prefix):
+        for obj in page.get('Contents', []):
+            remote_objects[obj['Key']] = obj
+
+    plan = SyncPlan(local_folder, target_prefix)
+    local_keys = set()
+    # 大小相同但本地修改晚于上传的文件，需要比较 ETag
+    etag_candidates = []
+
+    for root, _, files in os.walk(local_folder):
+        for file in files:
+            local_path = os.path.join(root, file)
+            relative_path = os.path.relpath(local_path, local_folder)
+            r2_key = f"{target_prefix}{relative_path}".replace('\\', '/')
+            local_keys.add(r2_key)
+
+            stat = os.stat(local_path)
+            remote = remote_objects.get(r2_key)
+            if remote is None:
+                plan.new_files += 1
+                plan.to_upload.append((local_path, r2_key))
+            elif remote['Size'] != stat.st_size:
+                plan.changed_files += 1
+                plan.to_upload.append((local_path, r2_key))
+            elif stat.st_mtime <= remote['LastModified'].timestamp():
+                # 大小相同且上传晚于本地修改，无需读取文件
+                plan.skipped.append(r2_key)
+            else:
+                etag_candidates.append((local_path, r2_key))
+
+    if etag_candidates:
+        if hash_cache is None:
+            hash_cache = HashCache()
+        hashes = hash_cache.get_hashes([local_path for local_path, _ in etag_candidates])
+        for local_path, r2_key in etag_candidates:
+            md5, multipart_etag = hashes[os.path.abspath(local_path)]
+            if etag_matches(md5, multipart_etag, remote_objects[r2_key]['ETag']):
+                plan.skipped.append(r2_key)
+            else:
+                plan.changed_files += 1
+                plan.to_upload.append((local_path, r2_key))
+
+    if delete_extra:
+        plan.to_delete = [key for key in remote_objects
+                          if key not in local_keys and not key.endswith('/')]
+
+    for key in [r2_key for _, r2_key in plan.to_upload] + plan.to_delete:
+        if key in remote_objects:
+            plan.remote_sizes[key] = remote_objects[key]['Size']
+
+    return plan
+
+class UploadJournal:
+    """分片上传断点记录（SQLite）
+
+    保存每个进行中的分片上传（存储桶、键、UploadId、文件大小/修改时间及已完成分片的 ETag），
+    程序重启后据此续传缺失的分片。图形界面和命令行可能同时上传，每次读写都直接访问数据库，
+    由 SQLite 的文件锁保证各进程的记录互不覆盖。旧版本的 JSON 记录在首次打开时导入。
+    """
+
+    def __init__(self, db_path=':memory:', legacy_json_path=None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # 另一个进程正在写入时等待，而不是立即失败
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """CREATE TABLE IF NOT EXISTS uploads (
+                bucket TEXT NOT NULL,
+                key TEXT NOT NULL,
+                local_path TEXT NOT NULL,
+                upload_id TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime REAL NOT NULL,
+                chunk_size INTEGER NOT NULL,
+                PRIMARY KEY (bucket, key)
+            );
+            CREATE TABLE IF NOT EXISTS upload_parts (
+                bucket TEXT NOT NULL,
+                key TEXT NOT NULL,
+                part_number INTEGER NOT NULL,
+                etag TEXT NOT NULL,
+                PRIMARY KEY (bucket, key, part_number)
+            );"""
+        )
+        self.conn.commit()
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            self._import_json(legacy_json_path)
+
+    def _import_json(self, json_path):
+        """导入旧版本的 JSON 断点记录，导入后删除该文件"""
+        try:
+            with open(json_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"加载上传断点记录失败: {str(e)}")
+            return
+        with self._lock:
+            for entry in entries.values():
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO uploads (bucket, key, local_path, upload_id, size, mtime, chunk_size) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (entry['bucket'], entry['key'], entry['local_path'], entry['upload_id'],
+                     entry['size'], entry['mtime'], entry['chunk_size'])
+                )
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO upload_parts (bucket, key, part_number, etag) VALUES (?, ?, ?, ?)",
+                    ((entry['bucket'], entry['key'], int(n), etag) for n, etag in entry.get('parts', {}).items())
+                )
+            self.conn.commit()
+        os.remove(json_path)
+
+    @staticmethod
+    def _entry(row):
+        bucket, key, local_path, upload_id, size, mtime, chunk_size = row
+        return {'bucket': bucket, 'key': key, 'local_path': local_path, 'upload_id': upload_id,
+                'size': size, 'mtime': mtime, 'chunk_size': chunk_size}
+
+    def get(self, bucket_name, r2_key):
+        """获取指定对象的断点记录，parts 为 {分片号字符串: ETag}"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT bucket, key, local_path, upload_id, size, mtime, chunk_size FROM uploads "
+                "WHERE bucket = ? AND key = ?", (bucket_name, r2_key)
+            ).fetchone()
+            if row is None:
+                return None
+            entry = self._entry(row)
+            entry['parts'] = {str(n): etag for n, etag in self.conn.execute(
+                "SELECT part_number, etag FROM upload_parts WHERE bucket = ? AND key = ?", (bucket_name, r2_key))}
+        return entry
+
+    def start(self, bucket_name, r2_key, local_path, upload_id, chunk_size):
+        """记录新的分片上传"""
+        stat = os.stat(local_path)
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM upload_parts WHERE bucket = ? AND key = ?", (bucket_name, r2_key))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO uploads (bucket, key, local_path, upload_id, size, mtime, chunk_size) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (bucket_name, r2_key, os.path.abspath(local_path), upload_id, stat.st_size, stat.st_mtime,
+                 chunk_size)
+            )
+            self.conn.commit()
+
+    def set_parts(self, bucket_name, r2_key, parts):
+        """用服务端确认的分片替换记录中的分片列表"""
+        with self._lock:
+            self.conn.execute(
+                "DELETE FROM upload_parts WHERE bucket = ? AND key = ?", (bucket_name, r2_key))
+            self.conn.executemany(
+                "INSERT INTO upload_parts (bucket, key, part_number, etag) "
+                "SELECT bucket, key, ?, ? FROM uploads WHERE bucket = ? AND key = ?",
+                ((n, etag, bucket_name, r2_key) for n, etag in parts.items())
+            )
+            self.conn.commit()
+
+    def add_part(self, bucket_name, r2_key, part_number, etag):
+        """记录一个已完成的分片"""
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO upload_parts (bucket, key, part_number, etag) "
+                "SELECT bucket, key, ?, ? FROM uploads WHERE bucket = ? AND key = ?",
+                (part_number, etag, bucket_name, r2_key)
+            )
+            self.conn.commit()
+
+    def remove(self, bucket_name, r2_key):
+        """删除断点记录"""
+        with self._lock:
+            self.conn.execute("DELETE FROM upload_parts WHERE bucket = ? AND key = ?", (bucket_name, r2_key))
+            self.conn.execute("DELETE FROM uploads WHERE bucket = ? AND key = ?", (bucket_name, r2_key))
+            self.conn.commit()
+
+    def pending(self, bucket_name=None):
+        """列出未完成的上传（不含分片列表），可按存储桶过滤"""
+        query = "SELECT bucket, key, local_path, upload_id, size, mtime, chunk_size FROM uploads"
+        params = ()
+        if bucket_name is not None:
+            query += " WHERE bucket = ?"
+            params = (bucket_name,)
+        with self._lock:
+            return [self._entry(row) for row in self.conn.execute(query, params)]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def matches_file(self, entry, local_path, chunk_size):
+        """检查断点记录是否仍对应当前的本地文件"""
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            return False
+        return (entry.get('local_path') == os.path.abspath(local_path)
+                and entry.get('size') == stat.st_size
+                and entry.get('mtime') == stat.st_mtime
+                and entry.get('chunk_size') == chunk_size)
+
+def abort_pending_upload(s3_client, journal, entry):
+    """中止断点记录中的分片上传并删除记录，服务端已接收的分片随之删除
+
+    分片上传在服务端已不存在时同样删除记录；其他错误向上抛出并保留记录，以便之后再次中止。
+    """
+    try:
+        s3_client.abort_multipart_upload(Bucket=entry['bucket'], Key=entry['key'], UploadId=entry['upload_id'])
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') != 'NoSuchUpload':
+            raise
+    journal.remove(entry['bucket'], entry['key'])
+
+class MultipartUploader:
+    """并发分片上传
+
+    顺序读取文件分片并交给线程池上传，同时在途的分片数量由并发数和内存上限共同限制。
+    提供 journal 时每个完成的分片都会写入断点记录，失败或取消后保留服务端的分片上传以便续传；
+    未提供 journal 时任何失败都会中止整个分片上传。
+    """
+
+    def __init__(self, s3_client, bucket_name, r2_key, local_path,
+                 chunk_size=MULTIPART_CHUNK_SIZE,
+                 max_concurrency=DEFAULT_PART_CONCURRENCY,
+                 max_memory=DEFAULT_PART_MEMORY_LIMIT,
+                 journal=None,
+                 limiter=None):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.r2_key = r2_key
+        self.local_path = local_path
+        self.chunk_size = chunk_size
+        self.journal = journal
+        self.limiter = limiter
+        # 内存上限决定最多能缓存多少个分片，至少保留一个
+        max_parts_in_memory = max(1, max_memory // chunk_size)
+        self.max_in_flight = max(1, min(max_concurrency, max_parts_in_memory))
+
+    def upload(self, progress_callback=None):
+        """执行分片上传，progress_callback(bytes) 返回 False 表示取消"""
+        file_size = os.path.getsize(self.local_path)
+        upload_id, completed = self._resume_upload(file_size)
+
+        if upload_id is None:
+            mpu = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=self.r2_key
+            )
+            upload_id = mpu['UploadId']
+            completed = {}
+            if self.journal:
+                self.journal.start(self.bucket_name, self.r2_key, self.local_path, upload_id, self.chunk_size)
+        elif progress_callback:
+            # 已完成的分片计入进度
+            progress_callback(sum(self._part_size(n, file_size) for n in completed))
+
+        try:
+            parts = self._upload_parts(upload_id, file_size, completed, progress_callback)
+
+            self.s3_client.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=self.r2_key,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}
+            )
+        except Exception:
+            if not self.journal:
+                try:
+                    self.s3_client.abort_multipart_upload(
+                        Bucket=self.bucket_name,
+                        Key=self.r2_key,
+                        UploadId=upload_id
+                    )
+                except Exception:
+                    pass
+            raise
+
+        if self.journal:
+            self.journal.remove(self.bucket_name, self.r2_key)
+
+    def _part_size(self, part_number, file_size):
+        """计算指定分片的字节数"""
+        start = (part_number - 1) * self.chunk_size
+        return max(0, min(self.chunk_size, file_size - start))
+
+    def _resume_upload(self, file_size):
+        """根据断点记录和 list_parts 找回可续传的分片，返回 (UploadId, {分片号: ETag})"""
+        if not self.journal:
+            return None, {}
+
+        entry = self.journal.get(self.bucket_name, self.r2_key)
+        if not entry:
+            return None, {}
+
+        upload_id = entry['upload_id']
+        if not self.journal.matches_file(entry, self.local_path, self.chunk_size):
+            # 本地文件已变化，旧的分片不能再用
+            self._discard_upload(upload_id)
+            return None, {}
+
+        try:
+            server_parts = self._list_uploaded_parts(upload_id)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'NoSuchUpload':
+                self.journal.remove(self.bucket_name, self.r2_key)
+                return None, {}
+            raise
+
+        # 只保留大小正确的分片，记录中缺失但服务端已有的分片（写记录前崩溃）同样可用
+        completed = {}
+        for part_number, (etag, size) in server_parts.items():
+            if size == self._part_size(part_number, file_size) and size > 0:
+                completed[part_number] = etag
+
+        self.journal.set_parts(self.bucket_name, self.r2_key, completed)
+        return upload_id, completed
+
+    def _list_uploaded_parts(self, upload_id):
+        """分页列出服务端已接收的分片"""
+        parts = {}
+        marker = 0
+        while True:
+            response = self.s3_client.list_parts(
+                Bucket=self.bucket_name,
+                Key=self.r2_key,
+                UploadId=upload_id,
+                PartNumberMarker=marker
+            )
+            for part in response.get('Parts', []):
+                parts[part['PartNumber']] = (part['ETag'], part['Size'])
+            if not response.get('IsTruncated'):
+                break
+            marker = response['NextPartNumberMarker']
+        return parts
+
+    def _discard_upload(self, upload_id):
+        """中止并删除已失效的分片上传"""
+        try:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=self.r2_key,
+                UploadId=upload_id
+            )
+        except Exception:
+            pass
+        self.journal.remove(self.bucket_name, self.r2_key)
+
+    def _upload_parts(self, upload_id, file_size, completed, progress_callback):
+        """并发上传缺失的分片，返回按 PartNumber 排序的分片列表"""
+        etags = dict(completed)
+        pending = set()
+        total_parts = max(1, (file_size + self.chunk_size - 1) // self.chunk_size)
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            try:
+                with open(self.local_path, 'rb') as f:
+                    for part_number in range(1, total_parts + 1):
+                        if part_number in completed:
+                            continue
+
+                        # 在途分片达到上限时等待任意一个完成，避免读入过多数据
+                        while len(pending) >= self.max_in_flight:
+                            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                            self._collect_parts(done, etags)
+
+                        f.seek((part_number - 1) * self.chunk_size)
+                        data = f.read(self.chunk_size)
+                        if not data:
+                            break
+
+                        pending.add(executor.submit(
+                            self._upload_part, upload_id, part_number, data, progress_callback
+                        ))
+
+                done, pending = wait(pending)
+                self._collect_parts(done, etags)
+            except Exception:
+                # 取消尚未开始的分片，已在上传的分片由线程池等待结束
+                for future in pending:
+                    future.cancel()
+                raise
+
+        return [{'PartNumber': n, 'ETag': etags[n]} for n in sorted(etags)]
+
+    def _upload_part(self, upload_id, part_number, data, progress_callback):
+        """上传单个分片"""
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.r2_key,
+            PartNumber=part_number,
+            UploadId=upload_id,
+            Body=ThrottledReader(data, self.limiter) if self.limiter else data
+        )
+
+        if self.journal:
+            self.journal.add_part(self.bucket_name, self.r2_key, part_number, response['ETag'])
+
+        if progress_callback and progress_callback(len(data)) is False:
+            raise Exception("上传已取消")
+
+        return part_number, response['ETag']
+
+    def _collect_parts(self, futures, etags):
+        """收集已完成分片的 ETag，分片失败时抛出异常"""
+        for future in futures:
+            part_number, etag = future.result()
+            etags[part_number] = etag
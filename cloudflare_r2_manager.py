@@ -5,229 +5,1286 @@ import urllib3
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QPushButton, QLabel, 
                             QVBoxLayout, QHBoxLayout, QWidget, QFileDialog, 
                             QTextEdit, QLineEdit, QMessageBox, QProgressBar,
-                            QProgressDialog, QTreeWidget, QTreeWidgetItem, QStyle,
+                            QProgressDialog, QStyle,
                             QMenu, QInputDialog, QSizePolicy, QStackedWidget, QListWidget, QListWidgetItem,
                             QTabWidget, QTableWidget, QTableWidgetItem, QHeaderView, QComboBox, QCheckBox,
-                            QScrollArea, QDialog)
-from PyQt6.QtCore import Qt, QDateTime, QThread, pyqtSignal, QSize, QObject
-from PyQt6.QtGui import QKeySequence, QShortcut, QIcon, QPixmap, QImage
-import boto3
-from botocore.config import Config
+                            QScrollArea, QDialog, QTreeView, QAbstractItemView, QListView, QPlainTextEdit,
+                            QDoubleSpinBox)
+from PyQt6.QtCore import (Qt, QDateTime, QThread, pyqtSignal, QSize, QObject, QTimer,
+                          QAbstractItemModel, QAbstractListModel, QModelIndex)
+from PyQt6.QtGui import QKeySequence, QShortcut, QIcon, QPixmap, QImage, QColor, QTextCursor
 import json
 from PyQt6.QtGui import QClipboard
-import csv
 import time
-import math
 import json
 import requests
 import webbrowser
 import threading
 import queue
+import heapq
+import itertools
 import datetime
 import subprocess
 import platform
-import re
 import base64
 import hashlib
 import hmac
 import urllib.parse
-from botocore.exceptions import ClientError
+import logging
+import logging.handlers
+import io
+import codecs
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from botocore.utils import calculate_tree_hash
 from botocore.vendored.requests.packages.urllib3.exceptions import InsecureRequestWarning
+from PIL import Image, ExifTags, PngImagePlugin
+from cloudflare_r2_core import (
+    MULTIPART_THRESHOLD, DEFAULT_PART_CONCURRENCY, DEFAULT_PART_MEMORY_LIMIT, DEFAULT_FILE_CONCURRENCY,
+    DOWNLOAD_STREAM_SIZE, DEFAULT_DOWNLOAD_CONCURRENCY, DELETE_BATCH_SIZE, DEFAULT_MIGRATION_CONCURRENCY,
+    DEFAULT_LISTING_CACHE_TTL, DEFAULT_LIST_CONCURRENCY, DEFAULT_COPY_CONCURRENCY, DEFAULT_DELETE_CONCURRENCY,
+    format_size, format_duration, etag_matches, HashCache, delete_keys_batched, copy_objects,
+    MigrationStore, migrate_objects, local_path_for_key, TransferStore, BandwidthLimiter, RangedDownloader,
+    TransferTelemetry, S3ClientRegistry, warm_up_connections, BucketStats, DirectoryListing,
+    iter_directory_pages, ListingCache, parse_search_query, ObjectIndex, UrlExportWriter, plan_folder_sync,
+    UploadJournal, MultipartUploader, abort_pending_upload
+)
 requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)
 
 # 禁用 SSL 警告
 warnings.filterwarnings('ignore', category=urllib3.exceptions.InsecureRequestWarning)
 
-class UploadThread(QThread):
-    progress_updated = pyqtSignal(int)
-    status_updated = pyqtSignal(str, bool)
-    speed_updated = pyqtSignal(float)
-    upload_finished = pyqtSignal(bool, str)
+# 界面参数
+DEFAULT_BUCKET_RESCAN_HOURS = 24  # 默认每隔多少小时在后台完整重新统计一次桶大小
+DEFAULT_LOG_MAX_LINES = 5000  # 日志视图默认保留的行数
+DEFAULT_LOG_FILE_MAX_MB = 10  # 日志文件单个文件的默认大小上限（MB）
+DEFAULT_LOG_FILE_BACKUPS = 3  # 日志文件默认保留的轮转份数
+TELEMETRY_INTERVAL_MS = 100  # 传输进度的发布间隔（毫秒），即每秒 10 次
+DEFAULT_PREVIEW_TEXT_KB = 64  # 文本预览每次通过 Range 请求读取的大小（KB）
+DEFAULT_THUMBNAIL_CACHE_MB = 200  # 缩略图磁盘缓存的默认大小上限（MB）
+PREVIEW_IMAGE_SIZE = (750, 550)  # 图片预览缩放后的最大尺寸
+PREVIEW_SPOOL_SIZE = 16 * 1024 * 1024  # 预览图片下载时超过该大小转存到临时文件
+GRID_THUMBNAIL_SIZE = (128, 128)  # 缩略图视图中图标的最大尺寸
+THUMBNAIL_PROBE_SIZE = 64 * 1024  # 读取 JPEG 内嵌 EXIF 缩略图时请求的开头字节数
+DEFAULT_THUMBNAIL_CONCURRENCY = 8  # 缩略图视图默认同时进行的下载数
+BROWSE_CONCURRENCY = 4  # 浏览相关请求（列表、预览等）的后台线程数
+TRANSFER_PRIORITY_HIGH = 10  # 单个文件的上传和下载默认优先于批量任务
+TRANSFER_PRIORITY_STEP = 10  # 在传输队列中提高或降低一次优先级的幅度
+
+def fetch_object_range(s3_client, bucket_name, object_key, start, length):
+    """用 Range 请求读取对象从 start 开始的至多 length 字节，返回 (数据, 对象总大小)"""
+    response = s3_client.get_object(
+        Bucket=bucket_name,
+        Key=object_key,
+        Range=f"bytes={start}-{start + length - 1}"
+    )
+    data = response['Body'].read()
+    # ContentRange 形如 "bytes 0-65535/123456"
+    content_range = response.get('ContentRange')
+    total_size = int(content_range.rsplit('/', 1)[1]) if content_range else response['ContentLength']
+    return data, total_size
+
+class TextPreviewPager:
+    """按需分页读取文本对象
+
+    每次只请求 chunk_size 字节，跨页的多字节 UTF-8 字符由增量解码器拼接。
+    """
+
+    def __init__(self, s3_client, bucket_name, object_key, total_size, chunk_size):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.object_key = object_key
+        self.total_size = total_size
+        self.chunk_size = max(1, chunk_size)
+        self.offset = 0
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def has_more(self):
+        return self.offset < self.total_size
+
+    def next_page(self):
+        """读取下一页并返回解码后的文本（可在工作线程中调用，同一时间只能有一个调用）"""
+        if not self.has_more():
+            return ''
+        data, self.total_size = fetch_object_range(
+            self.s3_client, self.bucket_name, self.object_key, self.offset, self.chunk_size)
+        self.offset += len(data)
+        if not data:
+            # 对象在两次请求之间变短
+            self.total_size = self.offset
+        return self.decoder.decode(data, final=not self.has_more())
+
+def make_thumbnail(source, max_size):
+    """用 Pillow 把图片缩放到 max_size 以内，返回 (PNG 数据, 原始宽, 原始高)
+
+    source 为文件路径或文件对象。原始尺寸同时写入 PNG 的 source_size 文本块，
+    缓存命中时无需再次解码原图即可显示。
+    """
+    with Image.open(source) as image:
+        width, height = image.size
+        # JPEG 可在解码时直接按比例缩小，大图省去大部分解码工作
+        image.draft('RGB', max_size)
+        if image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA')
+        image.thumbnail(max_size, Image.Resampling.LANCZOS)
+        info = PngImagePlugin.PngInfo()
+        info.add_text('source_size', f'{width}x{height}')
+        output = io.BytesIO()
+        image.save(output, 'PNG', pnginfo=info, optimize=False)
+    return output.getvalue(), width, height
+
+def fetch_thumbnail(s3_client, bucket_name, object_key, max_size):
+    """下载图片并生成缩略图，返回 (PNG 数据, 原始宽, 原始高, ETag)
+
+    下载内容超过 PREVIEW_SPOOL_SIZE 时转存到临时文件，不会整个读入内存。
+    """
+    response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
+    with tempfile.SpooledTemporaryFile(max_size=PREVIEW_SPOOL_SIZE) as spool:
+        shutil.copyfileobj(response['Body'], spool, DOWNLOAD_STREAM_SIZE)
+        spool.seek(0)
+        thumbnail, width, height = make_thumbnail(spool, max_size)
+    return thumbnail, width, height, response['ETag'].strip('"')
+
+def extract_exif_thumbnail(data):
+    """从 JPEG 开头部分的数据中取出 EXIF 内嵌缩略图，没有时返回 None"""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            exif_data = image.info.get('exif')
+            ifd1 = image.getexif().get_ifd(ExifTags.IFD.IFD1)
+    except Exception:
+        return None
+    offset = ifd1.get(0x0201)  # JPEGInterchangeFormat
+    length = ifd1.get(0x0202)  # JPEGInterchangeFormatLength
+    if not exif_data or offset is None or not length:
+        return None
+    # 偏移量相对于 "Exif\0\0" 之后的 TIFF 头
+    thumbnail = exif_data[6 + offset:6 + offset + length]
+    return thumbnail if len(thumbnail) == length else None
+
+def build_thumbnail(source, max_size):
+    """在工作进程中生成缩略图 PNG，source 为图片数据或文件路径"""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return make_thumbnail(source, max_size)[0]
+
+def fetch_grid_thumbnail(s3_client, bucket_name, object_key, size, etag, max_size, decode):
+    """取得缩略图视图使用的 PNG
+
+    JPEG 先用 Range 请求读取开头 THUMBNAIL_PROBE_SIZE 字节，有 EXIF 内嵌缩略图时不再下载整张图片。
+    请求都带 IfMatch，保证缩略图内容与作为缓存键的 ETag 一致。
+    decode(source) 负责把图片数据或临时文件路径转换为缩略图。
+    """
+    ext = os.path.splitext(object_key)[1].lower()
+    if_match = f'"{etag}"'
+    if ext in ('.jpg', '.jpeg') and size > THUMBNAIL_PROBE_SIZE:
+        response = s3_client.get_object(
+            Bucket=bucket_name,
+            Key=object_key,
+            Range=f"bytes=0-{THUMBNAIL_PROBE_SIZE - 1}",
+            IfMatch=if_match
+        )
+        embedded = extract_exif_thumbnail(response['Body'].read())
+        if embedded:
+            return decode(embedded)
+
+    response = s3_client.get_object(Bucket=bucket_name, Key=object_key, IfMatch=if_match)
+    if size <= PREVIEW_SPOOL_SIZE:
+        return decode(response['Body'].read())
+    # 大图片写入临时文件，只把路径交给解码进程
+    with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as f:
+        shutil.copyfileobj(response['Body'], f, DOWNLOAD_STREAM_SIZE)
+    try:
+        return decode(f.name)
+    finally:
+        os.remove(f.name)
+
+class ThumbnailCache:
+    """磁盘缩略图缓存
+
+    以 (ETag, 尺寸) 为键，每个缩略图一个文件，文件修改时间记录最近访问时间；
+    总大小超过 max_bytes 时删除最久未访问的文件。对象内容不变时 ETag 不变，缓存无需失效。
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_THUMBNAIL_CACHE_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        # 文件名 -> 大小，按访问时间从旧到新排列
+        self.entries = {}
+        files = []
+        for name in os.listdir(cache_dir):
+            if name.endswith('.png'):
+                stat = os.stat(os.path.join(cache_dir, name))
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self.entries[name] = size
+        self.total_bytes = sum(self.entries.values())
+
+    def _file_name(self, etag, max_size):
+        digest = hashlib.sha1(f'{etag}:{max_size[0]}x{max_size[1]}'.encode('utf-8')).hexdigest()
+        return digest + '.png'
+
+    def get(self, etag, max_size):
+        """返回缓存的 PNG 数据，未命中时返回 None"""
+        if not etag:
+            return None
+        name = self._file_name(etag, max_size)
+        path = os.path.join(self.cache_dir, name)
+        with self._lock:
+            if name not in self.entries:
+                return None
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                os.utime(path)
+            except OSError:
+                self.total_bytes -= self.entries.pop(name)
+                return None
+            # 移到末尾表示最近使用
+            self.entries[name] = self.entries.pop(name)
+        return data
+
+    def put(self, etag, max_size, data):
+        """写入缩略图并按需淘汰最久未访问的文件"""
+        if not etag:
+            return
+        name = self._file_name(etag, max_size)
+        path = os.path.join(self.cache_dir, name)
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        with self._lock:
+            self.total_bytes += len(data) - self.entries.pop(name, 0)
+            self.entries[name] = len(data)
+            self._evict()
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            name = next(iter(self.entries))
+            self.total_bytes -= self.entries.pop(name)
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                pass
 
-    def __init__(self, s3_client, bucket_name, local_path, r2_key):
+class SyncPlanThread(QThread):
+    """在后台生成文件夹同步计划"""
+    plan_ready = pyqtSignal(object)
+    plan_failed = pyqtSignal(str)
+
+    def __init__(self, s3_client, bucket_name, local_folder, target_prefix, delete_extra=False,
+                 hash_cache_path=':memory:'):
         super().__init__()
         self.s3_client = s3_client
-        self.current_bucket_name = bucket_name
-        self.local_path = local_path
-        self.r2_key = r2_key
-        self.is_cancelled = False
-        self.last_time = time.time()
-        self.last_uploaded = 0
-        self.total_size = os.path.getsize(local_path)
-
-    def _create_callback(self):
-        """创建上传进度回调"""
-        def callback(bytes_amount):
-            current_time = time.time()
-            self.last_uploaded += bytes_amount
-            
-            # 更新进度
-            percentage = (self.last_uploaded / self.total_size) * 100
-            self.progress_updated.emit(int(percentage))
-            
-            # 计算并更新速度
-            time_diff = current_time - self.last_time
-            if time_diff >= 0.5:  # 每0.5秒更新一次速度
-                speed = bytes_amount / time_diff
-                self.speed_updated.emit(speed)
-                self.last_time = current_time
-            
-            return not self.is_cancelled
-            
-        return callback
+        self.bucket_name = bucket_name
+        self.local_folder = local_folder
+        self.target_prefix = target_prefix
+        self.delete_extra = delete_extra
+        self.hash_cache_path = hash_cache_path
 
     def run(self):
+        hash_cache = None
         try:
-            callback = self._create_callback()
-            
-            if self.total_size > 50 * 1024 * 1024:  # 大于50MB使用分片上传
-                self._upload_large_file(callback)
-            else:
-                self.s3_client.upload_file(
-                    self.local_path,
-                    self.current_bucket_name,
-                    self.r2_key,
-                    Callback=callback
-                )
-
-            self.upload_finished.emit(True, f"文件上传成功：{os.path.basename(self.local_path)}")
+            # SQLite 连接在本线程中创建和关闭
+            hash_cache = HashCache(self.hash_cache_path)
+            plan = plan_folder_sync(
+                self.s3_client,
+                self.bucket_name,
+                self.local_folder,
+                self.target_prefix,
+                self.delete_extra,
+                hash_cache
+            )
+            self.plan_ready.emit(plan)
         except Exception as e:
-            self.upload_finished.emit(False, f"上传失败：{str(e)}")
+            self.plan_failed.emit(str(e))
+        finally:
+            if hash_cache:
+                hash_cache.close()
 
-    def _upload_large_file(self, progress_callback):
-        chunk_size = 20 * 1024 * 1024  # 20MB
+class MigrationThread(QThread):
+    """在后台执行或继续一个跨存储桶迁移任务"""
+    progress_updated = pyqtSignal(int, int, int)  # 已完成对象数, 已完成字节数, 已列出对象数
+    migration_finished = pyqtSignal(int, bool, list, int, int)  # 任务编号, 是否全部完成, [(键, 错误)], 本次复制的对象数和字节数
+
+    def __init__(self, store, job_id, source_client, source_bucket, dest_client, dest_bucket, server_side,
+                 max_concurrency=DEFAULT_MIGRATION_CONCURRENCY):
+        super().__init__()
+        self.store = store
+        self.job_id = job_id
+        self.source_client = source_client
+        self.source_bucket = source_bucket
+        self.dest_client = dest_client
+        self.dest_bucket = dest_bucket
+        self.server_side = server_side
+        self.max_concurrency = max_concurrency
+        self.is_cancelled = False
+        self.last_emit_time = 0
+
+    def _callback(self, done_count, done_bytes, listed):
+        current_time = time.time()
+        if current_time - self.last_emit_time >= 0.5:
+            self.last_emit_time = current_time
+            self.progress_updated.emit(done_count, done_bytes, listed)
+        return not self.is_cancelled
+
+    def run(self):
+        start_count, start_bytes, _ = self.store.progress(self.job_id)
         try:
-            mpu = self.s3_client.create_multipart_upload(
-                Bucket=self.current_bucket_name,
-                Key=self.r2_key
+            completed, errors = migrate_objects(
+                self.store,
+                self.job_id,
+                self.source_client,
+                self.source_bucket,
+                self.dest_client,
+                self.dest_bucket,
+                self.server_side,
+                self.max_concurrency,
+                self._callback
             )
+        except Exception as e:
+            completed, errors = False, [('', str(e))]
+        done_count, done_bytes, _ = self.store.progress(self.job_id)
+        if completed:
+            self.store.remove(self.job_id)
+        self.migration_finished.emit(
+            self.job_id, completed, errors, done_count - start_count, done_bytes - start_bytes)
+
+class UrlExportThread(QThread):
+    """在后台边遍历存储桶边写出 URL 列表，同时更新对象索引"""
+    progress_updated = pyqtSignal(int, int)  # 已遍历对象数, 已写出行数
+    export_finished = pyqtSignal(bool, str, object)  # 是否成功, 消息, (总字节数, 对象数) 或 None
+
+    PROGRESS_INTERVAL = 0.5  # 进度信号的最小间隔（秒）
+
+    def __init__(self, s3_client, bucket_name, object_index, writer, prefix='',
+                 max_workers=DEFAULT_LIST_CONCURRENCY):
+        super().__init__()
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.object_index = object_index
+        self.writer = writer
+        self.prefix = prefix
+        self.max_workers = max_workers
+        self.is_cancelled = False
+        self.last_progress = 0
 
-            parts = []
-            uploaded = 0
-            
-            with open(self.local_path, 'rb') as f:
-                part_number = 1
-                while True:
-                    data = f.read(chunk_size)
-                    if not data:
-                        break
-
-                    response = self.s3_client.upload_part(
-                        Bucket=self.current_bucket_name,
-                        Key=self.r2_key,
-                        PartNumber=part_number,
-                        UploadId=mpu['UploadId'],
-                        Body=data
-                    )
+    def _callback(self, scanned):
+        now = time.time()
+        if now - self.last_progress >= self.PROGRESS_INTERVAL:
+            self.last_progress = now
+            self.progress_updated.emit(scanned, self.writer.written)
+        return not self.is_cancelled
 
-                    parts.append({
-                        'PartNumber': part_number,
-                        'ETag': response['ETag']
-                    })
+    def run(self):
+        try:
+            totals = self.object_index.refresh(
+                self.s3_client, self.bucket_name,
+                progress_callback=self._callback,
+                max_workers=self.max_workers,
+                prefix=self.prefix,
+                page_callback=self.writer.write_objects
+            )
+            self.writer.close()
+            if totals is None:
+                self.export_finished.emit(False, f"导出已取消，已写出 {self.writer.written} 行：{self.writer.path}", None)
+            else:
+                self.export_finished.emit(
+                    True, f"导出完成！共 {self.writer.written} 个文件，导出文件: {self.writer.path}", totals)
+        except Exception as e:
+            self.writer.close()
+            self.export_finished.emit(False, f"导出失败：{str(e)}", None)
+
+class TelemetryPublisher(QObject):
+    """在界面线程中按固定频率采样 TransferTelemetry 并发出一个进度信号
+
+    没有进行中的传输时定时器停止；传输回调不经过 Qt 信号，
+    因此无论有多少并行传输，界面每秒最多收到固定次数的更新。
+    """
+    progress_sampled = pyqtSignal(object)  # {组: TransferProgress}
+
+    def __init__(self, telemetry, interval_ms=TELEMETRY_INTERVAL_MS, parent=None):
+        super().__init__(parent)
+        self.telemetry = telemetry
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval_ms)
+        self.timer.timeout.connect(self.publish)
+
+    def start(self):
+        """有新的传输组时调用（界面线程）"""
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def publish(self):
+        snapshot = self.telemetry.sample()
+        if snapshot:
+            self.progress_sampled.emit(snapshot)
+        if not self.telemetry.has_groups():
+            self.timer.stop()
+
+class TransferBatch:
+    """一次传输操作（上传单个文件、文件夹或一次拖放，下载，复制/移动，删除）包含的全部任务及其结果统计
+
+    kind 为 'upload'、'download'、'copy' 或 'delete'；同一批次中的任务按 priority 调度。
+    """
+
+    def __init__(self, kind, label, bucket_id='', bucket_name='', priority=0, options=None):
+        self.kind = kind
+        self.label = label
+        self.bucket_id = bucket_id
+        self.bucket_name = bucket_name
+        self.priority = priority
+        self.options = options or {}  # 持久化的选项，如移动时的 delete_source、下载的分段并发数
+        self.batch_id = None  # TransferStore 中的批次编号
+        self.sealed = True  # 边列出边加入任务时为 False，全部加入后才可能结束
+        self.total_files = 0
+        self.total_bytes = 0
+        self.finished_files = 0
+        self.completed_files = 0
+        self.failed_files = []
+        self.cancelled = False
+        self.skipped_files = 0  # 同步模式下未变化、或下载时本地已存在而跳过的文件数
+        self.delete_keys = []  # 同步模式下上传完成后需删除的远端对象
+        self.remote_sizes = {}  # 同步模式下已知的远端对象大小
+        # 已完成任务对桶统计的影响，批次结束时一次写入 BucketStats
+        self.bytes_delta = 0
+        self.count_delta = 0
+
+    def is_finished(self):
+        return self.sealed and self.finished_files >= self.total_files
+
+class TransferTask:
+    """队列中的单个任务
+
+    上传时 source 为本地路径、dest 为对象键；下载时 source 为对象键、dest 为本地路径；
+    复制时两者均为对象键；删除时只使用 source。
+    """
+
+    def __init__(self, batch, s3_client, source, dest='', size=0, etag='', options=None):
+        self.batch = batch
+        self.s3_client = s3_client
+        self.source = source
+        self.dest = dest
+        self.size = size
+        self.etag = etag
+        self.options = options or {}  # 不需持久化的执行参数，如分片上传的并发数和断点记录
+        self.job_id = None
+        self.seq = 0
+        self.skipped = False
+        # 上传或复制前目标键上已有对象的大小，取自同步计划、对象索引或目录列表缓存，都没有记录时视为新对象
+        self.previous_size = 0
+        self.previous_existed = False
+
+    @property
+    def bucket_name(self):
+        return self.batch.bucket_name
+
+    @property
+    def key(self):
+        """任务涉及的对象键"""
+        return self.dest if self.batch.kind == 'upload' else self.source
+
+class TransferQueue(QObject):
+    """持久化的传输调度队列
+
+    上传、下载、复制和删除任务先写入 TransferStore，再按批次优先级（相同优先级按加入顺序）排队，
+    所有类型的任务共享 max_workers 个执行名额。任务结束通过信号回到界面线程记录结果并调度下一个任务，
+    不需要轮询。同一批次中相邻的复制任务合并为一组，在一个名额中用 copy_concurrency 个线程复制，
+    移动时整组复制完成后批量删除源对象；相邻的删除任务同样合并，用 delete_concurrency 个并发的
+    delete_objects 请求删除。任务结果先在界面线程中缓存，定时或批次结束时在一个事务中写入 TransferStore，
+    并通过 files_finished 一次交给界面处理。
+    上传和下载的字节数计入 telemetry，由 TelemetryPublisher 定时发布进度；提供 limiter 时共享同一个限速。
+    """
+    files_finished = pyqtSignal(list)  # [(任务, 是否成功, 错误信息)]
+    batch_finished = pyqtSignal(object)  # 批次
+    FLUSH_INTERVAL_MS = 200
+    _task_done = pyqtSignal(object, bool, str)
+    _slot_released = pyqtSignal()
+
+    def __init__(self, telemetry, store, max_workers=DEFAULT_FILE_CONCURRENCY, parent=None, limiter=None,
+                 hash_cache_path=':memory:', copy_concurrency=DEFAULT_COPY_CONCURRENCY,
+                 delete_concurrency=DEFAULT_DELETE_CONCURRENCY):
+        super().__init__(parent)
+        self.telemetry = telemetry
+        self.store = store
+        self.limiter = limiter
+        self.max_workers = max(1, max_workers)
+        self.copy_concurrency = max(1, copy_concurrency)
+        self.delete_concurrency = max(1, delete_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self.hash_cache = HashCache(hash_cache_path)
+        self.queue = []  # 堆：(-优先级, 序号, 任务)
+        self.sequence = itertools.count()
+        self.running_tasks = set()
+        self.running = 0
+        self.active_batches = []
+        self.closing = False
+        self.finished_results = []  # 尚未写入 TransferStore 的任务结果
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(self.FLUSH_INTERVAL_MS)
+        self.flush_timer.timeout.connect(self.flush)
+        # 工作线程发出的信号以队列方式回到界面线程处理
+        self._task_done.connect(self._handle_task_done)
+        self._slot_released.connect(self._handle_slot_released)
+
+    def submit_batch(self, batch, tasks):
+        """把任务加入批次并开始调度，新任务先写入持久化记录（恢复的任务已有记录）"""
+        if batch.batch_id is None:
+            batch.batch_id = self.store.create_batch(
+                batch.kind, batch.label, batch.bucket_id, batch.bucket_name, batch.priority, batch.options)
+        new_tasks = [task for task in tasks if task.job_id is None]
+        if new_tasks:
+            job_ids = self.store.add_jobs(
+                batch.batch_id, [(task.source, task.dest, task.size, task.etag) for task in new_tasks])
+            for task, job_id in zip(new_tasks, job_ids):
+                task.job_id = job_id
+
+        batch.total_files += len(tasks)
+        new_bytes = sum(task.size for task in tasks) if batch.kind in ('upload', 'download') else 0
+        batch.total_bytes += new_bytes
+        self.telemetry.begin_group(batch, batch.label, new_bytes)
+        if batch not in self.active_batches:
+            self.active_batches.append(batch)
+
+        for task in tasks:
+            task.seq = next(self.sequence)
+            heapq.heappush(self.queue, (-batch.priority, task.seq, task))
+        if batch.is_finished():
+            self._finish_batch(batch)
+        self._dispatch()
+
+    def seal_batch(self, batch):
+        """边列出边加入任务的批次已加入全部任务"""
+        batch.sealed = True
+        if batch.is_finished():
+            self._finish_batch(batch)
+
+    def set_priority(self, batch, priority):
+        """调整批次的优先级，对尚未开始的任务立即生效"""
+        batch.priority = priority
+        self.store.set_priority(batch.batch_id, priority)
+        self.queue = [(-task.batch.priority, seq, task) for _, seq, task in self.queue]
+        heapq.heapify(self.queue)
+
+    def cancel_batch(self, batch):
+        """取消批次：移除尚未开始的任务，进行中的任务在当前请求完成后停止"""
+        batch.cancelled = True
+        remaining = [entry for entry in self.queue if entry[2].batch is not batch]
+        removed = len(self.queue) - len(remaining)
+        self.queue = remaining
+        heapq.heapify(self.queue)
+        self.store.cancel_pending(batch.batch_id)
+        batch.finished_files += removed
+        if batch.is_finished():
+            self._finish_batch(batch)
+
+    def cancel_all(self):
+        """取消所有批次中尚未完成的任务"""
+        for batch in list(self.active_batches):
+            self.cancel_batch(batch)
+
+    def has_active_batches(self):
+        return bool(self.active_batches)
+
+    def active_upload_keys(self):
+        """排队或进行中的上传 {(存储桶, 对象键)}"""
+        tasks = [entry[2] for entry in self.queue] + list(self.running_tasks)
+        return {(task.bucket_name, task.dest) for task in tasks if task.batch.kind == 'upload'}
+
+    def shutdown(self):
+        """停止调度并中断进行中的任务，未完成的任务保留在持久化记录中，下次启动时继续"""
+        self.flush()
+        self.closing = True
+        for batch in self.active_batches:
+            batch.cancelled = True
+        self.queue = []
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatch(self):
+        """在空闲的执行名额中按优先级启动任务"""
+        while self.running < self.max_workers and self.queue and not self.closing:
+            _, _, task = heapq.heappop(self.queue)
+            tasks = [task]
+            group_size = self._group_size(task.batch)
+            # 同一批次中相邻的复制或删除任务合并为一组
+            while (len(tasks) < group_size and self.queue
+                   and self.queue[0][2].batch is task.batch):
+                tasks.append(heapq.heappop(self.queue)[2])
+            self.running += 1
+            self.running_tasks.update(tasks)
+            self.executor.submit(self._run_tasks, tasks)
+
+    def _group_size(self, batch):
+        """一个执行名额一次处理的任务数：移动的一组正好对应一次 delete_objects，删除的一组供所有并发请求使用"""
+        if batch.kind == 'copy':
+            return DELETE_BATCH_SIZE
+        if batch.kind == 'delete':
+            return DELETE_BATCH_SIZE * self.delete_concurrency
+        return 1
+
+    def _run_tasks(self, tasks):
+        """在工作线程中执行一个任务，或一组合并的复制或删除任务"""
+        try:
+            batch = tasks[0].batch
+            if batch.cancelled:
+                for task in tasks:
+                    self._task_done.emit(task, False, '已取消')
+            elif batch.kind == 'copy':
+                self._run_copy(tasks)
+            elif batch.kind == 'delete':
+                self._run_delete(tasks)
+            else:
+                self._run_task(tasks[0])
+        finally:
+            self._slot_released.emit()
 
-                    uploaded += len(data)
-                    progress_callback(len(data))
-                    part_number += 1
+    def _run_task(self, task):
+        batch = task.batch
 
-            self.s3_client.complete_multipart_upload(
-                Bucket=self.current_bucket_name,
-                Key=self.r2_key,
-                UploadId=mpu['UploadId'],
-                MultipartUpload={'Parts': parts}
-            )
+        def callback(bytes_amount):
+            self.telemetry.add(task, bytes_amount)
+            return not batch.cancelled
 
+        if batch.kind in ('upload', 'download'):
+            label = os.path.basename(task.source if batch.kind == 'upload' else task.dest)
+            self.telemetry.begin(task, batch, label, task.size)
+        try:
+            if batch.kind == 'upload':
+                self._upload(task, callback)
+            elif batch.kind == 'download':
+                self._download(task, callback)
+            else:
+                raise Exception(f"未知的任务类型: {batch.kind}")
+            self._task_done.emit(task, True, '')
         except Exception as e:
-            try:
-                self.s3_client.abort_multipart_upload(
-                    Bucket=self.current_bucket_name,
-                    Key=self.r2_key,
-                    UploadId=mpu['UploadId']
-                )
-            except:
-                pass
-            raise e
+            self._task_done.emit(task, False, str(e))
+        finally:
+            self.telemetry.end(task)
+
+    def _upload(self, task, callback):
+        if task.size > MULTIPART_THRESHOLD:
+            uploader = MultipartUploader(
+                task.s3_client,
+                task.bucket_name,
+                task.dest,
+                task.source,
+                limiter=self.limiter,
+                **task.options
+            )
+            uploader.upload(callback)
+        else:
+            def throttled(bytes_amount):
+                # upload_file 在发送请求体时回调，在这里阻塞即可限制发送速度；
+                # 分片上传由 MultipartUploader 按分片请求体限速，断点续传报告的已完成分片不再计入
+                if self.limiter:
+                    self.limiter.consume(bytes_amount)
+                return callback(bytes_amount)
+
+            task.s3_client.upload_file(
+                task.source,
+                task.bucket_name,
+                task.dest,
+                Callback=throttled
+            )
 
-class UploadProgressCallback:
-    def __init__(self, total_size, progress_callback, status_callback, speed_callback):
-        self.total_size = total_size
-        self.uploaded = 0
-        self.last_time = time.time()
-        self.last_uploaded = 0
-        self.progress_callback = progress_callback
-        self.status_callback = status_callback
-        self.speed_callback = speed_callback
-        self.update_interval = 0.1  # 更新间隔（秒）
-
-    def __call__(self, bytes_amount):
-        self.uploaded += bytes_amount
-        current_time = time.time()
-        time_diff = current_time - self.last_time
+    def _download(self, task, callback):
+        """下载一个对象，本地已存在且大小和 ETag 一致时跳过"""
+        if task.source.endswith('/'):
+            # 目录占位对象只创建目录
+            os.makedirs(task.dest, exist_ok=True)
+            task.skipped = True
+            return
+        os.makedirs(os.path.dirname(task.dest) or '.', exist_ok=True)
+        if not task.etag:
+            head = task.s3_client.head_object(Bucket=task.bucket_name, Key=task.source)
+            task.size, task.etag = head['ContentLength'], head['ETag']
+            # 加入队列时大小未知，这里补上总字节数
+            self.telemetry.begin_group(task.batch, task.batch.label, task.size)
+            self.telemetry.begin(task, task.batch, os.path.basename(task.dest), task.size)
+        if self._is_up_to_date(task):
+            task.skipped = True
+            return
 
-        # 控制更新频率
-        if time_diff >= self.update_interval:
-            percentage = (self.uploaded / self.total_size) * 100
-            self.progress_callback(int(percentage))
+        downloader = RangedDownloader(
+            task.s3_client,
+            task.bucket_name,
+            task.source,
+            task.dest,
+            max_concurrency=task.batch.options.get('max_concurrency', 1),
+            limiter=self.limiter
+        )
+        downloader.download(callback, head={'ContentLength': task.size, 'ETag': task.etag})
 
-            # 计算速度
-            speed = (self.uploaded - self.last_uploaded) / time_diff
-            self.speed_callback(speed)
+    def _is_up_to_date(self, task):
+        if not os.path.isfile(task.dest) or os.path.getsize(task.dest) != task.size:
+            return False
+        md5, multipart_etag = self.hash_cache.get_hashes([task.dest])[os.path.abspath(task.dest)]
+        return etag_matches(md5, multipart_etag, task.etag)
 
-            # 只在100%时发送状态更新
-            if percentage >= 100:
-                self.status_callback(f"上传完成 - {percentage:.1f}%", False)
+    def _run_copy(self, tasks):
+        """服务端并发复制一组对象，移动时在复制完成后批量删除已复制的源对象"""
+        batch = tasks[0].batch
+        try:
+            copied, errors = copy_objects(
+                tasks[0].s3_client,
+                tasks[0].bucket_name,
+                [(task.source, task.dest, task.size) for task in tasks],
+                delete_source=batch.options.get('delete_source', False),
+                max_concurrency=self.copy_concurrency,
+                delete_concurrency=self.delete_concurrency,
+                # 取消后不再提交新的复制，已复制的源对象仍会删除
+                progress_callback=lambda stage, count: not batch.cancelled
+            )
+        except Exception as e:
+            copied, errors = [], [(task.source, str(e)) for task in tasks]
+        copied_keys = {source_key for source_key, _, _ in copied}
+        errors = dict(errors)
+        for task in tasks:
+            if task.source in copied_keys:
+                self._task_done.emit(task, True, '')
+            elif task.source in errors:
+                self._task_done.emit(task, False, errors[task.source])
+            elif batch.cancelled:
+                self._task_done.emit(task, False, '已取消')
+            else:
+                # 源键与目标键相同，无需复制
+                task.skipped = True
+                self._task_done.emit(task, True, '')
 
-            self.last_time = current_time
-            self.last_uploaded = self.uploaded
+    def _run_delete(self, tasks):
+        keys = [task.source for task in tasks]
+        try:
+            deleted_keys, errors = delete_keys_batched(
+                tasks[0].s3_client, tasks[0].bucket_name, keys, max_concurrency=self.delete_concurrency)
+        except Exception as e:
+            deleted_keys, errors = [], [(key, str(e)) for key in keys]
+        deleted_keys = set(deleted_keys)
+        errors = dict(errors)
+        for task in tasks:
+            if task.source in deleted_keys:
+                self._task_done.emit(task, True, '')
+            else:
+                self._task_done.emit(task, False, errors.get(task.source, '删除失败'))
 
+    def _handle_task_done(self, task, success, message):
+        """界面线程中记录单个任务的结果"""
+        self.running_tasks.discard(task)
+        if self.closing:
+            # 退出时被中断的任务保持未完成状态，下次启动时继续
+            return
+        batch = task.batch
+        self.finished_results.append((task, success, message))
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+        batch.finished_files += 1
+        if success and task.skipped:
+            batch.skipped_files += 1
+        elif success:
+            batch.completed_files += 1
+        elif not batch.cancelled:
+            batch.failed_files.append((task.key, message))
+
+        if batch.is_finished():
+            self._finish_batch(batch)
+
+    def _handle_slot_released(self):
+        self.running -= 1
+        self._dispatch()
+
+    def flush(self):
+        """把缓存的任务结果在一个事务中写入持久化记录，并一次交给界面处理"""
+        self.flush_timer.stop()
+        if not self.finished_results:
+            return
+        results, self.finished_results = self.finished_results, []
+        self.store.set_states([
+            (task.job_id, 'done' if success else 'cancelled' if task.batch.cancelled else 'failed', message)
+            for task, success, message in results
+        ])
+        self.files_finished.emit(results)
+
+    def _finish_batch(self, batch):
+        # 批次的结果全部交给界面后才发出 batch_finished
+        self.flush()
+        if batch in self.active_batches:
+            self.active_batches.remove(batch)
+        self.telemetry.end_group(batch)
+        self.store.remove_batch(batch.batch_id)
+        self.batch_finished.emit(batch)
+
+class RingBuffer:
+    """固定容量的环形缓冲区，写满后覆盖最旧的元素，按下标访问为 O(1)（0 为最旧）"""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.items = [None] * capacity
+        self.start = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        return self.items[(self.start + index) % self.capacity]
+
+    def append(self, item):
+        """追加一个元素，返回是否覆盖了最旧的元素"""
+        self.items[(self.start + self.count) % self.capacity] = item
+        if self.count < self.capacity:
+            self.count += 1
+            return False
+        self.start = (self.start + 1) % self.capacity
         return True
 
-class UploadWorker:
-    def __init__(self, parent):
-        self.parent = parent
-        self.last_time = time.time()
-        self.last_uploaded = 0
+    def drop_oldest(self, count):
+        """丢弃最旧的 count 个元素"""
+        count = min(count, self.count)
+        for offset in range(count):
+            self.items[(self.start + offset) % self.capacity] = None
+        self.start = (self.start + count) % self.capacity
+        self.count -= count
+
+    def clear(self):
+        self.items = [None] * self.capacity
+        self.start = 0
+        self.count = 0
+
+class ActivityLogModel(QAbstractListModel):
+    """运行日志模型
+
+    日志按级别保存在固定容量的环形缓冲区中，最新的显示在最上面。新消息先进入待显示队列，
+    由定时器批量插入视图，单条消息的开销与历史长度无关；可选同时写入轮转的日志文件。
+    """
+    LEVEL_FILTERS = [('全部', None), ('信息', 'info'), ('错误', 'error')]
+    FLUSH_INTERVAL_MS = 200
+
+    def __init__(self, max_lines=DEFAULT_LOG_MAX_LINES, parent=None):
+        super().__init__(parent)
+        self.level_filter = None
+        self.pending = queue.SimpleQueue()
+        self.logger = None
+        self._create_buffers(max_lines)
+        self.timer = QTimer(self)
+        self.timer.setInterval(self.FLUSH_INTERVAL_MS)
+        self.timer.timeout.connect(self.flush)
+        self.timer.start()
+
+    def _create_buffers(self, max_lines):
+        self.max_lines = max(1, max_lines)
+        self.buffers = {level: RingBuffer(self.max_lines) for _, level in self.LEVEL_FILTERS}
+
+    def configure(self, max_lines, log_path=None, max_bytes=DEFAULT_LOG_FILE_MAX_MB * 1024 * 1024,
+                  backup_count=DEFAULT_LOG_FILE_BACKUPS):
+        """设置保留行数和日志文件，log_path 为 None 时不写文件"""
+        if max_lines != self.max_lines:
+            self.beginResetModel()
+            self._create_buffers(max_lines)
+            self.endResetModel()
+
+        if self.logger:
+            for handler in list(self.logger.handlers):
+                self.logger.removeHandler(handler)
+                handler.close()
+            self.logger = None
+        if log_path:
+            self.logger = logging.getLogger('cloudflare_r2_manager.activity')
+            self.logger.setLevel(logging.INFO)
+            self.logger.propagate = False
+            handler = logging.handlers.RotatingFileHandler(
+                log_path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+            )
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+            self.logger.addHandler(handler)
+
+    def append(self, level, message):
+        """记录一条消息（可在任意线程调用），视图在下次定时刷新时更新"""
+        self.pending.put((time.strftime('%Y-%m-%d %H:%M:%S'), level, message))
+        if self.logger:
+            self.logger.log(logging.ERROR if level == 'error' else logging.INFO, message)
+
+    def flush(self):
+        """把待显示的消息批量插入视图"""
+        batch = []
+        while True:
+            try:
+                batch.append(self.pending.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return
 
-    def __call__(self, bytes_amount):
-        current_time = time.time()
-        self.last_uploaded += bytes_amount
-        
-        # 更新进度
-        if hasattr(self.parent, 'progress_bar'):
-            percentage = (self.last_uploaded / self.total_size) * 100 if hasattr(self, 'total_size') else 0
-            self.parent.progress_bar.setValue(int(percentage))
-        
-        # 计算并更新速度
-        time_diff = current_time - self.last_time
-        if time_diff >= 0.5:  # 每0.5秒更新一次速度
-            speed = bytes_amount / time_diff
-            if hasattr(self.parent, 'update_upload_info'):
-                self.parent.update_upload_info(
-                    os.path.dirname(self.file_path) if hasattr(self, 'file_path') else '',
-                    self.total_files if hasattr(self, 'total_files') else 1,
-                    self.uploaded_files if hasattr(self, 'uploaded_files') else 0,
-                    os.path.basename(self.file_path) if hasattr(self, 'file_path') else '',
-                    self.total_size if hasattr(self, 'total_size') else 0,
-                    speed
+        for _, level in self.LEVEL_FILTERS:
+            entries = [entry for entry in batch if level is None or entry[1] == level][-self.max_lines:]
+            if not entries:
+                continue
+            buffer = self.buffers[level]
+            if level != self.level_filter:
+                for entry in entries:
+                    buffer.append(entry)
+                continue
+
+            # 最旧的行显示在最下面，先移除将被覆盖的行，再在顶部插入新行
+            overflow = len(buffer) + len(entries) - self.max_lines
+            if overflow > 0:
+                self.beginRemoveRows(QModelIndex(), len(buffer) - overflow, len(buffer) - 1)
+                buffer.drop_oldest(overflow)
+                self.endRemoveRows()
+            self.beginInsertRows(QModelIndex(), 0, len(entries) - 1)
+            for entry in entries:
+                buffer.append(entry)
+            self.endInsertRows()
+
+    def set_level_filter(self, level):
+        self.beginResetModel()
+        self.level_filter = level
+        self.endResetModel()
+
+    def clear(self):
+        self.beginResetModel()
+        for buffer in self.buffers.values():
+            buffer.clear()
+        self.endResetModel()
+
+    def entry_text(self, row):
+        buffer = self.buffers[self.level_filter]
+        timestamp, level, message = buffer[len(buffer) - 1 - row]
+        return f"[{timestamp}] {'❌ ' if level == 'error' else '✅ '}{message}"
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.buffers[self.level_filter])
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            # 多行消息显示为一行，完整内容见提示
+            return self.entry_text(index.row()).replace('\n', ' ')
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return self.entry_text(index.row())
+        if role == Qt.ItemDataRole.ForegroundRole:
+            buffer = self.buffers[self.level_filter]
+            if buffer[len(buffer) - 1 - index.row()][1] == 'error':
+                return QColor('red')
+        return None
+
+# 支持预览的文件类型
+PREVIEW_IMAGE_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.gif', '.bmp']
+PREVIEW_TEXT_EXTENSIONS = ['.txt', '.md', '.json', '.xml', '.html', '.css', '.js', '.py', '.log']
+
+class FileListEntry:
+    """文件列表中的一行"""
+
+    def __init__(self, name, key, is_dir, size, etag=''):
+        self.name = name
+        self.key = key
+        self.is_dir = is_dir
+        self.size = size
+        self.etag = etag
+
+class ObjectListModel(QAbstractItemModel):
+    """文件列表模型
+
+    数据保存在 DirectoryListing 的并行数组中，视图滚动到底部时通过 fetchMore 在后台按页加载，
+    各列文本和图标只在绘制时生成。
+    """
+    HEADERS = ['名称', '类型', '大小', '修改时间']
+
+    listing_completed = pyqtSignal(object)  # 全部分页加载完成的 DirectoryListing
+    fetch_failed = pyqtSignal(str)
+    loading_changed = pyqtSignal(bool)  # 是否正在后台请求分页
+
+    def __init__(self, gui):
+        super().__init__(gui)
+        self.gui = gui
+        self.listing = DirectoryListing('')
+        self.pages = None
+        self.pages_loaded = 0
+        self.fetching = False
+        self._icon_cache = {}
+        # 缩略图视图显示时为 ThumbnailLoader，图片行的图标换成缩略图
+        self.thumbnail_loader = None
+
+    def set_listing(self, listing, pages=None):
+        """显示一个目录，pages 为尚未加载的分页迭代器"""
+        # 丢弃上一个目录还未返回的分页
+        self.gui.request_executor.cancel('listing')
+        self.beginResetModel()
+        self.listing = listing
+        self.pages = pages
+        self.pages_loaded = 0
+        if self.thumbnail_loader is not None:
+            self.thumbnail_loader.clear_queue()
+        self._set_fetching(False)
+        self.endResetModel()
+        # 首页不等视图请求，立即加载
+        if self.canFetchMore(QModelIndex()):
+            self.fetchMore(QModelIndex())
+
+    def _set_fetching(self, fetching):
+        if fetching != self.fetching:
+            self.fetching = fetching
+            self.loading_changed.emit(fetching)
+
+    def entry(self, row):
+        """返回指定行的 FileListEntry"""
+        listing = self.listing
+        return FileListEntry(listing.names[row], listing.keys[row],
+                             bool(listing.is_dirs[row]), listing.sizes[row], listing.etags[row])
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0 <= row < len(self.listing)) or not (0 <= column < len(self.HEADERS)):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.listing)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        row, column = index.row(), index.column()
+        listing = self.listing
+        is_dir = listing.is_dirs[row]
+
+        if role == Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return listing.names[row]
+            if column == 1:
+                return '目录' if is_dir else self.gui._get_file_type(listing.names[row])
+            if is_dir:
+                return None
+            if column == 2:
+                return self.gui._format_size(listing.sizes[row])
+            if column == 3:
+                modified = datetime.datetime.fromtimestamp(listing.mtimes[row], datetime.timezone.utc)
+                return modified.strftime('%Y-%m-%d %H:%M:%S')
+        elif role == Qt.ItemDataRole.DecorationRole and column == 0:
+            if self.thumbnail_loader is not None and not is_dir and \
+                    os.path.splitext(listing.names[row])[1].lower() in PREVIEW_IMAGE_EXTENSIONS:
+                # 只有视图实际绘制的行才会请求图标，因此只加载可见图片的缩略图
+                pixmap = self.thumbnail_loader.pixmap(
+                    self.gui.s3_client, self.gui.current_bucket_name,
+                    listing.keys[row], listing.sizes[row], listing.etags[row]
                 )
-            self.last_time = current_time
-        
-        return True
+                if pixmap is not None:
+                    return pixmap
+            return self._icon_for(listing.names[row], is_dir)
+        elif role == Qt.ItemDataRole.UserRole:
+            return listing.keys[row]
+        return None
+
+    def _icon_for(self, name, is_dir):
+        """按扩展名缓存图标"""
+        ext = '/' if is_dir else os.path.splitext(name)[1].lower()
+        if ext not in self._icon_cache:
+            if is_dir:
+                self._icon_cache[ext] = self.gui.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon)
+            else:
+                self._icon_cache[ext] = self.gui._get_file_icon(name)
+        return self._icon_cache[ext]
 
-    def set_file_info(self, file_path, total_size, part_number=None, total_parts=None):
-        self.file_path = file_path
-        self.total_size = total_size
-        self.part_number = part_number
-        self.total_parts = total_parts
-        self.last_uploaded = 0
-        self.last_time = time.time()
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.pages is not None and not self.fetching
+
+    def fetchMore(self, parent=QModelIndex()):
+        """在后台请求下一页"""
+        if not self.canFetchMore(parent):
+            return
+        pages = self.pages
+        self._set_fetching(True)
+        self.gui.request_executor.submit(
+            'listing', lambda: next(pages, None), self._on_page_loaded, self._on_page_failed
+        )
+
+    def _on_page_failed(self, error):
+        self.pages = None
+        self._set_fetching(False)
+        self.fetch_failed.emit(error)
+
+    def _on_page_loaded(self, page):
+        """分页返回后追加到列表末尾"""
+        self._set_fetching(False)
+        if page is not None:
+            self.pages_loaded += 1
+            rows = self.listing.parse_page(page)
+            if rows:
+                start = len(self.listing)
+                self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+                self.listing.extend(rows)
+                self.endInsertRows()
+
+        # 最后一页不再等下一次 fetchMore
+        if page is None or not page.get('IsTruncated'):
+            self.pages = None
+            self.listing.complete = True
+            self.listing_completed.emit(self.listing)
+        elif not rows:
+            # 空页不会触发视图继续加载
+            self.fetchMore(QModelIndex())
+
+class ThumbnailLoader(QObject):
+    """缩略图视图的缩略图加载器
+
+    视图绘制图片行时调用 pixmap()：内存中已有时直接返回，否则排队后台加载。排队的请求后进先出，
+    滚动时最新可见的图片优先，超过 QUEUE_LIMIT 的旧请求直接丢弃。同时最多 max_workers 个请求，
+    图片在进程池中解码缩放，结果写入按 ETag 索引的磁盘缓存。
+    """
+    QUEUE_LIMIT = 256  # 等待加载的最多请求数
+    MEMORY_ITEMS = 2000  # 内存中保留的缩略图数
+
+    thumbnails_loaded = pyqtSignal()  # 有新的缩略图可以显示（短时间内多次完成只发一次）
+    _loaded = pyqtSignal(str, object)  # ETag, PNG 数据（失败时为 None）
+
+    def __init__(self, cache, max_size=GRID_THUMBNAIL_SIZE,
+                 max_workers=DEFAULT_THUMBNAIL_CONCURRENCY, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.max_size = max_size
+        self.max_workers = max(1, max_workers)
+        self.executor = None
+        self.process_pool = None
+        self.pixmaps = {}  # ETag -> QPixmap，按最近使用排列
+        self.queued = {}  # ETag -> (S3 客户端, 存储桶, 键, 大小)
+        self.running = set()
+        self.failed = set()
+        self._loaded.connect(self._on_loaded)
+        # 合并短时间内完成的多个缩略图，只重绘一次
+        self.repaint_timer = QTimer(self)
+        self.repaint_timer.setSingleShot(True)
+        self.repaint_timer.setInterval(50)
+        self.repaint_timer.timeout.connect(self.thumbnails_loaded)
+
+    def pixmap(self, s3_client, bucket_name, object_key, size, etag):
+        """返回已加载的缩略图，没有时排队加载并返回 None"""
+        if not etag or etag in self.failed:
+            return None
+        pixmap = self.pixmaps.pop(etag, None)
+        if pixmap is not None:
+            self.pixmaps[etag] = pixmap
+            return pixmap
+        if etag not in self.running:
+            self.queued.pop(etag, None)
+            self.queued[etag] = (s3_client, bucket_name, object_key, size)
+            while len(self.queued) > self.QUEUE_LIMIT:
+                del self.queued[next(iter(self.queued))]
+            self._dispatch()
+        return None
+
+    def clear_queue(self):
+        """切换目录时丢弃尚未开始的请求，并允许重试失败的图片"""
+        self.queued.clear()
+        self.failed.clear()
+
+    def _dispatch(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            self.process_pool = ProcessPoolExecutor(max_workers=min(self.max_workers, os.cpu_count() or 1))
+        while self.queued and len(self.running) < self.max_workers:
+            etag, request = self.queued.popitem()
+            self.running.add(etag)
+            self.executor.submit(self._load, etag, *request)
+
+    def _load(self, etag, s3_client, bucket_name, object_key, size):
+        """在工作线程中先查磁盘缓存，未命中时下载并生成缩略图"""
+        try:
+            data = self.cache.get(etag, self.max_size)
+            if data is None:
+                data = fetch_grid_thumbnail(s3_client, bucket_name, object_key, size, etag,
+                                            self.max_size, self._decode)
+                self.cache.put(etag, self.max_size, data)
+        except Exception:
+            data = None
+        self._loaded.emit(etag, data)
+
+    def _decode(self, source):
+        return self.process_pool.submit(build_thumbnail, source, self.max_size).result()
+
+    def _on_loaded(self, etag, data):
+        self.running.discard(etag)
+        image = QImage.fromData(data) if data else QImage()
+        if image.isNull():
+            self.failed.add(etag)
+        else:
+            self.pixmaps[etag] = QPixmap.fromImage(image)
+            while len(self.pixmaps) > self.MEMORY_ITEMS:
+                del self.pixmaps[next(iter(self.pixmaps))]
+            if not self.repaint_timer.isActive():
+                self.repaint_timer.start()
+        if self.executor is not None:
+            self._dispatch()
+
+    def shutdown(self):
+        self.queued.clear()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.process_pool.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
 
 class R2UploaderGUI(QMainWindow):
     def __init__(self):
         super().__init__()
         self.current_path = ''
-        self.file_list_items = {}
-        self.icon_list_items = {}
+        # 分片上传断点记录
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        self.upload_journal = UploadJournal(os.path.join(script_dir, "cloudflare_r2_manager_uploads.db"),
+                                            os.path.join(script_dir, "cloudflare_r2_manager_uploads.json"))
+        # 上传、下载、复制和删除任务的持久化队列，未完成的任务在下次启动时恢复
+        self.transfer_store = TransferStore(os.path.join(script_dir, "cloudflare_r2_manager_queue.db"))
+        self.transfer_queue_restored = False
+        # 跨存储桶迁移的检查点和进行中的任务（任务编号 -> 线程）
+        self.migration_store = MigrationStore(os.path.join(script_dir, "cloudflare_r2_manager_migrations.db"))
+        self.migration_threads = {}
+        # 所有上传和下载共享的传输进度统计，由界面线程定时发布
+        self.transfer_telemetry = TransferTelemetry()
+        # 所有上传和下载共享的限速，可在界面上随时调整
+        self.bandwidth_limiter = BandwidthLimiter()
+        self._saved_bandwidth_limit = 0
+        self.telemetry_publisher = TelemetryPublisher(self.transfer_telemetry, parent=self)
+        self.telemetry_publisher.progress_sampled.connect(self._on_transfer_progress)
+        # 存储桶大小统计
+        self.bucket_stats = BucketStats(os.path.join(script_dir, "cloudflare_r2_manager_stats.json"))
+        # 整个存储桶的对象索引，用于搜索、导出和统计桶大小
+        self.object_index = ObjectIndex(os.path.join(script_dir, "cloudflare_r2_manager_index.db"))
+        self.index_refresh_callbacks = {}  # 存储桶 -> 索引更新完成后要执行的回调
+        # 预览图片的缩略图缓存，在 init_r2_client 中按配置设置大小上限
+        self.thumbnail_cache = ThumbnailCache(os.path.join(script_dir, "cloudflare_r2_manager_thumbnails"))
+        # 缩略图视图的后台加载，在 init_r2_client 中按配置设置并发数
+        self.thumbnail_loader = ThumbnailLoader(self.thumbnail_cache, parent=self)
+        # 当前显示的搜索（None 表示正在浏览目录），以及双击搜索结果后要选中的键
+        self.search_text = None
+        self.pending_select_key = None
+        self.url_export_thread = None
+        # 运行日志，在 init_r2_client 中按配置设置行数和日志文件
+        self.activity_log = ActivityLogModel(parent=self)
+        # 后台执行浏览相关的 S3 请求，避免阻塞界面
+        self.request_executor = RequestExecutor(BROWSE_CONCURRENCY, parent=self)
+        # 按端点和凭证共享的 S3 客户端，在 init_r2_client 中按配置设置连接池大小
+        self.s3_clients = S3ClientRegistry()
+        # 目录列表缓存，在 init_r2_client 中按配置设置有效期
+        self.listing_cache = ListingCache()
         self.init_ui()
         
     def init_ui(self):
@@ -297,22 +1354,62 @@ class R2UploaderGUI(QMainWindow):
         upload_btn.clicked.connect(self.upload_file)
         left_layout.addWidget(upload_btn)
 
+        # 同步模式：上传文件夹时只上传新增或变化的文件
+        sync_layout = QHBoxLayout()
+        self.sync_mode_checkbox = QCheckBox('同步模式（仅上传变化的文件）')
+        self.sync_delete_checkbox = QCheckBox('删除远端多余文件')
+        self.sync_delete_checkbox.setEnabled(False)
+        self.sync_mode_checkbox.toggled.connect(self.sync_delete_checkbox.setEnabled)
+        sync_layout.addWidget(self.sync_mode_checkbox)
+        sync_layout.addWidget(self.sync_delete_checkbox)
+        sync_layout.addStretch()
+        left_layout.addLayout(sync_layout)
+
         # 增加各控件之间的间距
         left_layout.setSpacing(10)  # 设置布局中控件之间的垂直间距
 
         self.progress_bar = QProgressBar()
         left_layout.addWidget(self.progress_bar)
 
+        # 取消传输按钮，仅在有传输任务时可用；传输队列中可以调整各批次的优先级
+        transfer_buttons = QHBoxLayout()
+        self.cancel_upload_btn = QPushButton('取消传输')
+        self.cancel_upload_btn.setEnabled(False)
+        self.cancel_upload_btn.clicked.connect(self.cancel_uploads)
+        transfer_queue_btn = QPushButton('传输队列')
+        transfer_queue_btn.clicked.connect(self.show_transfer_queue)
+        transfer_buttons.addWidget(self.cancel_upload_btn)
+        transfer_buttons.addWidget(transfer_queue_btn)
+        left_layout.addLayout(transfer_buttons)
+
         # 添加文件信息显示
         self.current_file_info = QTextEdit()
         self.current_file_info.setReadOnly(True)
         self.current_file_info.setPlaceholderText('当前文件信息')
         left_layout.addWidget(self.current_file_info)
 
-        # 添加上传结果显示
-        self.result_info = QTextEdit()
-        self.result_info.setReadOnly(True)
-        self.result_info.setPlaceholderText('上传结果')
+        # 添加运行日志显示（最新的在上面）
+        log_header_layout = QHBoxLayout()
+        log_header_layout.addWidget(QLabel('运行日志'))
+        log_header_layout.addStretch()
+        self.log_level_combo = QComboBox()
+        for label, level in ActivityLogModel.LEVEL_FILTERS:
+            self.log_level_combo.addItem(label, level)
+        self.log_level_combo.currentIndexChanged.connect(
+            lambda: self.activity_log.set_level_filter(self.log_level_combo.currentData())
+        )
+        log_header_layout.addWidget(self.log_level_combo)
+        clear_log_btn = QPushButton('清空')
+        clear_log_btn.clicked.connect(lambda: self.activity_log.clear())
+        log_header_layout.addWidget(clear_log_btn)
+        left_layout.addLayout(log_header_layout)
+
+        self.result_info = QListView()
+        self.result_info.setModel(self.activity_log)
+        self.result_info.setUniformRowHeights(True)
+        self.result_info.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.result_info.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+        self.result_info.customContextMenuRequested.connect(self._show_log_context_menu)
         left_layout.addWidget(self.result_info)
 
         # 右侧面板
@@ -358,19 +1455,80 @@ class R2UploaderGUI(QMainWindow):
         view_layout.addWidget(self.bucket_size_label)
         view_layout.addStretch()
         
+        # 上传和下载共享的限速，0 表示不限速
+        view_layout.addWidget(QLabel('限速:'))
+        self.bandwidth_spin = QDoubleSpinBox()
+        self.bandwidth_spin.setRange(0, 10000)
+        self.bandwidth_spin.setDecimals(1)
+        self.bandwidth_spin.setSingleStep(0.5)
+        self.bandwidth_spin.setSuffix(' MB/s')
+        self.bandwidth_spin.setSpecialValueText('不限')
+        self.bandwidth_spin.valueChanged.connect(self.set_bandwidth_limit)
+        self.bandwidth_spin.editingFinished.connect(self._save_bandwidth_limit)
+        view_layout.addWidget(self.bandwidth_spin)
+        
+        # 在列表和缩略图视图之间切换
+        self.view_mode_btn = QPushButton('缩略图视图')
+        self.view_mode_btn.setCheckable(True)
+        self.view_mode_btn.toggled.connect(self.set_thumbnail_view)
+        view_layout.addWidget(self.view_mode_btn)
+        
+        # 搜索整个存储桶（使用本地对象索引）
+        search_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText('搜索整个存储桶：关键字  ext:jpg,png  >10MB  <1GB  after:2024-01-01  before:2024-12-31')
+        self.search_input.returnPressed.connect(self.search_objects)
+        search_btn = QPushButton('搜索')
+        search_btn.clicked.connect(self.search_objects)
+        search_layout.addWidget(self.search_input)
+        search_layout.addWidget(search_btn)
+        
         # 将视图布局添加到右侧布局中
         right_layout.addLayout(view_layout)
+        right_layout.addLayout(search_layout)
         right_layout.addLayout(path_layout)
 
         # 表视图
-        self.file_list = QTreeWidget()
-        self.file_list.setHeaderLabels(['名称', '类型', '大小', '修改时间'])
+        self.file_list = QTreeView()
+        self.file_list_model = ObjectListModel(self)
+        self.file_list_model.listing_completed.connect(self._on_listing_completed)
+        self.file_list_model.fetch_failed.connect(
+            lambda error: QMessageBox.warning(self, '错误', f'获取文件列表失败：{error}'))
+        self.file_list_model.loading_changed.connect(self._update_path_label)
+        self.file_list_model.modelReset.connect(self._select_pending_key)
+        self.file_list_model.rowsInserted.connect(self._select_pending_key)
+        self.file_list_model.rowsInserted.connect(self._update_path_label)
+        self.file_list.setModel(self.file_list_model)
+        self.file_list.setRootIsDecorated(False)
+        self.file_list.setUniformRowHeights(True)  # 行高一致，滚动时无需逐行计算
         self.file_list.setColumnWidth(0, 300)
-        self.file_list.itemDoubleClicked.connect(self.on_item_double_clicked)
+        self.file_list.doubleClicked.connect(
+            lambda index: self.on_item_double_clicked(self.file_list_model.entry(index.row())))
         self.file_list.setAcceptDrops(True)  # 启用拖放
-        self.file_list.setSelectionMode(QTreeWidget.SelectionMode.ExtendedSelection)  # 允许多选
-        
-        right_layout.addWidget(self.file_list)
+        self.file_list.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)  # 允许多选
+        
+        # 缩略图视图，与表视图共用模型和选择
+        self.icon_list = QListView()
+        self.icon_list.setModel(self.file_list_model)
+        self.icon_list.setSelectionModel(self.file_list.selectionModel())
+        self.icon_list.setViewMode(QListView.ViewMode.IconMode)
+        self.icon_list.setResizeMode(QListView.ResizeMode.Adjust)
+        self.icon_list.setMovement(QListView.Movement.Static)
+        self.icon_list.setIconSize(QSize(*GRID_THUMBNAIL_SIZE))
+        self.icon_list.setGridSize(QSize(GRID_THUMBNAIL_SIZE[0] + 24, GRID_THUMBNAIL_SIZE[1] + 40))
+        self.icon_list.setUniformItemSizes(True)  # 不需要为每一项计算大小，只有可见项会请求图标
+        self.icon_list.setLayoutMode(QListView.LayoutMode.Batched)
+        self.icon_list.setWordWrap(True)
+        self.icon_list.doubleClicked.connect(
+            lambda index: self.on_item_double_clicked(self.file_list_model.entry(index.row())))
+        self.icon_list.setAcceptDrops(True)
+        self.icon_list.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.thumbnail_loader.thumbnails_loaded.connect(self.icon_list.viewport().update)
+        
+        self.file_view_stack = QStackedWidget()
+        self.file_view_stack.addWidget(self.file_list)
+        self.file_view_stack.addWidget(self.icon_list)
+        right_layout.addWidget(self.file_view_stack)
 
         # 添加左右面板到主布局
         main_layout.addWidget(left_panel, 1)
@@ -380,11 +1538,13 @@ class R2UploaderGUI(QMainWindow):
         self.current_path = ''
 
         # 为文件列表右键菜单
-        self.file_list.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
-        self.file_list.customContextMenuRequested.connect(self.show_context_menu)
+        for view in (self.file_list, self.icon_list):
+            view.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
+            view.customContextMenuRequested.connect(self.show_context_menu)
 
         # 添加快捷键支持
         self.file_list.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        self.icon_list.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
 
         # 在 init_ui 方法末尾添加快捷键设置
         # 删除文件快捷键 (Ctrl+D)
@@ -410,6 +1570,11 @@ class R2UploaderGUI(QMainWindow):
         # 设置状态栏
         self.statusBar().showMessage('就绪')
         
+        # 定期检查桶大小统计是否过期，过期时在后台重新统计
+        self.bucket_size_timer = QTimer(self)
+        self.bucket_size_timer.timeout.connect(self._check_bucket_size_schedule)
+        self.bucket_size_timer.start(10 * 60 * 1000)
+        
         # 初始化R2客户端
         self.init_r2_client()
 
@@ -434,21 +1599,26 @@ class R2UploaderGUI(QMainWindow):
             access_key_secret = self.config.get('access_key_secret')
             endpoint_url = self.config.get('endpoint_url')
             self.buckets = self.config.get('buckets', {})
+            self.listing_cache.ttl = float(self.config.get('listing_cache_ttl', DEFAULT_LISTING_CACHE_TTL))
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            self.activity_log.configure(
+                int(self.config.get('log_max_lines', DEFAULT_LOG_MAX_LINES)),
+                os.path.join(script_dir, "cloudflare_r2_manager.log") if self.config.get('log_file') else None,
+                int(float(self.config.get('log_file_max_mb', DEFAULT_LOG_FILE_MAX_MB)) * 1024 * 1024),
+                int(self.config.get('log_file_backups', DEFAULT_LOG_FILE_BACKUPS))
+            )
+            self.thumbnail_cache.set_max_bytes(
+                int(float(self.config.get('thumbnail_cache_mb', DEFAULT_THUMBNAIL_CACHE_MB)) * 1024 * 1024))
+            self.thumbnail_loader.max_workers = max(
+                1, int(self.config.get('thumbnail_concurrency', DEFAULT_THUMBNAIL_CONCURRENCY)))
+            self._saved_bandwidth_limit = float(self.config.get('bandwidth_limit_mb', 0))
+            self.bandwidth_spin.setValue(self._saved_bandwidth_limit)
+            self.set_bandwidth_limit(self._saved_bandwidth_limit)
             
             # 初始化 S3 客户端
             try:
-                self.s3_client = boto3.client(
-                    service_name='s3',
-                    endpoint_url=endpoint_url,
-                    aws_access_key_id=access_key_id,
-                    aws_secret_access_key=access_key_secret,
-                    config=Config(
-                        signature_version='s3v4',
-                        retries={'max_attempts': 3},
-                    ),
-                    region_name='auto',
-                    verify=False
-                )
+                self.s3_clients.set_max_pool_connections(self._max_pool_connections())
+                self.s3_client = self.s3_clients.get(endpoint_url, access_key_id, access_key_secret)
                 
                 # 清空并填充存储桶下拉框
                 self.bucket_combo.clear()
@@ -461,6 +1631,26 @@ class R2UploaderGUI(QMainWindow):
                     self.switch_bucket(0)
                 
                 self.show_result("R2客户端初始化成功", False)
+
+                # 继续上次退出时传输队列中未完成的任务
+                if not self.transfer_queue_restored:
+                    self.transfer_queue_restored = True
+                    self._restore_transfer_queue()
+
+                # 提示未完成的分片上传（已在传输队列中的除外）
+                queued_uploads = self._get_transfer_queue().active_upload_keys()
+                pending_uploads = [entry for entry in self.upload_journal.pending()
+                                   if (entry['bucket'], entry['key']) not in queued_uploads]
+                if pending_uploads:
+                    self.show_result(
+                        f"发现 {len(pending_uploads)} 个未完成的分片上传，可在文件列表右键菜单中选择“继续未完成的上传”，"
+                        f"重新上传相同文件时也会自动续传", False
+                    )
+                pending_migrations = self.migration_store.jobs()
+                if pending_migrations:
+                    self.show_result(
+                        f"发现 {len(pending_migrations)} 个未完成的存储桶迁移，可在文件列表右键菜单中选择“继续未完成的迁移”", False
+                    )
                 return True
                 
             except Exception as e:
@@ -610,7 +1800,9 @@ class R2UploaderGUI(QMainWindow):
                     QMessageBox.warning(dialog, "错误", f"行 {row+1}: 存储桶标识和名称是必填的")
                     return
                 
+                # 保留只能在配置文件中设置的字段（如存储桶单独的凭证）
                 buckets[bucket_id] = {
+                    **self.config.get('buckets', {}).get(bucket_id, {}),
                     "bucket_name": bucket_name,
                     "custom_domain": custom_domain,
                     "public_domain": public_domain
@@ -695,20 +1887,55 @@ class R2UploaderGUI(QMainWindow):
             self.show_result(error_msg, True)
             QMessageBox.warning(self, '保存错误', error_msg)
 
-    def _create_s3_client(self, bucket_config):
-        """创建 S3 客户端"""
-        return boto3.client(
-            service_name='s3',
-            endpoint_url=bucket_config['endpoint_url'],
-            aws_access_key_id=bucket_config['access_key_id'],
-            aws_secret_access_key=bucket_config['access_key_secret'],
-            config=Config(
-                signature_version='s3v4',
-                retries={'max_attempts': 3},
-            ),
-            region_name='auto',
-            verify=False
-        )
+    def _s3_client_for_bucket(self, bucket_config):
+        """返回存储桶使用的 S3 客户端
+
+        存储桶配置中的 endpoint_url、access_key_id、access_key_secret 优先于全局凭证，
+        端点和凭证相同的存储桶共用同一个客户端。
+        """
+        credentials = [bucket_config.get(field) or self.config.get(field)
+                       for field in ('endpoint_url', 'access_key_id', 'access_key_secret')]
+        if not all(credentials):
+            raise Exception("缺少必需的R2凭证配置")
+        return self.s3_clients.get(*credentials)
+
+    def _max_pool_connections(self):
+        """按配置的并发数估算同时进行的最多请求数，作为连接池大小"""
+        config = self.config
+        if config.get('max_pool_connections'):
+            return max(1, int(config['max_pool_connections']))
+        # 每个执行名额中的分片上传、合并复制或合并删除各自占用多个连接
+        per_slot = max(int(config.get('part_concurrency', DEFAULT_PART_CONCURRENCY)),
+                       int(config.get('copy_concurrency', DEFAULT_COPY_CONCURRENCY)),
+                       int(config.get('delete_concurrency', DEFAULT_DELETE_CONCURRENCY)))
+        uploads = int(config.get('file_concurrency', DEFAULT_FILE_CONCURRENCY)) * per_slot
+        downloads = int(config.get('download_concurrency', DEFAULT_DOWNLOAD_CONCURRENCY))
+        background = (int(config.get('list_concurrency', DEFAULT_LIST_CONCURRENCY))
+                      + int(config.get('thumbnail_concurrency', DEFAULT_THUMBNAIL_CONCURRENCY))
+                      + BROWSE_CONCURRENCY)
+        return max(10, uploads + downloads + background)
+
+    def set_bandwidth_limit(self, mb_per_second):
+        """调整上传和下载共享的限速（MB/s），0 表示不限速，立即作用于进行中的传输"""
+        self.bandwidth_limiter.set_rate(int(mb_per_second * 1024 * 1024))
+        self.config['bandwidth_limit_mb'] = mb_per_second
+
+    def _save_bandwidth_limit(self):
+        """编辑完成后把限速写入配置文件，下次启动时沿用"""
+        if self.config.get('bandwidth_limit_mb', 0) != self._saved_bandwidth_limit:
+            self._saved_bandwidth_limit = self.config.get('bandwidth_limit_mb', 0)
+            self.save_config()
+
+    def _get_multipart_options(self):
+        """从配置中读取分片上传的并发数、内存上限和断点记录"""
+        config = getattr(self, 'config', {})
+        max_concurrency = int(config.get('part_concurrency', DEFAULT_PART_CONCURRENCY))
+        memory_limit_mb = int(config.get('part_memory_limit_mb', DEFAULT_PART_MEMORY_LIMIT // 1024 // 1024))
+        return {
+            'max_concurrency': max(1, max_concurrency),
+            'max_memory': max(1, memory_limit_mb) * 1024 * 1024,
+            'journal': self.upload_journal
+        }
 
     def switch_bucket(self, index):
         """切换存储桶"""
@@ -720,50 +1947,42 @@ class R2UploaderGUI(QMainWindow):
         bucket_config = self.buckets[bucket_name]
         
         try:
-            # 确保 s3_client 已初始化
-            if not hasattr(self, 's3_client'):
-                # 从配置中获取凭证
-                account_id = self.config.get('account_id')
-                access_key_id = self.config.get('access_key_id')
-                access_key_secret = self.config.get('access_key_secret')
-                endpoint_url = self.config.get('endpoint_url')
-
-                if not all([account_id, access_key_id, access_key_secret, endpoint_url]):
-                    raise Exception("缺少必需的R2凭证配置")
-
-                # 初始化 S3 客户端
-                self.s3_client = boto3.client(
-                    service_name='s3',
-                    endpoint_url=endpoint_url,
-                    aws_access_key_id=access_key_id,
-                    aws_secret_access_key=access_key_secret,
-                    config=Config(
-                        signature_version='s3v4',
-                        retries={'max_attempts': 3},
-                    ),
-                    region_name='auto',
-                    verify=False
-                )
+            # 按存储桶的端点和凭证取得共享的客户端，切换回用过的存储桶时复用已有连接
+            self.s3_client = self._s3_client_for_bucket(bucket_config)
             
             # 更新当前存储桶信息
             self.current_bucket_name = bucket_config['bucket_name']  # 使用bucket_name字段
             self.current_bucket_config = bucket_config
             
-            # 测试连接
-            self.s3_client.head_bucket(Bucket=self.current_bucket_name)
-            
-            # 重置当前路径
+            # 重置当前路径，清空旧存储桶的列表
             self.current_path = ''
-            
-            # 刷新文件列表
-            self.refresh_file_list(calculate_bucket_size=True)
-            
-            self.show_result(f"已切换到存储桶: {bucket_name}", False)
+            self.request_executor.cancel('listing')
+            self.file_list_model.set_listing(DirectoryListing(''))
+            self.current_path_label.setText('当前路径: / (正在连接存储桶...)')
+            self.bucket_size_label.setText('桶大小: --')
+            
+            # 后台测试连接并预先建立连接，连接成功后刷新文件列表
+            s3_client = self.s3_client
+            current_bucket_name = self.current_bucket_name
+            self.request_executor.submit(
+                'bucket',
+                lambda: warm_up_connections(s3_client, current_bucket_name),
+                lambda _: self._on_bucket_connected(bucket_name),
+                lambda error: self._on_switch_bucket_failed(f"切换存储桶失败: {error}")
+            )
             
         except Exception as e:
-            error_msg = f"切换存储桶失败: {str(e)}"
-            self.show_result(error_msg, True)
-            QMessageBox.warning(self, '切换错误', error_msg)
+            self._on_switch_bucket_failed(f"切换存储桶失败: {str(e)}")
+
+    def _on_bucket_connected(self, bucket_name):
+        """存储桶连接成功"""
+        self.refresh_file_list(calculate_bucket_size=True)
+        self.show_result(f"已切换到存储桶: {bucket_name}", False)
+
+    def _on_switch_bucket_failed(self, error_msg):
+        self.current_path_label.setText('当前路径: /')
+        self.show_result(error_msg, True)
+        QMessageBox.warning(self, '切换错误', error_msg)
 
     def browse_file(self):
         """打开文件选择对话框"""
@@ -811,306 +2030,220 @@ class R2UploaderGUI(QMainWindow):
         except Exception as e:
             self.current_file_info.setText(f"获取文列表失败：{str(e)}")
 
-    def _upload_single_file(self, file_path):
-        """上传单文件，支持分片上传"""
-        try:
-            file_size = os.path.getsize(file_path)
-            file_info = f"文件路径：{file_path}\n"
-            file_info += f"文件大小：{file_size / 1024 / 1024:.2f} MB\n"
-            file_info += f"文件类型：{os.path.splitext(file_path)[1]}"
-            self.current_file_info.setText(file_info)
-
-            custom_name = self.custom_name_input.text()
-            r2_key = custom_name if custom_name else os.path.basename(file_path)
-
-            # 显示开始上传的消息
-            self.show_result(f'开始上传文件: {r2_key}', False)
-
-            # 设置分片大小为20MB
-            chunk_size = 20 * 1024 * 1024  # 20MB in bytes
-            
-            # 如果文件大小超过50MB，使用分片上传
-            if file_size > 50 * 1024 * 1024:  # 50MB
-                try:
-                    # 初始化分片上传
-                    mpu = self.s3_client.create_multipart_upload(
-                        Bucket=self.current_bucket_name,
-                        Key=r2_key
-                    )
-                    
-                    # 计算分片数量
-                    total_parts = (file_size + chunk_size - 1) // chunk_size
-                    parts = []
-                    total_uploaded = 0
-                    
-                    with open(file_path, 'rb') as f:
-                        for part_number in range(1, total_parts + 1):
-                            # 读取分片数据
-                            data = f.read(chunk_size)
-                            data_len = len(data)
-                            total_uploaded += data_len
-                            
-                            # 创建进度回调
-                            self.upload_worker = UploadWorker(self)
-                            self.upload_worker.progress_updated.connect(self.progress_bar.setValue)
-                            self.upload_worker.status_updated.connect(self.show_result)
-                            self.upload_worker.set_file_info(
-                                file_path, 
-                                file_size,  # 使用总文件大小而不是分片大小
-                                part_number, 
-                                total_parts
-                            )
-                            
-                            # 更新总体进度
-                            percentage = (total_uploaded / file_size) * 100
-                            self.progress_bar.setValue(int(percentage))
-                            self.show_result(
-                                f'正在上传: {os.path.basename(file_path)} - {percentage:.1f}% (分片 {part_number}/{total_parts})', 
-                                False
-                            )
-                            
-                            # 上传分片
-                            response = self.s3_client.upload_part(
-                                Bucket=self.current_bucket_name,
-                                Key=r2_key,
-                                PartNumber=part_number,
-                                UploadId=mpu['UploadId'],
-                                Body=data
-                            )
-                            
-                            # 记录分片信息
-                            parts.append({
-                                'PartNumber': part_number,
-                                'ETag': response['ETag']
-                            })
-                            
-                            self.show_result(f'分片 {part_number}/{total_parts} 上传完成', False)
-                    
-                    # 完成分片上传
-                    self.s3_client.complete_multipart_upload(
-                        Bucket=self.current_bucket_name,
-                        Key=r2_key,
-                        UploadId=mpu['UploadId'],
-                        MultipartUpload={'Parts': parts}
-                    )
-                    
-                except Exception as e:
-                    # 如果上传失败，中止分片上传
-                    self.s3_client.abort_multipart_upload(
-                        Bucket=self.current_bucket_name,
-                        Key=r2_key,
-                        UploadId=mpu['UploadId']
-                    )
-                    raise e
-                
-            else:
-                # 小文件使用普通上传
-                self.upload_worker = UploadWorker(self)
-                self.upload_worker.progress_updated.connect(self.progress_bar.setValue)
-                self.upload_worker.status_updated.connect(self.show_result)
-                self.upload_worker.set_file_info(file_path, file_size)
-
-                self.s3_client.upload_file(
-                    file_path, 
-                    self.current_bucket_name, 
-                    r2_key,
-                    Callback=self.upload_worker
-                )
-
-            self.progress_bar.setValue(100)
-            self.show_result(f'文件 {r2_key} 上传成功！', False)
-
-        except Exception as e:
-            self.show_result(f'上传失败：{str(e)}', True)
-        finally:
-            self.progress_bar.setValue(0)
-            self.file_path_input.clear()
-            self.custom_name_input.clear()
-
     def _upload_folder(self, folder_path):
         """上传文件夹"""
-        try:
-            self.current_upload_folder = folder_path
-            base_folder_name = os.path.basename(folder_path)
-            all_files = self._get_folder_files(folder_path)
-            
-            total_files = len(all_files)
-            if total_files == 0:
-                self.show_result('文件夹为空，没有上传的文件', True)
-                return
-
-            self.show_result(f'开始上传文件夹: {folder_path}', False)
-            uploaded_files = 0
-            failed_files = []
+        base_folder_name = os.path.basename(folder_path)
+        self._upload_folder_to_path(folder_path, f"{base_folder_name}/")
 
-            self.update_upload_info(self.current_upload_folder, total_files, uploaded_files)
-
-            for local_path, relative_path in all_files:
-                try:
-                    # 构建目标文件路径
-                    target_file_path = os.path.join(base_folder_name, relative_path).replace('\\', '/')
-                    file_size = os.path.getsize(local_path)
-                    current_file = os.path.basename(local_path)
-
-                    # 显示开始上传当前文件的信息
-                    self.show_result(f'开始上传: {current_file} ({self._format_size(file_size)})', False)
-
-                    # 创建并启动上传线程
-                    upload_thread = UploadThread(
-                        self.s3_client,
-                        self.current_bucket_name,
-                        local_path,
-                        target_file_path
-                    )
-
-                    # 连接信号
-                    upload_thread.progress_updated.connect(self.progress_bar.setValue)
-                    upload_thread.status_updated.connect(self.show_result)
-                    upload_thread.speed_updated.connect(lambda speed: self.update_upload_info(
-                        self.current_upload_folder,
-                        total_files,
-                        uploaded_files,
-                        current_file,
-                        file_size,
-                        speed
-                    ))
-
-                    # 启动线程并等待完成
-                    upload_thread.start()
-                    while not upload_thread.isFinished():
-                        QApplication.processEvents()
-                        time.sleep(0.1)
-
-                    if upload_thread.isFinished():
-                        uploaded_files += 1
-                        self.show_result(f'✅ 文件上传成功: {current_file}', False)
+    def calculate_bucket_size(self):
+        """显示桶的总大小，统计不存在或已过期时在后台重新统计"""
+        self._update_bucket_size_label()
+        self._check_bucket_size_schedule()
 
-                except Exception as e:
-                    error_msg = f'❌ 文件上传失败：{os.path.basename(local_path)} - {str(e)}'
-                    self.show_result(error_msg, True)
-                    failed_files.append((relative_path, str(e)))
+    def _check_bucket_size_schedule(self):
+        """统计不存在或超过设定间隔时启动后台重新统计"""
+        if not hasattr(self, 'current_bucket_name'):
+            return
+        rescan_hours = float(self.config.get('bucket_rescan_hours', DEFAULT_BUCKET_RESCAN_HOURS))
+        if self.bucket_stats.is_stale(self.current_bucket_name, rescan_hours * 3600):
+            self.recalculate_bucket_size()
+
+    def recalculate_bucket_size(self):
+        """在后台完整遍历存储桶，更新对象索引并重新统计总大小和对象数"""
+        self.refresh_object_index()
+
+    def refresh_object_index(self, callback=None):
+        """在后台遍历当前存储桶更新对象索引，完成后调用 callback()"""
+        bucket_name = self.current_bucket_name
+        callbacks = self.index_refresh_callbacks.setdefault(bucket_name, [])
+        if callback:
+            callbacks.append(callback)
+        # 每个存储桶同时只遍历一次，切换存储桶后结果仍会保存
+        channel = f'object_index:{bucket_name}'
+        if self.request_executor.is_pending(channel):
+            return
+        
+        if self.bucket_stats.get(bucket_name) is None:
+            self.bucket_size_label.setText('桶大小: 统计中...')
+        
+        s3_client = self.s3_client
+        max_workers = int(self.config.get('list_concurrency', DEFAULT_LIST_CONCURRENCY))
+        self.request_executor.submit(
+            channel,
+            lambda: self.object_index.refresh(s3_client, bucket_name, max_workers=max_workers),
+            lambda totals: self._on_bucket_size_calculated(bucket_name, *totals),
+            lambda error: self._on_bucket_size_failed(bucket_name, error)
+        )
 
-                finally:
-                    self.progress_bar.setValue(0)
-                    QApplication.processEvents()
+    def _on_bucket_size_calculated(self, bucket_name, total_size, object_count):
+        """保存完整统计的结果，并执行等待索引的操作"""
+        self.bucket_stats.set_full(bucket_name, total_size, object_count)
+        if bucket_name == self.current_bucket_name:
+            self._update_bucket_size_label()
+        for callback in self.index_refresh_callbacks.pop(bucket_name, []):
+            callback()
+
+    def _on_bucket_size_failed(self, bucket_name, error):
+        self.index_refresh_callbacks.pop(bucket_name, None)
+        if bucket_name == self.current_bucket_name and self.bucket_stats.get(bucket_name) is None:
+            self.bucket_size_label.setText('桶大小: 计算失败')
+        self.show_result(f'统计桶大小失败：{error}', True)
 
-            # 显示最终上传结果
-            self._show_final_results(uploaded_files, total_files, failed_files)
+    def _update_bucket_size_label(self):
+        """根据已保存的统计更新桶大小显示"""
+        stats = self.bucket_stats.get(self.current_bucket_name)
+        if stats is None:
+            self.bucket_size_label.setText('桶大小: 统计中...')
+            return
+        
+        formatted_size = self._format_size(stats['total_bytes'])
+        self.bucket_size_label.setText(f"桶大小: {formatted_size}（{stats['object_count']} 个文件）")
+        last_scan = datetime.datetime.fromtimestamp(stats['last_full_scan']).strftime('%Y-%m-%d %H:%M:%S')
+        self.bucket_size_label.setToolTip(f"上次完整统计：{last_scan}，之后的上传和删除已增量计入")
 
-        except Exception as e:
-            self.show_result(f'文件夹上传失败：{str(e)}', True)
-        finally:
-            self.progress_bar.setValue(0)
+    def _apply_bucket_delta(self, bucket_name, bytes_delta, count_delta):
+        """本工具修改存储桶后增量更新统计"""
+        self.bucket_stats.apply_delta(bucket_name, bytes_delta, count_delta)
+        if bucket_name == getattr(self, 'current_bucket_name', None):
+            self._update_bucket_size_label()
 
-    def calculate_bucket_size(self):
-        """计算整个桶的总大小"""
-        try:
-            # 更新标签显示正在统计
-            self.bucket_size_label.setText('桶大小: 统计中...')
-            QApplication.processEvents()  # 确保UI更新
-            
-            total_size = 0
-            paginator = self.s3_client.get_paginator('list_objects_v2')
-            
-            # 遍历所有对象，不使用 prefix
-            for page in paginator.paginate(Bucket=self.current_bucket_name):
-                if 'Contents' in page:
-                    for obj in page['Contents']:
-                        if not obj['Key'].endswith('/'):  # 排除目录
-                            total_size += obj['Size']
-            
-            # 更新显示
-            formatted_size = self._format_size(total_size)
-            self.bucket_size_label.setText(f'桶大小: {formatted_size}')
-            
-        except Exception as e:
-            print(f"计算桶大小时发生错误: {str(e)}")
-            self.bucket_size_label.setText('桶大小: 计算失败')
+    def refresh_file_list(self, prefix='', calculate_bucket_size=False, force=False):
+        """刷新文件列表，优先使用目录列表缓存，force 为 True 时重新获取
 
-    def refresh_file_list(self, prefix='', calculate_bucket_size=False):
-        """刷新文件列表"""
+        未命中缓存时只先请求第一页，其余分页在滚动到底部时按需加载。
+        """
         try:
-            # 清空当前显示
-            self.file_list.clear()
-            
             # 仅在需要时计算桶大小
             if calculate_bucket_size:
                 self.calculate_bucket_size()
                 
-            # 获取文件列表
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.current_bucket_name, 
-                Prefix=prefix, 
-                Delimiter='/'
-            )
-            
-            # 更新当前路径显示
-            self.current_path_label.setText(f'当前路径: /{prefix}')
+            # 更新当前路径显示，退出搜索结果
+            self.search_text = None
             self.current_path = prefix
             self.back_button.setEnabled(bool(prefix))
             
-            # 存储文件和目录项，以便排序
-            files = []
-            directories = []
-            
-            # 处理文件
-            if 'Contents' in response:
-                for obj in response['Contents']:
-                    if obj['Key'] == prefix or obj['Key'].endswith('/'):
-                        continue
-                    
-                    file_name = obj['Key'].split('/')[-1]
-                    files.append({
-                        'name': file_name,
-                        'key': obj['Key'],
-                        'size': obj['Size'],
-                        'last_modified': obj['LastModified']
-                    })
-            
-            # 处理目录
-            if 'CommonPrefixes' in response:
-                for prefix_obj in response['CommonPrefixes']:
-                    dir_name = prefix_obj['Prefix'].rstrip('/').split('/')[-1] + '/'
-                    directories.append({
-                        'name': dir_name,
-                        'prefix': prefix_obj['Prefix']
-                    })
-            
-            # 按最后修改时间降序排文件（最新的在前面）
-            files.sort(key=lambda x: x['last_modified'], reverse=True)
-            
-            # 先添加文件
-            for file in files:
-                # 列表视图项
-                tree_item = QTreeWidgetItem(self.file_list)
-                tree_item.setText(0, file['name'])
-                tree_item.setText(1, self._get_file_type(file['name']))
-                tree_item.setText(2, self._format_size(file['size']))
-                tree_item.setText(3, file['last_modified'].strftime('%Y-%m-%d %H:%M:%S'))
-                tree_item.setIcon(0, self._get_file_icon(file['name']))
-                tree_item.setData(0, Qt.ItemDataRole.UserRole, file['key'])
-            
-            # 再添加目录
-            for directory in directories:
-                # 列表视图项
-                tree_item = QTreeWidgetItem(self.file_list)
-                tree_item.setText(0, directory['name'])
-                tree_item.setText(1, '目录')
-                tree_item.setIcon(0, self.style().standardIcon(QStyle.StandardPixmap.SP_DirIcon))
-                tree_item.setData(0, Qt.ItemDataRole.UserRole, directory['prefix'])
+            # 命中缓存时不发起请求
+            listing = None if force else self.listing_cache.get(self.current_bucket_name, prefix)
+            if listing is not None:
+                self.file_list_model.set_listing(listing)
+            else:
+                self.file_list_model.set_listing(
+                    DirectoryListing(prefix),
+                    iter_directory_pages(self.s3_client, self.current_bucket_name, prefix))
+            self._update_path_label()
 
         except Exception as e:
             QMessageBox.warning(self, '错误', f'获取文件列表失败：{str(e)}')
 
+    def _update_path_label(self, *args):
+        """显示当前路径或搜索条件，后台加载分页时附加加载状态"""
+        loading = ' (加载中...)' if self.file_list_model.fetching else ''
+        if self.search_text is not None:
+            self.current_path_label.setText(
+                f'搜索结果: {self.search_text}（{self.file_list_model.rowCount()} 个）{loading}')
+        else:
+            self.current_path_label.setText(f'当前路径: /{self.current_path}{loading}')
+
+    def search_objects(self):
+        """在本地对象索引中搜索整个存储桶，结果显示在文件列表中"""
+        if not hasattr(self, 'current_bucket_name'):
+            return
+        text = self.search_input.text().strip()
+        if not text:
+            self.refresh_file_list(self.current_path)
+            return
+        try:
+            query = parse_search_query(text)
+        except ValueError as e:
+            QMessageBox.warning(self, '搜索', str(e))
+            return
+
+        bucket_name = self.current_bucket_name
+        if self.object_index.last_scan(bucket_name) is None:
+            # 首次搜索时先建立索引，完成后自动执行搜索
+            self.show_result('对象索引尚未建立，正在后台遍历存储桶，完成后将显示搜索结果...', False)
+            self.refresh_object_index(
+                lambda: self.search_objects() if bucket_name == self.current_bucket_name else None)
+            return
+
+        self.search_text = text
+        self.back_button.setEnabled(True)
+        self.file_list_model.set_listing(
+            DirectoryListing(''), self.object_index.iter_search_pages(bucket_name, query))
+        self._update_path_label()
+
+    def _select_pending_key(self, *args):
+        """打开搜索结果所在目录后选中该文件"""
+        key = self.pending_select_key
+        if key is None or self.search_text is not None:
+            return
+        listing = self.file_list_model.listing
+        if key in listing.keys:
+            self.pending_select_key = None
+            index = self.file_list_model.index(listing.keys.index(key), 0)
+            view = self._active_file_view()
+            view.setCurrentIndex(index)
+            view.scrollTo(index)
+        elif listing.complete:
+            self.pending_select_key = None
+
+    def _on_listing_completed(self, listing):
+        """目录全部分页加载完成后按默认顺序写入缓存
+
+        只有一页时立即按默认顺序显示；多页时保持已显示的顺序，避免滚动中的行跳动。
+        搜索结果按键排序，不写入缓存。
+        """
+        if self.search_text is not None:
+            self._update_path_label()
+            return
+        listing = listing.sorted_default()
+        if self.file_list_model.pages_loaded <= 1:
+            self.file_list_model.set_listing(listing)
+        self.listing_cache.put(self.current_bucket_name, listing.prefix, listing)
+
+    def _active_file_view(self):
+        """当前显示的文件视图（表视图或缩略图视图）"""
+        return self.file_view_stack.currentWidget()
+
+    def set_thumbnail_view(self, enabled):
+        """切换缩略图视图，只在缩略图视图显示时加载缩略图"""
+        self.file_list_model.thumbnail_loader = self.thumbnail_loader if enabled else None
+        if not enabled:
+            self.thumbnail_loader.clear_queue()
+        self.file_view_stack.setCurrentWidget(self.icon_list if enabled else self.file_list)
+        self.view_mode_btn.setText('列表视图' if enabled else '缩略图视图')
+        index = self.file_list.selectionModel().currentIndex()
+        if index.isValid():
+            self._active_file_view().scrollTo(index)
+
+    def _selected_entries(self):
+        """返回当前选中的行"""
+        # 缩略图视图只选中第 0 列，按行去重后两种视图通用
+        rows = sorted({index.row() for index in self.file_list.selectionModel().selectedIndexes()})
+        return [self.file_list_model.entry(row) for row in rows]
+
+    def _current_entry(self):
+        """返回当前行，没有时返回 None"""
+        index = self.file_list.selectionModel().currentIndex()
+        if not index.isValid():
+            return None
+        return self.file_list_model.entry(index.row())
+
     def on_item_double_clicked(self, item):
         """处理双击事件"""
-        path = item.data(0, Qt.ItemDataRole.UserRole)
-        if item.text(1) == '目录':
+        path = item.key
+        if item.is_dir:
             self.refresh_file_list(path, calculate_bucket_size=False)  # 不重新计算桶大小
+        elif self.search_text is not None:
+            # 打开搜索结果所在的目录并选中该文件
+            self.pending_select_key = path
+            self.refresh_file_list(path[:path.rfind('/') + 1])
 
     def go_back(self):
-        """返回上级目录"""
-        if self.current_path:
+        """返回上级目录，显示搜索结果时返回搜索前的目录"""
+        if self.search_text is not None:
+            self.refresh_file_list(self.current_path)
+        elif self.current_path:
             # 除去最后一个目录
             parent_path = '/'.join(self.current_path.rstrip('/').split('/')[:-1])
             if parent_path:
@@ -1126,46 +2259,24 @@ class R2UploaderGUI(QMainWindow):
 
     def _format_size(self, size_in_bytes):
         """格式化文件大小"""
-        try:
-            # 定义单位和转换基数
-            units = ['B', 'KB', 'MB', 'GB', 'TB']
-            base = 1024
-            
-            # 如果小于1024字节，直接返回字节大小
-            if size_in_bytes < base:
-                return f"{size_in_bytes:.2f} B"
-            
-            # 计算合适的单位级别
-            exp = int(math.log(size_in_bytes, base))
-            if exp >= len(units):
-                exp = len(units) - 1
-                
-            # 计算最终大小
-            final_size = size_in_bytes / (base ** exp)
-            return f"{final_size:.2f} {units[exp]}"
-            
-        except Exception as e:
-            return "计算错误"
+        return format_size(size_in_bytes)
 
     def show_result(self, message, is_error=False):
-        """示执行结果（倒序显示，最新的在上面）"""
-        timestamp = QDateTime.currentDateTime().toString('yyyy-MM-dd hh:mm:ss')
-        formatted_message = f"[{timestamp}] {'❌ ' if is_error else '✅ '}{message}"
-        
-        # 获取当前的文本内
-        current_text = self.result_info.toPlainText()
-        
-        # 将新消息添加到最前面
-        if current_text:
-            new_text = formatted_message + '\n' + current_text
-        else:
-            new_text = formatted_message
-        
-        # 更新文本显示
-        self.result_info.setText(new_text)
-        
-        # 将滚动条移动到顶部
-        self.result_info.verticalScrollBar().setValue(0)
+        """显示执行结果（倒序显示，最新的在上面），日志视图定时批量刷新"""
+        self.activity_log.append('error' if is_error else 'info', message)
+
+    def _show_log_context_menu(self, position):
+        """运行日志右键菜单"""
+        menu = QMenu()
+        copy_action = menu.addAction("复制")
+        copy_action.triggered.connect(lambda: QApplication.clipboard().setText('\n'.join(
+            self.activity_log.entry_text(index.row())
+            for index in sorted(self.result_info.selectionModel().selectedRows(), key=lambda index: index.row())
+        )))
+        copy_action.setEnabled(self.result_info.selectionModel().hasSelection())
+        clear_action = menu.addAction("清空")
+        clear_action.triggered.connect(self.activity_log.clear)
+        menu.exec(self.result_info.viewport().mapToGlobal(position))
 
     def get_public_url(self, object_key):
         """生成永久公开访问链接"""
@@ -1199,24 +2310,45 @@ class R2UploaderGUI(QMainWindow):
 
     def show_context_menu(self, position):
         """显示右键菜单"""
-        selected_items = self.file_list.selectedItems()
+        selected_items = self._selected_entries()
         
         menu = QMenu()
         
         # 添加刷新和新建文件夹菜单项，不管是否选中了文件
         refresh_action = menu.addAction("刷新")
-        refresh_action.triggered.connect(lambda: self.refresh_file_list(self.current_path, True))
+        refresh_action.triggered.connect(lambda: self.refresh_file_list(self.current_path, True, force=True))
         
         create_folder_action = menu.addAction("新建文件夹")
         create_folder_action.triggered.connect(self.create_new_folder)
         
+        recount_action = menu.addAction("重新统计桶大小")
+        recount_action.triggered.connect(self.recalculate_bucket_size)
+        
         # 导出URL菜单项
         export_urls_action = menu.addAction("导出所有文件URL")
         export_urls_action.triggered.connect(self.export_custom_urls)
         
+        # 存在未完成的分片上传时显示续传菜单项
+        pending_uploads = self.upload_journal.pending(self.current_bucket_name)
+        if pending_uploads:
+            resume_action = menu.addAction(f"继续未完成的上传 ({len(pending_uploads)})")
+            resume_action.triggered.connect(self.resume_pending_uploads)
+            discard_action = menu.addAction(f"放弃未完成的上传 ({len(pending_uploads)})")
+            discard_action.triggered.connect(self.discard_pending_uploads)
+        
+        migrate_action = menu.addAction("迁移当前目录到其他存储桶...")
+        migrate_action.triggered.connect(lambda: self.migrate_prefix(self.current_path))
+        migrate_action.setEnabled(self.search_text is None)
+        
+        pending_migrations = [job for job in self.migration_store.jobs()
+                              if job['job_id'] not in self.migration_threads]
+        if pending_migrations:
+            resume_migration_action = menu.addAction(f"继续未完成的迁移 ({len(pending_migrations)})")
+            resume_migration_action.triggered.connect(self.resume_migrations)
+        
         # 如果没有选中项，只显示基本选项
         if not selected_items:
-            menu.exec(self.file_list.viewport().mapToGlobal(position))
+            menu.exec(self._active_file_view().viewport().mapToGlobal(position))
             return
             
         # 添加分隔线
@@ -1238,21 +2370,42 @@ class R2UploaderGUI(QMainWindow):
             batch_share_r2_action = batch_menu.addAction("批量通过R2.dev分享")
             batch_share_r2_action.triggered.connect(lambda: self.share_selected_items(False))
             
+            batch_move_action = batch_menu.addAction("批量移动到...")
+            batch_move_action.triggered.connect(lambda: self.move_items(selected_items))
+            
+            batch_copy_action = batch_menu.addAction("批量复制到...")
+            batch_copy_action.triggered.connect(lambda: self.move_items(selected_items, delete_source=False))
+            
             # 判断是否全部都是文件（非目录）
-            all_files = all(item.text(1) != '目录' for item in selected_items)
+            all_files = all(not item.is_dir for item in selected_items)
             batch_share_custom_action.setEnabled(all_files)
             batch_share_r2_action.setEnabled(all_files)
             
         else:
             # 单个项目的菜单
             item = selected_items[0]
-            if item.text(1) == '目录':
+            if item.is_dir:
                 # 目录操作菜单
                 enter_dir = menu.addAction("进入目录 (Enter)")
                 enter_dir.triggered.connect(lambda: self.on_item_double_clicked(item))
                 
+                download_dir = menu.addAction("下载目录")
+                download_dir.triggered.connect(lambda: self.download_directory(item.key))
+                
                 delete_dir = menu.addAction("删除目录 (Ctrl+L)")
-                delete_dir.triggered.connect(lambda: self.delete_directory(item.data(0, Qt.ItemDataRole.UserRole)))
+                delete_dir.triggered.connect(lambda: self.delete_directory(item.key))
+                
+                rename_dir = menu.addAction("重命名目录")
+                rename_dir.triggered.connect(lambda: self.rename_item(item))
+                
+                move_dir = menu.addAction("移动目录到...")
+                move_dir.triggered.connect(lambda: self.move_items([item]))
+                
+                copy_dir = menu.addAction("复制目录到...")
+                copy_dir.triggered.connect(lambda: self.move_items([item], delete_source=False))
+                
+                migrate_dir = menu.addAction("迁移目录到其他存储桶...")
+                migrate_dir.triggered.connect(lambda: self.migrate_prefix(item.key))
             else:
                 # 文件操作菜单
                 # 添加预览菜单项
@@ -1265,6 +2418,15 @@ class R2UploaderGUI(QMainWindow):
                 delete_action = menu.addAction("删除文件 (Ctrl+D)")
                 delete_action.triggered.connect(lambda: self.delete_file(item))
                 
+                rename_action = menu.addAction("重命名")
+                rename_action.triggered.connect(lambda: self.rename_item(item))
+                
+                move_action = menu.addAction("移动到...")
+                move_action.triggered.connect(lambda: self.move_items([item]))
+                
+                copy_action = menu.addAction("复制到...")
+                copy_action.triggered.connect(lambda: self.move_items([item], delete_source=False))
+                
                 custom_domain = menu.addAction("通过自定义域名分享 (Ctrl+Z)")
                 r2_domain = menu.addAction("通过 R2.dev 分享 (Ctrl+E)")
                 
@@ -1275,21 +2437,52 @@ class R2UploaderGUI(QMainWindow):
                     lambda: self.generate_public_share(item, use_custom_domain=False)
                 )
 
-        menu.exec(self.file_list.viewport().mapToGlobal(position))
+        menu.exec(self._active_file_view().viewport().mapToGlobal(position))
 
     def preview_file(self, item):
-        """预览文件内容"""
+        """预览文件内容
+
+        文本只用 Range 请求读取第一页，滚动到底部时继续加载；图片在后台缩放后存入缩略图缓存，
+        再次预览同一内容（ETag 相同）时不产生网络请求。
+        """
+        object_key = item.key
+        file_name = item.name
+        file_ext = os.path.splitext(file_name)[1].lower()
+        s3_client = self.s3_client
+        bucket_name = self.current_bucket_name
+        thumbnail_cache = self.thumbnail_cache
+        text_page_size = int(float(self.config.get('preview_text_kb', DEFAULT_PREVIEW_TEXT_KB)) * 1024)
+
+        def fetch():
+            if file_ext in PREVIEW_IMAGE_EXTENSIONS:
+                thumbnail = thumbnail_cache.get(item.etag, PREVIEW_IMAGE_SIZE)
+                if thumbnail is None:
+                    thumbnail, _, _, etag = fetch_thumbnail(s3_client, bucket_name, object_key, PREVIEW_IMAGE_SIZE)
+                    thumbnail_cache.put(etag, PREVIEW_IMAGE_SIZE, thumbnail)
+                return item.size, thumbnail
+            if file_ext in PREVIEW_TEXT_EXTENSIONS:
+                pager = TextPreviewPager(s3_client, bucket_name, object_key, item.size, text_page_size)
+                return pager.total_size, (pager, pager.next_page())
+            # 不支持预览的类型只需要文件大小
+            return item.size, None
+
+        self.statusBar().showMessage(f"正在加载预览: {file_name}")
+        # 连续预览多个文件时只显示最后一个
+        self.request_executor.submit(
+            'preview',
+            fetch,
+            lambda result: self._show_preview(object_key, file_name, file_ext, *result),
+            lambda error: self._on_preview_failed(error)
+        )
+
+    def _on_preview_failed(self, error):
+        self.statusBar().showMessage('就绪')
+        QMessageBox.warning(self, "预览错误", f"无法预览文件: {error}")
+
+    def _show_preview(self, object_key, file_name, file_ext, content_length, file_data):
+        """显示预览对话框"""
+        self.statusBar().showMessage('就绪')
         try:
-            object_key = item.data(0, Qt.ItemDataRole.UserRole)
-            file_name = item.text(0)
-            file_ext = os.path.splitext(file_name)[1].lower()
-            
-            # 获取文件内容
-            response = self.s3_client.get_object(
-                Bucket=self.current_bucket_name,
-                Key=object_key
-            )
-            
             # 创建预览对话框
             preview_dialog = QDialog(self)
             preview_dialog.setWindowTitle(f"预览: {file_name}")
@@ -1298,28 +2491,20 @@ class R2UploaderGUI(QMainWindow):
             dialog_layout = QVBoxLayout(preview_dialog)
             
             # 判断文件类型并显示不同的预览
-            if file_ext in ['.jpg', '.jpeg', '.png', '.gif', '.bmp']:
-                # 图片预览
-                file_data = response['Body'].read()
-                pixmap = QPixmap()
-                pixmap.loadFromData(file_data)
+            if file_ext in PREVIEW_IMAGE_EXTENSIONS:
+                # 图片预览，file_data 为已缩放到 PREVIEW_IMAGE_SIZE 以内的 PNG
+                image = QImage.fromData(file_data)
                 
                 # 创建图片标签
                 image_label = QLabel()
                 image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
                 
-                # 调整图片大小以适应窗口
-                if not pixmap.isNull():
-                    # 计算缩放比例，保持原图比例
-                    scaled_pixmap = pixmap.scaled(
-                        750, 550,
-                        Qt.AspectRatioMode.KeepAspectRatio,
-                        Qt.TransformationMode.SmoothTransformation
-                    )
-                    image_label.setPixmap(scaled_pixmap)
+                if not image.isNull():
+                    image_label.setPixmap(QPixmap.fromImage(image))
                     
-                    # 添加图片信息标签
-                    info_label = QLabel(f"图片大小: {pixmap.width()} × {pixmap.height()} 像素   |   文件大小: {self._format_size(response['ContentLength'])}")
+                    # 原图尺寸记录在缩略图的 source_size 文本块中
+                    width, _, height = (image.text('source_size') or f'{image.width()}x{image.height()}').partition('x')
+                    info_label = QLabel(f"图片大小: {width} × {height} 像素   |   文件大小: {self._format_size(content_length)}")
                     dialog_layout.addWidget(info_label)
                     
                 else:
@@ -1331,19 +2516,17 @@ class R2UploaderGUI(QMainWindow):
                 scroll_area.setWidgetResizable(True)
                 dialog_layout.addWidget(scroll_area)
                 
-            elif file_ext in ['.txt', '.md', '.json', '.xml', '.html', '.css', '.js', '.py', '.log']:
-                # 文本文件预览
-                file_data = response['Body'].read().decode('utf-8', errors='replace')
-                
-                # 创建文本编辑器
-                text_editor = QTextEdit()
+            elif file_ext in PREVIEW_TEXT_EXTENSIONS:
+                # 文本文件预览，滚动到底部时加载下一页
+                pager, text = file_data
+                text_editor = QPlainTextEdit()
                 text_editor.setReadOnly(True)
-                text_editor.setPlainText(file_data)
+                text_editor.setPlainText(text)
                 dialog_layout.addWidget(text_editor)
                 
-                # 添加文件信息标签
-                info_label = QLabel(f"文件大小: {self._format_size(response['ContentLength'])}   |   字符数: {len(file_data)}")
+                info_label = QLabel()
                 dialog_layout.addWidget(info_label, 0)
+                self._bind_text_preview_pager(preview_dialog, text_editor, info_label, pager)
                 
             else:
                 # 不支持预览的文件类型
@@ -1352,12 +2535,12 @@ class R2UploaderGUI(QMainWindow):
                 dialog_layout.addWidget(info_label)
                 
                 # 显示文件基本信息
-                file_info = QLabel(f"文件名: {file_name}\n文件大小: {self._format_size(response['ContentLength'])}")
+                file_info = QLabel(f"文件名: {file_name}\n文件大小: {self._format_size(content_length)}")
                 dialog_layout.addWidget(file_info)
                 
                 # 添加下载按钮
                 download_btn = QPushButton("下载文件")
-                download_btn.clicked.connect(lambda: self.download_file(object_key, file_name))
+                download_btn.clicked.connect(lambda: self.download_file(object_key, file_name, content_length))
                 dialog_layout.addWidget(download_btn)
             
             # 显示对话框
@@ -1366,8 +2549,47 @@ class R2UploaderGUI(QMainWindow):
         except Exception as e:
             QMessageBox.warning(self, "预览错误", f"无法预览文件: {str(e)}")
 
-    def download_file(self, object_key, file_name):
-        """下载文件到本地"""
+    def _bind_text_preview_pager(self, dialog, text_editor, info_label, pager):
+        """文本预览滚动到接近底部时在后台读取下一页并追加到末尾"""
+        scroll_bar = text_editor.verticalScrollBar()
+
+        def update_info():
+            info = f"文件大小: {self._format_size(pager.total_size)}   |   已加载: {self._format_size(pager.offset)}"
+            if pager.has_more():
+                info += "（滚动到底部继续加载）"
+            info_label.setText(info)
+
+        def append_page(text):
+            # 用独立的光标在文档末尾插入，不改变当前滚动位置
+            position = scroll_bar.value()
+            cursor = QTextCursor(text_editor.document())
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            cursor.insertText(text)
+            scroll_bar.setValue(position)
+            update_info()
+            # 内容仍不足一屏时继续加载
+            QTimer.singleShot(0, load_if_needed)
+
+        def load_if_needed(*_):
+            if not pager.has_more() or self.request_executor.is_pending('preview_page'):
+                return
+            if scroll_bar.value() < scroll_bar.maximum() - scroll_bar.pageStep():
+                return
+            self.request_executor.submit(
+                'preview_page',
+                pager.next_page,
+                append_page,
+                lambda error: info_label.setText(f"加载失败: {error}")
+            )
+
+        update_info()
+        scroll_bar.valueChanged.connect(load_if_needed)
+        # 关闭对话框后丢弃尚未返回的分页
+        dialog.finished.connect(lambda: self.request_executor.cancel('preview_page'))
+        QTimer.singleShot(0, load_if_needed)
+
+    def download_file(self, object_key, file_name, size=0, etag=''):
+        """下载文件到本地（加入传输队列，分段下载，支持断点续传）"""
         try:
             # 选择保存路径
             save_path, _ = QFileDialog.getSaveFileName(
@@ -1378,46 +2600,98 @@ class R2UploaderGUI(QMainWindow):
             )
             
             if save_path:
-                # 获取文件内容并保存
-                response = self.s3_client.get_object(
-                    Bucket=self.current_bucket_name,
-                    Key=object_key
+                if os.path.exists(save_path + '.part'):
+                    self.show_result(f"发现未完成的下载，将从断点继续: {save_path}", False)
+                else:
+                    self.show_result(f"开始下载: {object_key}", False)
+
+                # 单个文件的下载优先于批量任务，并按配置的分段数并发下载
+                batch = self._new_batch(
+                    'download',
+                    os.path.basename(save_path),
+                    TRANSFER_PRIORITY_HIGH,
+                    {'max_concurrency': int(self.config.get('download_concurrency', DEFAULT_DOWNLOAD_CONCURRENCY))}
                 )
-                
-                with open(save_path, 'wb') as f:
-                    f.write(response['Body'].read())
-                
-                self.show_result(f"文件已下载到: {save_path}", False)
+                self._submit_transfer(batch, [TransferTask(batch, self.s3_client, object_key, save_path, size, etag)])
                 
         except Exception as e:
             QMessageBox.warning(self, "下载错误", f"无法下载文件: {str(e)}")
             self.show_result(f"下载失败: {str(e)}", True)
 
+    def download_directory(self, prefix):
+        """递归下载目录到本地，保留目录结构
+
+        边列出边把对象加入传输队列；本地已存在且大小和 ETag 一致的文件会被跳过。
+        """
+        local_folder = QFileDialog.getExistingDirectory(self, '选择保存位置')
+        if not local_folder:
+            return
+
+        self.show_result(f"开始下载目录: {prefix} → {local_folder}", False)
+        batch = self._new_batch('download', f'目录 {prefix}')
+        batch.sealed = False
+        s3_client = self.s3_client
+        listed = 0
+
+        def on_page(page):
+            nonlocal listed
+            if batch.cancelled:
+                return False
+            tasks = []
+            for key, size, etag in page:
+                try:
+                    local_path = local_path_for_key(local_folder, prefix, key)
+                except Exception as e:
+                    self.show_result(f"❌ 下载失败：{key} - {str(e)}", True)
+                    continue
+                tasks.append(TransferTask(batch, s3_client, key, local_path, size, etag))
+            if tasks:
+                listed += len(tasks)
+                self._submit_transfer(batch, tasks)
+            self.statusBar().showMessage(f"正在列出 {prefix} 中的文件... 已加入队列 {listed} 个")
+
+        def on_finished(error):
+            if error:
+                self.show_result(f"列出 {prefix} 失败：{error}", True)
+            if listed:
+                self._get_transfer_queue().seal_batch(batch)
+            elif not error:
+                self.show_result(f'目录 {prefix} 中没有需要下载的文件', False)
+
+        # 每列出一页就加入传输队列，不必等整个目录列完
+        self._list_prefix_pages(prefix, on_page, on_finished)
+
     def delete_file(self, item):
         """删除文件"""
-        object_key = item.data(0, Qt.ItemDataRole.UserRole)
+        object_key = item.key
         reply = QMessageBox.question(
             self, 
             '确认删除', 
-            f'确定要删除文件 {item.text(0)} 吗？',
+            f'确定要删除文件 {item.name} 吗？',
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
         
         if reply == QMessageBox.StandardButton.Yes:
-            try:
-                self.s3_client.delete_object(
-                    Bucket=self.current_bucket_name,
-                    Key=object_key
-                )
-                self.show_result(f'文件 {item.text(0)} 已删除', False)
-                # 刷新文件列表并更新桶大小
-                self.refresh_file_list(self.current_path, calculate_bucket_size=True)
-            except Exception as e:
-                self.show_result(f'删除文件失败：{str(e)}', True)
+            s3_client, bucket_name = self.s3_client, self.current_bucket_name
+            self.request_executor.submit(
+                None,
+                lambda: s3_client.delete_object(Bucket=bucket_name, Key=object_key),
+                lambda _: self._on_file_deleted(bucket_name, item),
+                lambda error: self.show_result(f'删除文件失败：{error}', True)
+            )
+
+    def _on_file_deleted(self, bucket_name, item):
+        self._apply_bucket_delta(bucket_name, -item.size, -1)
+        self.listing_cache.invalidate_keys(bucket_name, [item.key])
+        self.object_index.remove(bucket_name, [item.key])
+        self.show_result(f'文件 {item.name} 已删除', False)
+        # 仍在该存储桶时刷新文件列表并更新桶大小
+        if bucket_name == self.current_bucket_name:
+            self.refresh_file_list(self.current_path, calculate_bucket_size=True)
 
     def generate_public_share(self, item, use_custom_domain=True):
         """生成永久分享链接"""
-        object_key = item.data(0, Qt.ItemDataRole.UserRole)
+        object_key = item.key
         
         if use_custom_domain:
             domain = self.current_bucket_config.get('custom_domain')
@@ -1483,98 +2757,98 @@ class R2UploaderGUI(QMainWindow):
         return self.style().standardIcon(icon_map.get(ext, QStyle.StandardPixmap.SP_FileIcon))
 
     def export_custom_urls(self):
-        """导出所有文件的自定义域名URL和文件大小"""
+        """导出文件的访问URL列表：边遍历存储桶边写入文件，可按目录和扩展名筛选"""
+        if self.url_export_thread and self.url_export_thread.isRunning():
+            QMessageBox.information(self, '导出URL', '已有导出任务正在进行')
+            return
+
+        dialog = QDialog(self)
+        dialog.setWindowTitle("导出文件URL")
+        dialog.setMinimumWidth(450)
+        layout = QVBoxLayout(dialog)
+
+        prefix_layout = QHBoxLayout()
+        prefix_layout.addWidget(QLabel("目录前缀:"))
+        prefix_input = QLineEdit(self.current_path)
+        prefix_input.setPlaceholderText('留空导出整个存储桶')
+        prefix_layout.addWidget(prefix_input)
+        layout.addLayout(prefix_layout)
+
+        ext_layout = QHBoxLayout()
+        ext_layout.addWidget(QLabel("扩展名:"))
+        ext_input = QLineEdit()
+        ext_input.setPlaceholderText('例如 jpg,png，留空导出全部文件')
+        ext_layout.addWidget(ext_input)
+        layout.addLayout(ext_layout)
+
+        format_layout = QHBoxLayout()
+        format_layout.addWidget(QLabel("格式:"))
+        format_combo = QComboBox()
+        for fmt, (label, _) in UrlExportWriter.EXPORT_FORMATS.items():
+            format_combo.addItem(label, fmt)
+        format_layout.addWidget(format_combo)
+        layout.addLayout(format_layout)
+
+        button_layout = QHBoxLayout()
+        cancel_btn = QPushButton("取消")
+        export_btn = QPushButton("导出")
+        button_layout.addWidget(cancel_btn)
+        button_layout.addWidget(export_btn)
+        layout.addLayout(button_layout)
+        cancel_btn.clicked.connect(dialog.reject)
+        export_btn.clicked.connect(dialog.accept)
+
+        if dialog.exec() != QDialog.DialogCode.Accepted:
+            return
+
+        prefix = prefix_input.text().strip().lstrip('/')
+        extensions = [ext.strip() for ext in ext_input.text().split(',') if ext.strip()]
+        fmt = format_combo.currentData()
+        
+        # 获取脚本所在目录的绝对路径，并生成带时间戳的文件名
+        current_time = QDateTime.currentDateTime().toString('yyyyMMdd_HHmmss')
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        label, suffix = UrlExportWriter.EXPORT_FORMATS[fmt]
+        export_path, _ = QFileDialog.getSaveFileName(
+            self, "保存URL列表", os.path.join(script_dir, f'file_customUrl_{current_time}{suffix}'),
+            f"{label} (*{suffix})"
+        )
+        if not export_path:
+            return
+
+        # 生成自定义域名URL
+        domain = self.current_bucket_config.get('custom_domain')
+        base_url = f"https://{domain}/" if domain else "https://r2.lss.lol/"  # 默认URL
         try:
-            # 显示开始信息
-            self.show_result("开始导出文件URL列表...", False)
-            
-            # 获取所有文件列表
-            all_files = []
-            paginator = self.s3_client.get_paginator('list_objects_v2')
-            
-            # 更新标签显示正在统计
-            self.show_result("正在遍历所有文件...", False)
-            QApplication.processEvents()
-            
-            # 遍历所有对象
-            for page in paginator.paginate(Bucket=self.current_bucket_name):
-                if 'Contents' in page:
-                    for obj in page['Contents']:
-                        if not obj['Key'].endswith('/'):  # 排除目录
-                            all_files.append({
-                                'key': obj['Key'],
-                                'size': obj['Size']  # 添加文件大小
-                            })
-
-            # 计算总文件数
-            total_files = len(all_files)
-            if total_files == 0:
-                self.show_result("没有找到可导出的文件", False)
-                return
+            writer = UrlExportWriter(export_path, fmt, base_url, extensions)
+        except Exception as e:
+            self.show_result(f"导出失败：{str(e)}", True)
+            return
 
-            self.show_result(f"找到 {total_files} 文件，开始生成URL...", False)
-            
-            # 获取当前时间并格式化
-            current_time = QDateTime.currentDateTime().toString('yyyyMMdd_HHmmss')
-            
-            # 获取脚本所在目录的绝对路径，并生成带时间戳的文件名
-            script_dir = os.path.dirname(os.path.abspath(__file__))
-            csv_path = os.path.join(script_dir, f'file_customUrl_{current_time}.csv')
-            
-            self.show_result(f"备导出到文件: {csv_path}", False)
-            
-            # 获取自定义域名
-            domain = self.current_bucket_config.get('custom_domain')
-            
-            # 写入CSV文件，使用 utf-8-sig 编码（带BOM）
-            with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(['文件名', '文件路径', 'URL', '文件大小'])  # 添加文件大小列
-                
-                # 显示写入表头信息
-                self.show_result("已创建CSV文件并写入表头", False)
-                
-                processed_count = 0
-                for i, file_info in enumerate(all_files, 1):
-                    # 生成自定义域名URL
-                    if domain:
-                        custom_url = f"https://{domain}/{file_info['key']}"
-                    else:
-                        custom_url = f"https://r2.lss.lol/{file_info['key']}"  # 默认URL
-                    
-                    # 获取文件名
-                    file_name = os.path.basename(file_info['key'])
-                    
-                    # 格式化文件大小
-                    formatted_size = self._format_size(file_info['size'])
-                    
-                    # 写入数据
-                    writer.writerow([
-                        file_name, 
-                        file_info['key'], 
-                        custom_url,
-                        formatted_size  # 添加格式化后的文件大小
-                    ])
-                    
-                    processed_count = i
-                    
-                    # 每处理50个文件更新一次显示信息
-                    if i % 50 == 0 or i == total_files:
-                        self.show_result(f"已处理: {i}/{total_files} 个文件", False)
-                        QApplication.processEvents()
-            
-            # 显示完成信息
-            final_message = (
-                f"导出完成！\n"
-                f"- 总文件数: {total_files}\n"
-                f"- 已处理: {processed_count}\n"
-                f"- 导出文件: {csv_path}"
+        bucket_name = self.current_bucket_name
+        self.show_result(f"开始导出文件URL列表: /{prefix} → {export_path}", False)
+        self.url_export_thread = UrlExportThread(
+            self.s3_client, bucket_name, self.object_index, writer, prefix,
+            int(self.config.get('list_concurrency', DEFAULT_LIST_CONCURRENCY))
+        )
+        self.url_export_thread.progress_updated.connect(
+            lambda scanned, written: self.statusBar().showMessage(
+                f"正在导出URL：已遍历 {scanned} 个文件，已写出 {written} 行"
             )
-            self.show_result(final_message, False)
+        )
+        self.url_export_thread.export_finished.connect(
+            lambda success, message, totals: self._on_url_export_finished(bucket_name, prefix, success, message, totals)
+        )
+        self.url_export_thread.start()
 
-        except Exception as e:
-            error_message = f"导出失败：{str(e)}"
-            self.show_result(error_message, True)
+    def _on_url_export_finished(self, bucket_name, prefix, success, message, totals):
+        """导出完成，导出整个存储桶时顺便更新桶统计"""
+        self.statusBar().showMessage('就绪')
+        if success and not prefix:
+            self.bucket_stats.set_full(bucket_name, *totals)
+            if bucket_name == self.current_bucket_name:
+                self._update_bucket_size_label()
+        self.show_result(message, not success)
 
     def update_upload_info(self, folder_path, total_files, uploaded_files, current_file=None, file_size=None, speed=None):
         """更新传信息显示"""
@@ -1589,6 +2863,8 @@ class R2UploaderGUI(QMainWindow):
                 info += "\n"
             if file_size:
                 info += f"{current_file} ({self._format_size(file_size)})"
+            else:
+                info += current_file
         
         self.current_file_info.setText(info)
 
@@ -1621,7 +2897,6 @@ class R2UploaderGUI(QMainWindow):
             # 根据是文件还是文件夹选择不同的上传方
             if os.path.isfile(file_path):
                 # 单个文件上传
-                file_size = os.path.getsize(file_path)
                 file_name = os.path.basename(file_path)
                 
                 # 如果有自定义文件名，使用自定义的
@@ -1631,55 +2906,425 @@ class R2UploaderGUI(QMainWindow):
                 
                 self.show_result(f'开始上传文件: {file_name}', False)
                 
-                # 创建并启动上传线程
-                upload_thread = UploadThread(
-                    self.s3_client,
-                    self.current_bucket_name,
-                    file_path,
-                    file_name
-                )
-                
-                # 连接信号
-                upload_thread.progress_updated.connect(self.progress_bar.setValue)
-                upload_thread.status_updated.connect(self.show_result)
-                upload_thread.speed_updated.connect(
-                    lambda speed: self.update_upload_info(
-                        os.path.dirname(file_path),
-                        1,
-                        0,
-                        file_name,
-                        file_size,
-                        speed
-                    )
-                )
-                upload_thread.upload_finished.connect(
-                    lambda success, msg: self._handle_upload_finished(
-                        success, msg, 0, 1
-                    )
-                )
-                
-                # 启动线程并等待完成
-                upload_thread.start()
-                while not upload_thread.isFinished():
-                    QApplication.processEvents()
-                    time.sleep(0.1)
+                # 加入上传队列，完成后自动刷新文件列表
+                self._start_upload_batch(
+                    os.path.dirname(file_path), [(file_path, file_name)], priority=TRANSFER_PRIORITY_HIGH)
                 
-                # 上传完成后刷新文件列表并重新计算桶大小
-                self.refresh_file_list(self.current_path, calculate_bucket_size=True)
+            elif self.sync_mode_checkbox.isChecked():
+                # 文件夹同步
+                self._sync_folder(file_path, self.sync_delete_checkbox.isChecked())
                 
             else:
                 # 文件夹上传
                 self._upload_folder(file_path)
-                # 上传完成后刷新文件表并重新计算桶大小
-                self.refresh_file_list(self.current_path, calculate_bucket_size=True)
                 
         except Exception as e:
             self.show_result(f'上传失败：{str(e)}', True)
         finally:
-            self.progress_bar.setValue(0)
             self.file_path_input.clear()
             self.custom_name_input.clear()
 
+    def _sync_folder(self, folder_path, delete_extra=False):
+        """同步文件夹：只上传新增或变化的文件，可选删除远端多余文件"""
+        target_prefix = f"{os.path.basename(folder_path)}/"
+        self.show_result(f'开始比对文件夹: {folder_path} → /{target_prefix}', False)
+
+        self.sync_plan_thread = SyncPlanThread(
+            self.s3_client,
+            self.current_bucket_name,
+            folder_path,
+            target_prefix,
+            delete_extra,
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), "cloudflare_r2_manager_hashes.db")
+        )
+        self.sync_plan_thread.plan_ready.connect(self._on_sync_plan_ready)
+        self.sync_plan_thread.plan_failed.connect(
+            lambda error: self.show_result(f'文件夹比对失败：{error}', True)
+        )
+        self.sync_plan_thread.start()
+
+    def _on_sync_plan_ready(self, plan):
+        """根据同步计划上传变化的文件"""
+        self.show_result(
+            f'比对完成：新增 {plan.new_files} 个，变化 {plan.changed_files} 个，'
+            f'未变化跳过 {len(plan.skipped)} 个，远端多余 {len(plan.to_delete)} 个', False
+        )
+
+        delete_keys = plan.to_delete
+        if delete_keys:
+            reply = QMessageBox.question(
+                self,
+                '确认删除',
+                f'远端 /{plan.target_prefix} 中有 {len(delete_keys)} 个文件在本地不存在，'
+                f'上传完成后是否删除？',
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                delete_keys = []
+
+        batch = self._new_batch('upload', plan.local_folder)
+        batch.skipped_files = len(plan.skipped)
+        batch.delete_keys = delete_keys
+        batch.remote_sizes = plan.remote_sizes
+        self._start_upload_batch(plan.local_folder, plan.to_upload, batch, plan.remote_sizes)
+
+    def _finish_sync_batch(self, batch):
+        """同步批次上传完成后把远端多余文件作为删除批次加入传输队列，并汇总结果"""
+        delete_count = 0
+        if batch.delete_keys:
+            if batch.cancelled or batch.failed_files:
+                self.show_result('存在上传失败或已取消，跳过删除远端多余文件', True)
+            else:
+                delete_count = len(batch.delete_keys)
+                self._start_batch_delete(
+                    {key: batch.remote_sizes.get(key, 0) for key in batch.delete_keys},
+                    f'/{batch.label} 的远端多余文件',
+                    bucket_id=batch.bucket_id,
+                    bucket_name=batch.bucket_name
+                )
+
+        self.show_result(
+            f'同步完成：上传 {batch.completed_files} 个，跳过 {batch.skipped_files} 个，'
+            f'待删除 {delete_count} 个，失败 {len(batch.failed_files)} 个',
+            bool(batch.failed_files)
+        )
+
+    def _get_transfer_queue(self):
+        """获取共享的传输队列，首次使用时按配置的并发数创建"""
+        if not hasattr(self, 'transfer_queue'):
+            config = getattr(self, 'config', {})
+            max_workers = int(config.get('file_concurrency', DEFAULT_FILE_CONCURRENCY))
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            self.transfer_queue = TransferQueue(
+                self.transfer_telemetry,
+                self.transfer_store,
+                max_workers,
+                self,
+                self.bandwidth_limiter,
+                os.path.join(script_dir, "cloudflare_r2_manager_hashes.db"),
+                int(config.get('copy_concurrency', DEFAULT_COPY_CONCURRENCY)),
+                int(config.get('delete_concurrency', DEFAULT_DELETE_CONCURRENCY))
+            )
+            self.transfer_queue.files_finished.connect(self._on_transfer_files_finished)
+            self.transfer_queue.batch_finished.connect(self._on_transfer_batch_finished)
+        return self.transfer_queue
+
+    def _new_batch(self, kind, label, priority=0, options=None):
+        """创建当前存储桶中的一个传输批次"""
+        return TransferBatch(
+            kind, label, self.bucket_combo.currentText(), self.current_bucket_name, priority, options)
+
+    def _submit_transfer(self, batch, tasks):
+        """把任务加入传输队列并开始发布进度"""
+        self.cancel_upload_btn.setEnabled(True)
+        self._get_transfer_queue().submit_batch(batch, tasks)
+        self.telemetry_publisher.start()
+
+    def _start_upload_batch(self, label, items, batch=None, remote_sizes=None, priority=0):
+        """把 (本地路径, 目标键) 列表作为一个批次加入传输队列
+
+        remote_sizes 为已知的远端对象大小（同步模式），未提供时从对象索引和目录列表缓存中查找。
+        """
+        if batch is None:
+            batch = self._new_batch('upload', label, priority)
+        if remote_sizes is None:
+            remote_sizes = self._known_remote_sizes(batch.bucket_name, [r2_key for _, r2_key in items])
+        multipart_options = self._get_multipart_options()
+        tasks = []
+        for local_path, r2_key in items:
+            try:
+                task = TransferTask(
+                    batch,
+                    self.s3_client,
+                    local_path,
+                    r2_key,
+                    os.path.getsize(local_path),
+                    options=multipart_options
+                )
+                task.previous_existed = r2_key in remote_sizes
+                task.previous_size = remote_sizes.get(r2_key, 0)
+                tasks.append(task)
+            except OSError as e:
+                batch.total_files += 1
+                batch.finished_files += 1
+                batch.failed_files.append((r2_key, str(e)))
+                self.show_result(f'❌ 无法读取文件：{local_path} - {str(e)}', True)
+
+        self.update_upload_info(label, batch.total_files + len(tasks), 0)
+        self._submit_transfer(batch, tasks)
+        return batch
+
+    def _known_remote_sizes(self, bucket_name, keys):
+        """从对象索引和目录列表缓存中查找将被覆盖的远端对象大小，返回 {键: 大小}
+
+        不为此发送请求；两处都没有记录的键视为新对象。
+        """
+        sizes = self.object_index.get_sizes(bucket_name, keys)
+        listings = {}
+        for key in keys:
+            prefix = key[:key.rfind('/') + 1]
+            if prefix not in listings:
+                listing = self.listing_cache.get(bucket_name, prefix)
+                listings[prefix] = dict(zip(listing.keys, listing.sizes)) if listing else {}
+            if key in listings[prefix]:
+                sizes[key] = listings[prefix][key]
+        return sizes
+
+    def _restore_transfer_queue(self):
+        """恢复上次退出或崩溃时传输队列中未完成的任务"""
+        self.transfer_store.remove_finished()
+        restored = 0
+        for record in self.transfer_store.unfinished_batches():
+            bucket_config = self.buckets.get(record['bucket_id'])
+            if bucket_config is None or bucket_config.get('bucket_name') != record['bucket_name']:
+                self.show_result(
+                    f"❌ 存储桶 {record['bucket_id']} 已不在配置中，放弃未完成的传输：{record['label']}", True)
+                self.transfer_store.remove_batch(record['batch_id'])
+                continue
+            try:
+                s3_client = self._s3_client_for_bucket(bucket_config)
+            except Exception as e:
+                self.show_result(f"❌ 无法恢复传输 {record['label']}：{str(e)}", True)
+                continue
+
+            kind = record['kind']
+            batch = TransferBatch(kind, record['label'], record['bucket_id'], record['bucket_name'],
+                                  record['priority'], record['options'])
+            batch.batch_id = record['batch_id']
+            counts = record['counts']
+            batch.completed_files = counts.get('done', 0)
+            batch.total_files = batch.finished_files = (
+                counts.get('done', 0) + counts.get('failed', 0) + counts.get('cancelled', 0))
+            batch.failed_files = [(dest if kind == 'upload' else source, error)
+                                  for source, dest, error in record['failed']]
+
+            options = self._get_multipart_options() if kind == 'upload' else None
+            remote_sizes = (self._known_remote_sizes(batch.bucket_name, [dest for _, _, dest, _, _ in record['jobs']])
+                            if kind in ('upload', 'copy') else {})
+            tasks = []
+            for job_id, source, dest, size, etag in record['jobs']:
+                if kind == 'upload':
+                    # 本地文件可能已变化，按当前大小上传
+                    try:
+                        size = os.path.getsize(source)
+                    except OSError as e:
+                        self.transfer_store.set_state(job_id, 'failed', str(e))
+                        batch.total_files += 1
+                        batch.finished_files += 1
+                        batch.failed_files.append((dest, str(e)))
+                        continue
+                task = TransferTask(batch, s3_client, source, dest, size, etag, options)
+                task.job_id = job_id
+                if kind in ('upload', 'copy'):
+                    task.previous_existed = dest in remote_sizes
+                    task.previous_size = remote_sizes.get(dest, 0)
+                tasks.append(task)
+
+            restored += len(tasks)
+            if kind == 'upload':
+                self.current_upload_folder = batch.label
+                self.update_upload_info(batch.label, batch.total_files + len(tasks), batch.completed_files)
+            self._submit_transfer(batch, tasks)
+
+        if restored:
+            self.show_result(f"已恢复上次未完成的 {restored} 个传输任务，可在“传输队列”中调整优先级或取消", False)
+
+    def cancel_uploads(self):
+        """取消队列中所有未完成的传输"""
+        if hasattr(self, 'transfer_queue') and self.transfer_queue.has_active_batches():
+            self.transfer_queue.cancel_all()
+            self.show_result('正在取消传输，进行中的文件完成当前请求后停止', True)
+
+    def show_transfer_queue(self):
+        """显示传输队列中的批次，可以调整优先级或取消单个批次"""
+        dialog = QDialog(self)
+        dialog.setWindowTitle('传输队列')
+        dialog.setMinimumSize(640, 320)
+        layout = QVBoxLayout(dialog)
+
+        table = QTableWidget(0, 4)
+        table.setHorizontalHeaderLabels(['类型', '名称', '进度', '优先级'])
+        table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        layout.addWidget(table)
+
+        kind_names = {'upload': '上传', 'download': '下载', 'copy': '复制/移动', 'delete': '删除'}
+        batches = []
+
+        def refresh():
+            queue = self._get_transfer_queue()
+            # 按调度顺序显示：优先级高的在前，相同优先级按加入顺序
+            current = sorted(queue.active_batches, key=lambda batch: (-batch.priority, batch.batch_id))
+            selected = table.currentRow()
+            previous = batches[selected] if 0 <= selected < len(batches) else None
+            batches[:] = current
+            table.setRowCount(len(current))
+            for row, batch in enumerate(current):
+                values = [
+                    kind_names.get(batch.kind, batch.kind),
+                    batch.label,
+                    f'{batch.finished_files}/{batch.total_files}' + ('（已取消）' if batch.cancelled else ''),
+                    str(batch.priority)
+                ]
+                for column, value in enumerate(values):
+                    table.setItem(row, column, QTableWidgetItem(value))
+            if previous in current:
+                table.selectRow(current.index(previous))
+
+        def selected_batch():
+            row = table.currentRow()
+            return batches[row] if 0 <= row < len(batches) else None
+
+        def change_priority(delta):
+            batch = selected_batch()
+            if batch:
+                self._get_transfer_queue().set_priority(batch, batch.priority + delta)
+                refresh()
+
+        def cancel_selected():
+            batch = selected_batch()
+            if batch and not batch.cancelled:
+                self._get_transfer_queue().cancel_batch(batch)
+                self.show_result(f'已取消传输：{batch.label}', True)
+                refresh()
+
+        buttons = QHBoxLayout()
+        for text, handler in (('提高优先级', lambda: change_priority(TRANSFER_PRIORITY_STEP)),
+                              ('降低优先级', lambda: change_priority(-TRANSFER_PRIORITY_STEP)),
+                              ('取消所选', cancel_selected),
+                              ('关闭', dialog.accept)):
+            button = QPushButton(text)
+            button.clicked.connect(handler)
+            buttons.addWidget(button)
+        layout.addLayout(buttons)
+
+        timer = QTimer(dialog)
+        timer.timeout.connect(refresh)
+        timer.start(1000)
+        refresh()
+        dialog.exec()
+
+    def _on_transfer_files_finished(self, results):
+        """一组任务完成后按存储桶批量更新目录缓存和对象索引，并把对桶统计的影响累计到各自的批次中"""
+        changes = {}  # 存储桶 -> {键: 新的大小，已删除为 None}，同一个键以最后一次结果为准
+        for task, success, message in results:
+            kind = task.batch.kind
+            if not success:
+                if not task.batch.cancelled:
+                    action = {'upload': '上传', 'download': '下载', 'copy': '复制', 'delete': '删除'}[kind]
+                    self.show_result(f'❌ 文件{action}失败：{task.key} - {message}', True)
+                continue
+            if kind == 'download' or (kind == 'copy' and task.skipped):
+                continue
+            keys = changes.setdefault(task.bucket_name, {})
+            if kind == 'upload':
+                keys[task.dest] = task.size
+                task.batch.bytes_delta += task.size - task.previous_size
+                task.batch.count_delta += 0 if task.previous_existed else 1
+                self.show_result(f'✅ 文件上传成功: {task.dest}', False)
+            elif kind == 'copy':
+                keys[task.dest] = task.size
+                if task.batch.options.get('delete_source'):
+                    keys[task.source] = None
+                if not task.dest.endswith('/'):
+                    # 目录占位对象不计入桶统计；移动只减少被覆盖的目标对象，复制另外新增源对象的一份
+                    task.batch.bytes_delta -= task.previous_size
+                    task.batch.count_delta -= 1 if task.previous_existed else 0
+                    if not task.batch.options.get('delete_source'):
+                        task.batch.bytes_delta += task.size
+                        task.batch.count_delta += 1
+            elif kind == 'delete':
+                keys[task.source] = None
+                # 目录占位对象不计入桶统计
+                if not task.source.endswith('/'):
+                    task.batch.bytes_delta -= task.size
+                    task.batch.count_delta -= 1
+
+        for bucket_name, keys in changes.items():
+            self.listing_cache.invalidate_keys(bucket_name, list(keys))
+            upserts = [(key, size) for key, size in keys.items() if size is not None]
+            removed = [key for key, size in keys.items() if size is None]
+            if upserts:
+                self.object_index.upsert_many(bucket_name, upserts)
+            if removed:
+                self.object_index.remove(bucket_name, removed)
+
+    def _on_transfer_progress(self, snapshot):
+        """显示定时发布的传输进度：上传批次显示在上传信息中，其他批次显示在状态栏"""
+        uploads = [(batch, progress) for batch, progress in snapshot.items() if batch.kind == 'upload']
+        others = [(batch, progress) for batch, progress in snapshot.items() if batch.kind != 'upload']
+
+        if uploads:
+            transferred = sum(progress.transferred for _, progress in uploads)
+            total = sum(progress.total for _, progress in uploads)
+            self.progress_bar.setValue(min(int(transferred / total * 100), 100) if total else 0)
+            self.current_file_info.setText('\n\n'.join(
+                self._format_upload_progress(batch, progress) for batch, progress in uploads))
+
+        messages = []
+        for batch, progress in others:
+            if batch.kind == 'download':
+                messages.append(
+                    f"正在下载 {progress.label}：{batch.finished_files}/{batch.total_files} 个文件 "
+                    f"{progress.percentage}% {self._format_speed(progress.speed)} "
+                    f"剩余 {format_duration(progress.eta)}"
+                )
+            else:
+                messages.append(f"正在{progress.label}：{batch.finished_files}/{batch.total_files}")
+        if messages:
+            self.statusBar().showMessage('；'.join(messages))
+
+    def _format_upload_progress(self, batch, progress):
+        """一个上传批次的总体进度和各并发文件的进度"""
+        info = f"文件夹路径：{batch.label}\n"
+        info += f"已上传文件：{batch.completed_files}/{batch.total_files}\n"
+        info += (f"总进度：{progress.percentage}% "
+                 f"({self._format_size(progress.transferred)} / {self._format_size(progress.total)})\n")
+        info += f"上传速度：{self._format_speed(progress.speed)}  剩余时间：{format_duration(progress.eta)}"
+        for name, done, total in sorted(progress.files):
+            percentage = min(int(done / total * 100), 100) if total else 100
+            info += f"\n  {name}：{percentage}% ({self._format_size(total)})"
+        return info
+
+    def _on_transfer_batch_finished(self, batch):
+        """批次全部完成后汇总结果、更新桶统计并刷新列表"""
+        self._apply_bucket_delta(batch.bucket_name, batch.bytes_delta, batch.count_delta)
+        if batch.kind == 'upload':
+            self.current_upload_folder = batch.label
+            if batch.cancelled:
+                self.show_result(f'上传已取消，已上传 {batch.completed_files}/{batch.total_files} 个文件', True)
+            self._show_final_results(batch.completed_files, batch.total_files, batch.failed_files)
+            if batch.skipped_files or batch.delete_keys:
+                self._finish_sync_batch(batch)
+        elif batch.kind == 'download':
+            if batch.cancelled:
+                self.show_result(f'下载已取消：{batch.label}，已下载 {batch.completed_files} 个文件', True)
+            else:
+                self.show_result(
+                    f"{batch.label} 下载完成：下载 {batch.completed_files} 个，已存在跳过 {batch.skipped_files} 个，"
+                    f"失败 {len(batch.failed_files)} 个",
+                    bool(batch.failed_files)
+                )
+        else:
+            action = '删除' if batch.kind == 'delete' else '完成'
+            summary = f'{batch.label}：{action} {batch.completed_files}/{batch.total_files} 个文件'
+            if batch.failed_files:
+                summary += f'，失败 {len(batch.failed_files)} 个'
+            if batch.cancelled:
+                summary += '（已取消）'
+            self.show_result(summary, bool(batch.failed_files) or batch.cancelled)
+
+        if not self.transfer_queue.has_active_batches():
+            self.progress_bar.setValue(0)
+            self.cancel_upload_btn.setEnabled(False)
+            self.statusBar().showMessage('就绪')
+
+        # 完成后刷新文件列表，上传和删除会改变桶大小
+        if batch.kind != 'download' and batch.bucket_name == self.current_bucket_name:
+            self.refresh_file_list(self.current_path, calculate_bucket_size=batch.kind in ('upload', 'delete'))
+
     def _get_folder_files(self, folder_path):
         """获取文件夹中的所有文件列表"""
         all_files = []
@@ -1695,29 +3340,6 @@ class R2UploaderGUI(QMainWindow):
         
         return all_files
 
-    def _handle_upload_finished(self, success, message, uploaded_files, total_files):
-        """处理上传完成的回调"""
-        if success:
-            # 更新已上传文件计数
-            uploaded_files += 1
-            # 更新显示
-            self.show_result(message, False)
-            # 更新进度信息
-            self.update_upload_info(
-                os.path.dirname(self.file_path_input.text().strip()),
-                total_files,
-                uploaded_files
-            )
-            # 刷新文件列表
-            self.refresh_file_list(self.current_path, calculate_bucket_size=True)
-        else:
-            # 显示错误信息
-            self.show_result(message, True)
-        
-        # 重置进度条
-        self.progress_bar.setValue(0)
-        QApplication.processEvents()
-
     def _show_final_results(self, uploaded_files, total_files, failed_files):
         """显示最终上传结果"""
         if failed_files:
@@ -1744,74 +3366,277 @@ class R2UploaderGUI(QMainWindow):
 
     def delete_directory(self, prefix, show_confirm=True):
         """删除目录及其所有内容"""
-        try:
-            # 获取目录下所有对象
-            paginator = self.s3_client.get_paginator('list_objects_v2')
-            total_objects = 0
-            deleted_objects = 0
-            
-            # 首先计算总对象数
-            for page in paginator.paginate(Bucket=self.current_bucket_name, Prefix=prefix):
-                if 'Contents' in page:
-                    total_objects += len(page['Contents'])
-            
-            if total_objects == 0:
-                self.show_result(f'目录 {prefix} 为空', False)
+        if show_confirm:
+            reply = QMessageBox.question(
+                self,
+                '确认删除',
+                f'确定要删除目录 {prefix} 及其中的所有文件吗？',
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
                 return
-            
-            # 确认删除（如果需要）
-            proceed_with_delete = True
-            if show_confirm:
-                reply = QMessageBox.question(
-                    self,
-                    '确认删除',
-                    f'确定要删除目录 {prefix} 及其中的 {total_objects} 个文件吗？',
-                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
-                )
-                proceed_with_delete = (reply == QMessageBox.StandardButton.Yes)
-            
-            if proceed_with_delete:
-                # 创建进度对话框
-                progress = QProgressDialog("正在删除文件...", "取消", 0, total_objects, self)
-                progress.setWindowTitle("删除进度")
-                progress.setWindowModality(Qt.WindowModality.WindowModal)
-                
-                # 删除所有对象
-                for page in paginator.paginate(Bucket=self.current_bucket_name, Prefix=prefix):
-                    if 'Contents' in page:
-                        for obj in page['Contents']:
-                            if progress.wasCanceled():
-                                self.show_result(f'删除操作已取消，已删除 {deleted_objects} 个文件', True)
-                                return
-                                
-                            self.s3_client.delete_object(
-                                Bucket=self.current_bucket_name,
-                                Key=obj['Key']
-                            )
-                            deleted_objects += 1
-                            progress.setValue(deleted_objects)
-                            QApplication.processEvents()
-                            
-                progress.close()
-                self.show_result(f'目录 {prefix} 已删除，共删除 {deleted_objects} 个文件', False)
-                # 刷新文件列表并更新桶大小
-                self.refresh_file_list(self.current_path, calculate_bucket_size=True)
-                
+        self._start_prefix_delete(f'目录 {prefix}', {}, [prefix])
+
+    def rename_item(self, item):
+        """重命名文件或目录（服务端复制后删除原对象）"""
+        old_name = item.key.rstrip('/').rsplit('/', 1)[-1]
+        new_name, ok = QInputDialog.getText(self, '重命名', '新名称:', text=old_name)
+        new_name = new_name.strip().strip('/')
+        if not ok or not new_name or new_name == old_name:
+            return
+        if '/' in new_name:
+            QMessageBox.warning(self, '错误', '名称中不能包含 /，移动到其他目录请使用“移动到...”')
+            return
+        parent = item.key[:len(item.key.rstrip('/')) - len(old_name)]
+        new_key = parent + new_name + ('/' if item.is_dir else '')
+        self._start_copy([(item, new_key)], f'重命名 {old_name} 为 {new_name}', delete_source=True)
+
+    def move_items(self, items, delete_source=True):
+        """把文件和目录移动（或复制）到另一个目录，全部在服务端完成"""
+        action = '移动' if delete_source else '复制'
+        dest_prefix, ok = QInputDialog.getText(
+            self, f'{action}到', '目标目录（留空表示根目录）:', text=self.current_path)
+        if not ok:
+            return
+        dest_prefix = dest_prefix.strip().strip('/')
+        dest_prefix = dest_prefix + '/' if dest_prefix else ''
+
+        targets = []
+        for item in items:
+            name = item.key.rstrip('/').rsplit('/', 1)[-1] + ('/' if item.is_dir else '')
+            if item.is_dir and (dest_prefix + name).startswith(item.key):
+                QMessageBox.warning(self, '错误', f'不能把目录 {item.key} {action}到它自身或其子目录中')
+                return
+            targets.append((item, dest_prefix + name))
+
+        self._start_copy(targets, f'{action} {len(items)} 项到 /{dest_prefix}', delete_source)
+
+    def _start_copy(self, targets, description, delete_source):
+        """把 [(条目, 目标键)] 作为一个服务端复制批次（delete_source 为 True 时为移动）加入传输队列
+
+        文件直接加入批次；目录在后台依次逐页列出，每页展开为复制任务后立即加入批次，
+        列出的同时已开始复制。取消批次后不再列出后续页面。
+        """
+        batch = self._new_batch('copy', description, options={'delete_source': delete_source})
+        batch.sealed = False
+        s3_client = self.s3_client
+        directories = []
+        queued = 0
+
+        def submit(copies):
+            nonlocal queued
+            tasks = [TransferTask(batch, s3_client, source_key, dest_key, size)
+                     for source_key, dest_key, size in copies]
+            # 覆盖已有对象时桶统计只计入大小的差值
+            remote_sizes = self._known_remote_sizes(batch.bucket_name, [task.dest for task in tasks])
+            for task in tasks:
+                task.previous_existed = task.dest in remote_sizes
+                task.previous_size = remote_sizes.get(task.dest, 0)
+            if tasks:
+                queued += len(tasks)
+                self._submit_transfer(batch, tasks)
+
+        def list_next(prefix=None, error=None):
+            if error:
+                self.show_result(f'列出 {prefix} 失败，不再处理其余目录：{error}', True)
+            elif directories and not batch.cancelled:
+                item, dest_prefix = directories.pop(0)
+
+                def on_page(page):
+                    if batch.cancelled:
+                        return False
+                    submit((key, dest_prefix + key[len(item.key):], size) for key, size, _ in page)
+                    self.statusBar().showMessage(f'正在列出 {item.key} 中的文件... 已加入队列 {queued} 个')
+
+                self._list_prefix_pages(item.key, on_page, lambda error: list_next(item.key, error))
+                return
+            if queued:
+                self._get_transfer_queue().seal_batch(batch)
+            elif not error:
+                self.show_result('没有需要处理的文件', False)
+
+        self.show_result(f'开始{description}', False)
+        submit((item.key, dest_key, item.size)
+               for item, dest_key in targets if not item.is_dir and item.key != dest_key)
+        directories.extend((item, dest_key) for item, dest_key in targets if item.is_dir and item.key != dest_key)
+        list_next()
+
+    def migrate_prefix(self, prefix):
+        """把当前存储桶中的一个前缀复制到另一个已配置的存储桶"""
+        source_id = self.bucket_combo.currentText()
+        other_ids = [bucket_id for bucket_id in self.buckets if bucket_id != source_id]
+        if not other_ids:
+            QMessageBox.information(self, '迁移', '请先在配置中添加另一个存储桶')
+            return
+        dest_id, ok = QInputDialog.getItem(
+            self, '迁移到其他存储桶', f'把 /{prefix} 复制到存储桶:', other_ids, 0, False)
+        if not ok:
+            return
+        dest_prefix, ok = QInputDialog.getText(
+            self, '迁移到其他存储桶', '目标目录（留空表示根目录）:', text=prefix)
+        if not ok:
+            return
+        dest_prefix = dest_prefix.strip().strip('/')
+        dest_prefix = dest_prefix + '/' if dest_prefix else ''
+
+        job_id = self.migration_store.create(source_id, dest_id, prefix, dest_prefix)
+        self._start_migration(job_id)
+
+    def resume_migrations(self):
+        """继续所有未完成且未在运行的迁移任务"""
+        for job in self.migration_store.jobs():
+            if job['job_id'] not in self.migration_threads:
+                self._start_migration(job['job_id'])
+
+    def _start_migration(self, job_id):
+        """按检查点在后台执行迁移任务；两个存储桶使用同一端点（同一账户）时在服务端复制"""
+        job = self.migration_store.get(job_id)
+        source_config = self.buckets.get(job['source_bucket_id'])
+        dest_config = self.buckets.get(job['dest_bucket_id'])
+        if source_config is None or dest_config is None:
+            self.show_result(f"❌ 迁移任务 {job_id} 的存储桶已不在配置中，已放弃该任务", True)
+            self.migration_store.remove(job_id)
+            return
+        try:
+            source_client = self._s3_client_for_bucket(source_config)
+            dest_client = self._s3_client_for_bucket(dest_config)
         except Exception as e:
-            self.show_result(f'删除目录失败：{str(e)}', True)
+            self.show_result(f"❌ 迁移失败：{str(e)}", True)
+            return
+        server_side = ((source_config.get('endpoint_url') or self.config.get('endpoint_url'))
+                       == (dest_config.get('endpoint_url') or self.config.get('endpoint_url')))
+
+        description = (f"{job['source_bucket_id']}:/{job['prefix']} → "
+                       f"{job['dest_bucket_id']}:/{job['dest_prefix']}")
+        self.show_result(f"开始迁移 {description}（{'服务端复制' if server_side else '经本机转发'}）", False)
+        migration_thread = MigrationThread(
+            self.migration_store,
+            job_id,
+            source_client,
+            source_config['bucket_name'],
+            dest_client,
+            dest_config['bucket_name'],
+            server_side,
+            int(self.config.get('migration_concurrency', DEFAULT_MIGRATION_CONCURRENCY))
+        )
+        migration_thread.progress_updated.connect(
+            lambda done_count, done_bytes, listed: self.statusBar().showMessage(
+                f"正在迁移 {description}：{done_count}/{listed} 个文件，{self._format_size(done_bytes)}"
+            )
+        )
+        migration_thread.migration_finished.connect(
+            lambda *result: self._on_migration_finished(description, dest_config['bucket_name'], *result))
+        self.migration_threads[job_id] = migration_thread
+        migration_thread.start()
+
+    def _on_migration_finished(self, description, dest_bucket, job_id, completed, errors, copied_count, copied_bytes):
+        self.migration_threads.pop(job_id, None)
+        self.statusBar().showMessage('就绪')
+        for key, error in errors[:100]:
+            self.show_result(f'❌ {key}: {error}', True)
+        # 目标存储桶中新增的对象在下次完整遍历时计入索引，这里只增量更新桶统计
+        self.listing_cache.clear()
+        self._apply_bucket_delta(dest_bucket, copied_bytes, copied_count)
+        if completed:
+            self.show_result(f'✅ 迁移完成 {description}：本次复制 {copied_count} 个文件，'
+                             f'{self._format_size(copied_bytes)}', False)
+        else:
+            self.show_result(f'迁移未完成 {description}：本次复制 {copied_count} 个文件，失败 {len(errors)} 个，'
+                             f'可在右键菜单中选择“继续未完成的迁移”从断点继续', True)
+        if dest_bucket == self.current_bucket_name:
+            self.refresh_file_list(self.current_path)
+
+    def _list_prefix_pages(self, prefix, on_page, on_finished):
+        """在后台逐页列出当前存储桶中前缀下的所有对象
+
+        每页结果回到界面线程后调用 on_page([(键, 大小, ETag)])，返回 False 时不再请求下一页；
+        结束后调用 on_finished(error)，列完或被停止时 error 为 None，请求失败时为错误信息。
+        """
+        s3_client, bucket_name = self.s3_client, self.current_bucket_name
+
+        def request(token):
+            params = {'Bucket': bucket_name, 'Prefix': prefix}
+            if token:
+                params['ContinuationToken'] = token
+            return s3_client.list_objects_v2(**params)
+
+        def on_response(response):
+            page = [(obj['Key'], obj['Size'], obj['ETag']) for obj in response.get('Contents', [])]
+            if on_page(page) is False or not response.get('IsTruncated'):
+                on_finished(None)
+            else:
+                submit(response['NextContinuationToken'])
+
+        def submit(token):
+            self.request_executor.submit(None, lambda: request(token), on_response, on_finished)
+
+        submit(None)
+
+    def _start_batch_delete(self, objects, description, bucket_id=None, bucket_name=None):
+        """把 {键: 大小} 中的对象作为一个删除批次加入传输队列，默认删除当前存储桶中的对象"""
+        batch = self._new_batch('delete', description)
+        if bucket_name is not None:
+            batch.bucket_id = bucket_id
+            batch.bucket_name = bucket_name
+        s3_client = self._s3_client_for_bucket(self.buckets[batch.bucket_id])
+        self.show_result(f'开始删除{description}：共 {len(objects)} 个文件', False)
+        self._submit_transfer(batch, [
+            TransferTask(batch, s3_client, key, size=size) for key, size in objects.items()
+        ])
+
+    def _start_prefix_delete(self, description, objects, prefixes):
+        """删除当前存储桶中 {键: 大小} 的对象和 prefixes 中各目录下的全部对象
+
+        目录在后台依次逐页列出，每页立即加入同一个删除批次，不在内存中保留整个目录的列表；
+        取消批次后不再列出后续页面。
+        """
+        batch = self._new_batch('delete', description)
+        batch.sealed = False
+        s3_client = self.s3_client
+        remaining = list(prefixes)
+        queued = 0
+
+        def submit(items):
+            nonlocal queued
+            tasks = [TransferTask(batch, s3_client, key, size=size) for key, size in items]
+            if tasks:
+                queued += len(tasks)
+                self._submit_transfer(batch, tasks)
+
+        def on_page(page):
+            if batch.cancelled:
+                return False
+            submit((key, size) for key, size, _ in page)
+            self.statusBar().showMessage(f'正在列出要删除的文件... 已加入队列 {queued} 个')
+
+        def list_next(prefix=None, error=None):
+            if error:
+                self.show_result(f'列出 {prefix} 失败，不再删除其余目录：{error}', True)
+            elif remaining and not batch.cancelled:
+                next_prefix = remaining.pop(0)
+                self._list_prefix_pages(next_prefix, on_page, lambda error: list_next(next_prefix, error))
+                return
+            if queued:
+                self._get_transfer_queue().seal_batch(batch)
+            elif not error:
+                self.show_result(f'{description} 中没有可删除的文件', False)
+
+        self.show_result(f'开始删除{description}', False)
+        submit(objects.items())
+        list_next()
 
     # 添加新的方法来处理快捷键操作
     def enter_selected_directory(self):
         """处理进入目录的快捷键"""
-        item = self.file_list.currentItem()
-        if item and item.text(1) == '目录':
+        item = self._current_entry()
+        if item and item.is_dir:
             self.on_item_double_clicked(item)
 
     def delete_selected_directory(self):
         """处理删除目录的快捷键"""
-        item = self.file_list.currentItem()
-        if item and item.text(1) == '目录':
-            self.delete_directory(item.data(0, Qt.ItemDataRole.UserRole))
+        item = self._current_entry()
+        if item and item.is_dir:
+            self.delete_directory(item.key)
 
     def create_new_folder(self):
         """创建新文件夹"""
@@ -1837,31 +3662,48 @@ class R2UploaderGUI(QMainWindow):
                 else:
                     full_path = f"{folder_name}/"
                 
-                # 检查文件夹是否已存在
-                response = self.s3_client.list_objects_v2(
-                    Bucket=self.current_bucket_name,
-                    Prefix=full_path,
-                    MaxKeys=1
-                )
-                
-                if 'Contents' in response:
-                    QMessageBox.warning(self, '错误', '该文件夹已存在！')
-                    return
-                
-                # 创建空文件夹（上传一个空文件）
-                self.s3_client.put_object(
-                    Bucket=self.current_bucket_name,
-                    Key=full_path,
-                    Body=''
+                s3_client = self.s3_client
+                bucket_name = self.current_bucket_name
+
+                def create():
+                    # 检查文件夹是否已存在
+                    response = s3_client.list_objects_v2(
+                        Bucket=bucket_name,
+                        Prefix=full_path,
+                        MaxKeys=1
+                    )
+                    if 'Contents' in response:
+                        return False
+                    
+                    # 创建空文件夹（上传一个空文件）
+                    s3_client.put_object(
+                        Bucket=bucket_name,
+                        Key=full_path,
+                        Body=''
+                    )
+                    return True
+
+                self.show_result(f'正在创建文件夹：{folder_name}', False)
+                self.request_executor.submit(
+                    None,
+                    create,
+                    lambda created: self._on_folder_created(bucket_name, current_path, full_path, folder_name, created),
+                    lambda error: self.show_result(f'❌ 创建文件夹失败：{error}', True)
                 )
                 
-                self.show_result(f'✅ 文件夹创建成功：{folder_name}', False)
-                # 刷新文件列表
-                self.refresh_file_list(current_path)
-                
         except Exception as e:
             self.show_result(f'❌ 创建文件夹失败：{str(e)}', True)
 
+    def _on_folder_created(self, bucket_name, parent_path, full_path, folder_name, created):
+        if not created:
+            QMessageBox.warning(self, '错误', '该文件夹已存在！')
+            return
+        self.listing_cache.invalidate_keys(bucket_name, [full_path])
+        self.show_result(f'✅ 文件夹创建成功：{folder_name}', False)
+        # 仍在原目录时刷新文件列表
+        if bucket_name == self.current_bucket_name and parent_path == self.current_path:
+            self.refresh_file_list(parent_path)
+
     def dragEnterEvent(self, event):
         """处理拖入事件"""
         if event.mimeData().hasUrls():
@@ -1871,7 +3713,7 @@ class R2UploaderGUI(QMainWindow):
             if widget == self.file_list:
                 # 如果是拖入文件列表，改变背景色
                 widget.setStyleSheet("""
-                    QTreeWidget {
+                    QTreeView {
                         background-color: #e0e0e0;
                         border: 2px dashed #666;
                     }
@@ -1899,201 +3741,140 @@ class R2UploaderGUI(QMainWindow):
         current_path = self.current_path
         
         # 显示开始上传的提示
-        total_files = len(files)
-        self.show_result(f'开始处理 {total_files} 个拖放项目...', False)
-        
-        # 创建进度对话框
-        progress = QProgressDialog("正在上传文件...", "取消", 0, total_files, self)
-        progress.setWindowTitle("上传进度")
-        progress.setWindowModality(Qt.WindowModality.WindowModal)
-        progress.setMinimumDuration(0)  # 立即显示进度对话框
+        total_items = len(files)
+        self.show_result(f'开始处理 {total_items} 个拖放项目...', False)
         
-        # 处理拖放的文件
-        processed_count = 0
+        # 收集所有拖放项目中的文件，作为一个批次并发上传
+        items = []
         for file_path in files:
-            if progress.wasCanceled():
-                self.show_result('上传已取消', True)
-                break
-                
             try:
                 if os.path.isfile(file_path):
-                    # 获取文件名
                     file_name = os.path.basename(file_path)
-                    file_size = os.path.getsize(file_path)
-                    
-                    # 显示正在处理的文件信息
-                    self.show_result(f'正在上传文件: {file_name} ({self._format_size(file_size)})', False)
-                    
-                    # 构建目标路径
-                    if current_path:
-                        target_path = f"{current_path}{file_name}"
-                    else:
-                        target_path = file_name
-                    
-                    # 创建上传线程
-                    upload_thread = UploadThread(
-                        self.s3_client,
-                        self.current_bucket_name,
-                        file_path,
-                        target_path
-                    )
-                    
-                    # 连接信号
-                    upload_thread.progress_updated.connect(self.progress_bar.setValue)
-                    upload_thread.status_updated.connect(self.show_result)
-                    upload_thread.speed_updated.connect(
-                        lambda speed: self.update_upload_info(
-                            os.path.dirname(file_path),
-                            total_files,
-                            processed_count,
-                            file_name,
-                            file_size,
-                            speed
-                        )
-                    )
-                    
-                    # 启动上传
-                    upload_thread.start()
-                    
-                    # 等待上传完成，但允许取消
-                    while not upload_thread.isFinished():
-                        if progress.wasCanceled():
-                            upload_thread.is_cancelled = True
-                            break
-                        QApplication.processEvents()
-                        time.sleep(0.1)
-                    
-                    if not progress.wasCanceled():
-                        processed_count += 1
-                        self.show_result(f'✅ 文件上传完成: {file_name} ({processed_count}/{total_files})', False)
+                    items.append((file_path, f"{current_path}{file_name}"))
                     
                 elif os.path.isdir(file_path):
-                    # 获取文件夹名
                     folder_name = os.path.basename(file_path)
-                    
-                    # 显示正在处理的文件夹信息
-                    self.show_result(f'正在上传文件夹: {folder_name}', False)
-                    
-                    # 构建目标路径
-                    if current_path:
-                        target_path = f"{current_path}{folder_name}/"
-                    else:
-                        target_path = f"{folder_name}/"
-                    
-                    # 上传文件夹
-                    self._upload_folder_to_path(file_path, target_path)
-                    
-                    if not progress.wasCanceled():
-                        processed_count += 1
-                        self.show_result(f'✅ 文件夹上传完成: {folder_name} ({processed_count}/{total_files})', False)
+                    target_path = f"{current_path}{folder_name}/"
+                    for local_path, relative_path in self._get_folder_files(file_path):
+                        items.append((local_path, f"{target_path}{relative_path}".replace('\\', '/')))
                     
                 else:
                     self.show_result(f'❌ 不支持的文件类型：{file_path}', True)
                     
             except Exception as e:
                 self.show_result(f'❌ 处理文件失败：{file_path} - {str(e)}', True)
-            
-            # 更新进度对话框
-            progress.setValue(processed_count)
-            QApplication.processEvents()
-        
-        progress.close()
         
-        # 显示最终结果
-        if not progress.wasCanceled():
-            self.show_result(f'✅ 所有项目处理完成！成功处理 {processed_count}/{total_files} 个项目', False)
+        if not items:
+            self.show_result('拖放的项目中没有可上传的文件', True)
+            return
         
-        # 刷新文件列表
-        self.refresh_file_list(current_path, calculate_bucket_size=True)
+        label = os.path.dirname(files[0]) if total_items > 1 else files[0]
+        self._start_upload_batch(label, items)
 
     def _upload_folder_to_path(self, local_folder_path, target_path):
         """上传文件夹到指定路径"""
-        try:
-            all_files = self._get_folder_files(local_folder_path)
-            total_files = len(all_files)
-            
-            if total_files == 0:
-                self.show_result('文件夹为空，没有上传的文件', True)
-                return
+        all_files = self._get_folder_files(local_folder_path)
+        if not all_files:
+            self.show_result('文件夹为空，没有上传的文件', True)
+            return None
 
-            self.show_result(f'开始上传文件夹: {local_folder_path}', False)
-            uploaded_files = 0
-            failed_files = []
+        self.show_result(f'开始上传文件夹: {local_folder_path}', False)
+        items = [
+            (local_path, f"{target_path}{relative_path}".replace('\\', '/'))
+            for local_path, relative_path in all_files
+        ]
+        return self._start_upload_batch(local_folder_path, items)
+
+    def resume_pending_uploads(self):
+        """继续当前存储桶中未完成的分片上传"""
+        queued_uploads = self._get_transfer_queue().active_upload_keys()
+        pending_uploads = [entry for entry in self.upload_journal.pending(self.current_bucket_name)
+                           if (entry['bucket'], entry['key']) not in queued_uploads]
+        if not pending_uploads:
+            self.show_result('没有未完成的上传', False)
+            return
 
-            for local_path, relative_path in all_files:
-                try:
-                    # 构建目标文件路径
-                    target_file_path = f"{target_path}{relative_path}".replace('\\', '/')
-                    file_size = os.path.getsize(local_path)
-                    current_file = os.path.basename(local_path)
-
-                    # 显示开始上传当前文件的信息
-                    self.show_result(f'开始上传: {current_file} ({self._format_size(file_size)})', False)
-
-                    # 创建并启动上传线程
-                    upload_thread = UploadThread(
-                        self.s3_client,
-                        self.current_bucket_name,
-                        local_path,
-                        target_file_path
-                    )
+        self.show_result(f'开始续传 {len(pending_uploads)} 个未完成的上传', False)
+        items = []
+        missing = []
+        for entry in pending_uploads:
+            local_path = entry['local_path']
+            if not os.path.isfile(local_path):
+                # 本地文件已不存在，无法续传，中止分片上传以删除服务端已接收的分片
+                self.show_result(f'❌ 本地文件不存在，放弃续传: {local_path}', True)
+                missing.append(entry)
+                continue
+            items.append((local_path, entry['key']))
+
+        if missing:
+            self._abort_pending_uploads(missing)
+        if items:
+            self._start_upload_batch('未完成的上传', items)
+
+    def discard_pending_uploads(self):
+        """放弃当前存储桶中未完成的分片上传：中止分片上传并删除断点记录，不再续传"""
+        queued_uploads = self._get_transfer_queue().active_upload_keys()
+        pending_uploads = [entry for entry in self.upload_journal.pending(self.current_bucket_name)
+                           if (entry['bucket'], entry['key']) not in queued_uploads]
+        if not pending_uploads:
+            self.show_result('没有未完成的上传', False)
+            return
+        reply = QMessageBox.question(
+            self,
+            '放弃未完成的上传',
+            f'确定要放弃 {len(pending_uploads)} 个未完成的上传吗？已上传的分片将从服务端删除。',
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        if reply == QMessageBox.StandardButton.Yes:
+            self._abort_pending_uploads(pending_uploads)
 
-                    # 连接信号
-                    upload_thread.progress_updated.connect(self.progress_bar.setValue)
-                    upload_thread.status_updated.connect(self.show_result)
-                    upload_thread.speed_updated.connect(lambda speed: self.update_upload_info(
-                        local_folder_path,
-                        total_files,
-                        uploaded_files,
-                        current_file,
-                        file_size,
-                        speed
-                    ))
-
-                    # 启动线程并等待完成
-                    upload_thread.start()
-                    while not upload_thread.isFinished():
-                        QApplication.processEvents()
-                        time.sleep(0.1)
-
-                    if upload_thread.isFinished():
-                        uploaded_files += 1
-                        self.show_result(f'✅ 文件上传成功: {current_file}', False)
+    def _abort_pending_uploads(self, entries):
+        """在后台中止断点记录中的分片上传，成功后删除记录"""
+        s3_client, journal = self.s3_client, self.upload_journal
 
+        def abort_all():
+            errors = []
+            for entry in entries:
+                try:
+                    abort_pending_upload(s3_client, journal, entry)
                 except Exception as e:
-                    error_msg = f'❌ 文件上传失败：{os.path.basename(local_path)} - {str(e)}'
-                    self.show_result(error_msg, True)
-                    failed_files.append((relative_path, str(e)))
-
-            # 显示最终上传结果
-            self._show_final_results(uploaded_files, total_files, failed_files)
+                    errors.append((entry['key'], str(e)))
+            return errors
+
+        self.request_executor.submit(
+            None,
+            abort_all,
+            lambda errors: self._on_pending_uploads_aborted(len(entries), errors),
+            lambda error: self.show_result(f'❌ 中止未完成的上传失败：{error}', True)
+        )
 
-        except Exception as e:
-            self.show_result(f'文件夹上传失败：{str(e)}', True)
-        finally:
-            self.progress_bar.setValue(0)
+    def _on_pending_uploads_aborted(self, count, errors):
+        for key, error in errors:
+            self.show_result(f'❌ 中止未完成的上传失败：{key} - {error}，记录已保留，可稍后再次放弃', True)
+        if count > len(errors):
+            self.show_result(f'已放弃 {count - len(errors)} 个未完成的上传', False)
 
     def delete_selected_item(self):
         """处理删除快捷键"""
-        item = self.file_list.currentItem()
-        if item and item.text(1) != '目录':
+        item = self._current_entry()
+        if item and not item.is_dir:
             self.delete_file(item)
 
     def share_selected_item(self, use_custom_domain):
         """处理分享快捷键"""
-        item = self.file_list.currentItem()
-        if item and item.text(1) != '目录':
+        item = self._current_entry()
+        if item and not item.is_dir:
             self.generate_public_share(item, use_custom_domain)
             
     def delete_selected_items(self):
         """批量删除所选文件/文件夹"""
-        selected_items = self.file_list.selectedItems()
+        selected_items = self._selected_entries()
         if not selected_items:
             return
             
         # 统计文件和目录的数量
-        file_count = sum(1 for item in selected_items if item.text(1) != '目录')
-        dir_count = sum(1 for item in selected_items if item.text(1) == '目录')
+        file_count = sum(1 for item in selected_items if not item.is_dir)
+        dir_count = sum(1 for item in selected_items if item.is_dir)
         
         # 确认删除
         reply = QMessageBox.question(
@@ -2103,63 +3884,19 @@ class R2UploaderGUI(QMainWindow):
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
         
-        if reply == QMessageBox.StandardButton.Yes:
-            # 创建进度对话框
-            progress = QProgressDialog("正在删除文件...", "取消", 0, len(selected_items), self)
-            progress.setWindowTitle("删除进度")
-            progress.setWindowModality(Qt.WindowModality.WindowModal)
-            
-            # 处理每个选中的项目
-            deleted_count = 0
-            error_count = 0
-            
-            for index, item in enumerate(selected_items):
-                if progress.wasCanceled():
-                    self.show_result(f'删除操作已取消，已删除 {deleted_count} 个项目', True)
-                    break
-                    
-                try:
-                    object_key = item.data(0, Qt.ItemDataRole.UserRole)
-                    
-                    if item.text(1) == '目录':
-                        # 删除目录
-                        self.delete_directory(object_key, show_confirm=False)
-                    else:
-                        # 删除文件
-                        self.s3_client.delete_object(
-                            Bucket=self.current_bucket_name,
-                            Key=object_key
-                        )
-                    
-                    deleted_count += 1
-                    self.show_result(f'已删除 {item.text(0)}', False)
-                    
-                except Exception as e:
-                    error_count += 1
-                    self.show_result(f'删除 {item.text(0)} 失败：{str(e)}', True)
-                
-                # 更新进度
-                progress.setValue(index + 1)
-                QApplication.processEvents()
-            
-            progress.close()
-            
-            # 显示最终结果
-            result_message = f'批量删除完成，成功：{deleted_count}/{len(selected_items)}'
-            if error_count > 0:
-                result_message += f'，失败：{error_count}'
-                
-            self.show_result(result_message, error_count > 0)
-            
-            # 刷新文件列表并更新桶大小
-            self.refresh_file_list(self.current_path, calculate_bucket_size=True)
+        if reply != QMessageBox.StandardButton.Yes:
+            return
+
+        objects = {item.key: item.size for item in selected_items if not item.is_dir}
+        directories = [item.key for item in selected_items if item.is_dir]
+        self._start_prefix_delete(f'选中的 {file_count} 个文件和 {dir_count} 个目录', objects, directories)
 
     def share_selected_items(self, use_custom_domain=True):
         """批量分享所选文件"""
-        selected_items = self.file_list.selectedItems()
+        selected_items = self._selected_entries()
         
         # 筛选出非目录项
-        file_items = [item for item in selected_items if item.text(1) != '目录']
+        file_items = [item for item in selected_items if not item.is_dir]
         
         if not file_items:
             self.show_result("没有选中可分享的文件", True)
@@ -2170,7 +3907,7 @@ class R2UploaderGUI(QMainWindow):
         domain_type = "自定义域名" if use_custom_domain else "R2.dev"
         
         for item in file_items:
-            object_key = item.data(0, Qt.ItemDataRole.UserRole)
+            object_key = item.key
             
             if use_custom_domain:
                 domain = self.current_bucket_config.get('custom_domain')
@@ -2196,46 +3933,83 @@ class R2UploaderGUI(QMainWindow):
         
         self.show_result(f"已复制 {len(urls)} 个{domain_type}访问链接到剪贴板", False)
 
-# 添加一个新的 Worker 类来理后台计算
-class Worker(QObject):
-    finished = pyqtSignal()
-    size_calculated = pyqtSignal(int)
-
-    def __init__(self, s3_client, bucket_name):
-        super().__init__()
-        self.s3_client = s3_client
-        self.current_bucket_name = bucket_name
+    def closeEvent(self, event):
+        """窗口关闭时停止传输队列，未完成的任务在下次启动时继续"""
+        if hasattr(self, 'transfer_queue'):
+            self.transfer_queue.shutdown()
+            # 未结束的批次中已完成的任务也计入桶统计
+            for batch in self.transfer_queue.active_batches:
+                self.bucket_stats.apply_delta(batch.bucket_name, batch.bytes_delta, batch.count_delta)
+        self.request_executor.shutdown()
+        self.thumbnail_loader.shutdown()
+        # 解除限速，让等待令牌的传输线程尽快结束
+        self.bandwidth_limiter.set_rate(0)
+        # 迁移进度已写入检查点，下次启动后可以继续
+        for migration_thread in self.migration_threads.values():
+            migration_thread.is_cancelled = True
+        if self.url_export_thread and self.url_export_thread.isRunning():
+            self.url_export_thread.is_cancelled = True
+        event.accept()
 
-    def calculate_bucket_size(self):
-        """计算桶的总大小"""
+class RequestExecutor(QObject):
+    """在后台线程执行 S3 请求，结果通过信号回到 GUI 线程后再调用回调
+
+    channel 相同的请求只保留最新一次的结果，较早请求的结果到达时直接丢弃；
+    channel 为 None 的请求结果总会送达。
+    """
+    _request_done = pyqtSignal(int, bool, object)  # 请求编号, 是否成功, 结果或错误信息
+
+    def __init__(self, max_workers=4, parent=None):
+        super().__init__(parent)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.latest = {}  # channel -> 最新请求编号
+        self.callbacks = {}  # 请求编号 -> (channel, on_success, on_error)
+        self.next_id = 0
+        self._request_done.connect(self._on_request_done)
+
+    def submit(self, channel, fn, on_success=None, on_error=None):
+        """提交请求，fn 在后台线程执行，on_success(result) 和 on_error(message) 在 GUI 线程调用"""
+        self.next_id += 1
+        request_id = self.next_id
+        self.callbacks[request_id] = (channel, on_success, on_error)
+        if channel is not None:
+            self.latest[channel] = request_id
+        self.executor.submit(self._run, request_id, fn)
+        return request_id
+
+    def cancel(self, channel):
+        """丢弃 channel 上尚未返回的请求结果"""
+        self.latest.pop(channel, None)
+
+    def is_pending(self, channel):
+        """channel 上是否有尚未返回的最新请求"""
+        return self.latest.get(channel) in self.callbacks
+
+    def _run(self, request_id, fn):
         try:
-            total_size = 0
-            paginator = self.s3_client.get_paginator('list_objects_v2')
-            
-            # 遍历所有对象
-            for page in paginator.paginate(Bucket=self.current_bucket_name):
-                if 'Contents' in page:
-                    for obj in page['Contents']:
-                        if not obj['Key'].endswith('/'):  # 排除目录
-                            file_size = obj['Size']
-                            total_size += file_size
-                            print(f"添加文件: {obj['Key']}, 大小: {file_size} bytes")  # 调试信息
-            
-            print(f"最终计算的总大小: {total_size} bytes")  # 调试信息
-            self.size_calculated.emit(total_size)
-            
+            result = fn()
         except Exception as e:
-            print(f"计算桶大小时发生错误: {str(e)}")  # 添加错误日志
-            self.size_calculated.emit(0)  # 发送0表示计算失败
-        finally:
-            self.finished.emit()
-
-    def closeEvent(self, event):
-        """窗口关闭时确保线程正确退出"""
-        if self.bucket_size_thread and self.bucket_size_thread.isRunning():
-            self.bucket_size_thread.quit()
-            self.bucket_size_thread.wait()
-        event.accept()
+            self._request_done.emit(request_id, False, str(e))
+        else:
+            self._request_done.emit(request_id, True, result)
+
+    def _on_request_done(self, request_id, ok, result):
+        entry = self.callbacks.pop(request_id, None)
+        if entry is None:
+            return  # shutdown() 之后才完成的请求
+        channel, on_success, on_error = entry
+        if channel is not None:
+            if self.latest.get(channel) != request_id:
+                return  # 已被更新的请求取代
+            del self.latest[channel]
+        callback = on_success if ok else on_error
+        if callback:
+            callback(result)
+
+    def shutdown(self):
+        self.callbacks.clear()
+        self.latest.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
 
 def main():
     app = QApplication(sys.argv)
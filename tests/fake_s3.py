@@ -0,0 +1,85 @@
+"""测试用的内存 S3 客户端，只实现本工具用到的接口"""
+import bisect
+import threading
+
+class FakeS3:
+    """按键排序保存对象的内存存储桶，可在多个线程中同时调用，并记录每种请求的次数"""
+
+    def __init__(self, keys=(), page_size=1000):
+        self.page_size = page_size
+        self.objects = {key: b'x' for key in keys}
+        self.keys = sorted(self.objects)
+        self.calls = {}
+        self.deleted_batches = []  # 每次 delete_objects 请求删除的键数
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def list_objects_v2(self, Bucket, Prefix='', Delimiter=None, StartAfter=None,
+                        ContinuationToken=None, MaxKeys=None):
+        self._count('list_objects_v2')
+        limit = min(MaxKeys or self.page_size, self.page_size)
+        with self._lock:
+            keys = list(self.keys)
+        after = ContinuationToken or StartAfter
+        i = bisect.bisect_right(keys, after) if after else 0
+        i = max(i, bisect.bisect_left(keys, Prefix))
+        contents, prefixes, last = [], [], None
+        while i < len(keys) and keys[i].startswith(Prefix) and len(contents) + len(prefixes) < limit:
+            rest = keys[i][len(Prefix):]
+            if Delimiter and Delimiter in rest:
+                last = Prefix + rest.split(Delimiter)[0] + Delimiter
+                prefixes.append({'Prefix': last})
+                i = bisect.bisect_left(keys, last + '\U0010ffff')
+            else:
+                last = keys[i]
+                contents.append({'Key': last, 'Size': len(self.objects[last]), 'ETag': '"etag"'})
+                i += 1
+        response = {'IsTruncated': i < len(keys) and keys[i].startswith(Prefix), 'KeyCount': len(contents)}
+        if contents:
+            response['Contents'] = contents
+        if prefixes:
+            response['CommonPrefixes'] = prefixes
+        if response['IsTruncated']:
+            # 真实的令牌是不透明的字符串，这里直接用最后一个键
+            response['NextContinuationToken'] = last
+        return response
+
+    def _put(self, key, data):
+        with self._lock:
+            if key not in self.objects:
+                bisect.insort(self.keys, key)
+            self.objects[key] = data
+
+    def upload_file(self, Filename, Bucket, Key, Callback=None, ExtraArgs=None, Config=None):
+        self._count('upload_file')
+        with open(Filename, 'rb') as f:
+            data = f.read()
+        if Callback:
+            Callback(len(data))
+        self._put(Key, data)
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._count('head_object')
+        with self._lock:
+            data = self.objects[Key]
+        return {'ContentLength': len(data), 'ETag': '"etag"'}
+
+    def copy_object(self, Bucket, Key, CopySource):
+        self._count('copy_object')
+        with self._lock:
+            data = self.objects[CopySource['Key']]
+        self._put(Key, data)
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        self._count('delete_objects')
+        keys = [item['Key'] for item in Delete['Objects']]
+        with self._lock:
+            self.deleted_batches.append(len(keys))
+            for key in keys:
+                if self.objects.pop(key, None) is not None:
+                    del self.keys[bisect.bisect_left(self.keys, key)]
+        return {}
@@ -0,0 +1,96 @@
+import random
+import uuid
+from collections import Counter
+
+import pytest
+
+import cloudflare_r2_core as core
+from fake_s3 import FakeS3
+
+def _keyspace(name, count):
+    rng = random.Random(count)
+    if name == 'flat':
+        return [f'img_{i:06}.jpg' for i in range(count)]
+    if name == 'hex':
+        return [uuid.UUID(int=rng.getrandbits(128)).hex for _ in range(count)]
+    if name == 'nested':
+        return [f'{a:03}/{b:02}/{c:02}.dat' for a in range(count // 500) for b in range(10) for c in range(50)]
+    if name == 'deep':
+        return [f'a/b/c/{i:07}' for i in range(count)]
+    if name == 'non-ascii':
+        return [f'照片/{i}号.jpg' for i in range(count // 2)] + [f'{rng.random()}ü€' for _ in range(count // 2)]
+    if name == 'skewed':
+        return [f'big/{i:06}' for i in range(count)] + [f'small{d}/x' for d in range(50)]
+    raise ValueError(name)
+
+KEYSPACES = ['flat', 'hex', 'nested', 'deep', 'non-ascii', 'skewed']
+
+def _list_all(s3, prefix='', max_workers=8):
+    keys = []
+    for page in core.iter_bucket_pages(s3, 'bucket', prefix, max_workers):
+        keys.extend(obj['Key'] for obj in page)
+    return keys
+
+def _call_bound(pages, max_workers):
+    """顺序列出需要的页数，加上每个分段越过上界的一次请求和没有收益的探测"""
+    return (pages + pages // core.SHARD_MIN_PAGES + max_workers * (core.SHARD_PROBE_FACTOR + 1)
+            + core.SHARD_DISCOVERY_DEPTH)
+
+@pytest.mark.parametrize('max_workers', [4, 8])
+@pytest.mark.parametrize('count', [20000, 100000])
+@pytest.mark.parametrize('name', KEYSPACES)
+def test_every_key_returned_once(name, count, max_workers):
+    keys = _keyspace(name, count)
+    s3 = FakeS3(keys)
+    listed = _list_all(s3, max_workers=max_workers)
+    assert Counter(listed) == Counter(keys)
+    pages = -(-len(keys) // s3.page_size)
+    assert s3.calls['list_objects_v2'] <= _call_bound(pages, max_workers)
+
+@pytest.mark.parametrize('name', KEYSPACES)
+def test_prefix_only_returns_keys_under_prefix(name):
+    inside = ['data/' + key for key in _keyspace(name, 20000)]
+    outside = ['dat', 'data', 'datb/x'] + ['zz/' + key for key in _keyspace(name, 5000)]
+    s3 = FakeS3(inside + outside)
+    listed = _list_all(s3, prefix='data/')
+    assert Counter(listed) == Counter(inside)
+    assert s3.calls['list_objects_v2'] <= _call_bound(20, 8)
+
+def test_small_bucket_is_listed_sequentially():
+    keys = _keyspace('hex', core.SHARD_SEQUENTIAL_PAGES * 1000)
+    s3 = FakeS3(keys)
+    assert Counter(_list_all(s3)) == Counter(keys)
+    assert s3.calls == {'list_objects_v2': core.SHARD_SEQUENTIAL_PAGES}
+
+def test_empty_prefix():
+    s3 = FakeS3(['a', 'b'])
+    assert _list_all(s3, prefix='missing/') == []
+    assert s3.calls == {'list_objects_v2': 1}
+
+def test_large_flat_listing_stays_near_minimum():
+    s3 = FakeS3(_keyspace('flat', 100000))
+    assert len(_list_all(s3)) == 100000
+    assert s3.calls['list_objects_v2'] <= 100 * 1.25
+
+@pytest.mark.parametrize('low, high', [
+    ('img_000999.jpg', 'img_0\U0010ffff'),
+    ('0a1f', None),
+    ('照片/1999号.jpg', '照片/\U0010ffff'),
+    ('a', 'b'),
+])
+def test_split_points_are_ordered_and_inside_range(low, high):
+    alphabet = core.key_alphabet([low, low[:-1] + '9'])
+    for parts in (2, 5, 16):
+        points = core.key_split_points(low, high, parts, alphabet)
+        assert len(points) <= parts - 1
+        assert points == sorted(set(points))
+        assert all(point > low and (high is None or point < high) for point in points)
+
+def test_split_points_follow_observed_characters():
+    page = [f'key-{i:06}' for i in range(3000, 4000)]
+    alphabet = core.key_alphabet(page)
+    assert alphabet == '0123456789'
+    points = core.key_split_points(page[-1], 'key-00\U0010ffff', 4, alphabet)
+    # 按数字等分，拆分点都落在 key-004000 到 key-009999 之间
+    assert len(points) == 3
+    assert all('key-004' < point < 'key-01' for point in points)
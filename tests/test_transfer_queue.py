@@ -0,0 +1,223 @@
+import os
+import threading
+import time
+
+import pytest
+
+from cloudflare_r2_core import DELETE_BATCH_SIZE, TransferStore, TransferTelemetry
+from fake_s3 import FakeS3
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+QtCore = pytest.importorskip('PyQt6.QtCore')
+from cloudflare_r2_manager import TransferBatch, TransferQueue, TransferTask  # noqa: E402
+
+# ---------- TransferStore ----------
+
+def test_store_reports_unfinished_batches():
+    store = TransferStore()
+    batch_id = store.create_batch('upload', '上传 a', 'bucket-1', 'bucket', 2, {'sync': True})
+    job_ids = store.add_jobs(batch_id, [(f'/tmp/{i}', f'k{i}', i, '') for i in range(5)])
+    store.set_states([(job_ids[0], 'done', ''), (job_ids[1], 'failed', '超时'), (job_ids[2], 'cancelled', '')])
+
+    [record] = store.unfinished_batches()
+    assert record['batch_id'] == batch_id
+    assert (record['kind'], record['label'], record['bucket_id'], record['bucket_name']) == (
+        'upload', '上传 a', 'bucket-1', 'bucket')
+    assert record['priority'] == 2
+    assert record['options'] == {'sync': True}
+    assert record['jobs'] == [(job_ids[3], '/tmp/3', 'k3', 3, ''), (job_ids[4], '/tmp/4', 'k4', 4, '')]
+    assert record['counts'] == {'done': 1, 'failed': 1, 'cancelled': 1, 'pending': 2}
+    assert record['failed'] == [('/tmp/1', 'k1', '超时')]
+
+def test_store_cancel_priority_and_cleanup():
+    store = TransferStore()
+    first = store.create_batch('delete', '删除', 'b', 'bucket')
+    second = store.create_batch('delete', '删除', 'b', 'bucket')
+    first_jobs = store.add_jobs(first, [('a', '', 0, ''), ('b', '', 0, '')])
+    store.add_jobs(second, [('c', '', 0, '')])
+
+    store.set_priority(second, 5)
+    store.cancel_pending(first)
+    [record] = store.unfinished_batches()
+    assert record['batch_id'] == second and record['priority'] == 5
+
+    # 第一个批次已没有未结束的任务，remove_finished 连同其任务一起删除
+    store.remove_finished()
+    assert store.conn.execute("SELECT COUNT(*) FROM transfer_jobs WHERE batch_id = ?", (first,)).fetchone() == (0,)
+    store.set_state(first_jobs[0], 'pending')  # 已删除的任务不会让批次重新出现
+    assert [record['batch_id'] for record in store.unfinished_batches()] == [second]
+
+    store.remove_batch(second)
+    assert store.unfinished_batches() == []
+
+def test_store_set_states_is_one_transaction():
+    store = TransferStore()
+    batch_id = store.create_batch('copy', '复制', 'b', 'bucket')
+    job_ids = store.add_jobs(batch_id, [(f's{i}', f'd{i}', 1, '') for i in range(100)])
+    statements = []
+    store.conn.set_trace_callback(statements.append)
+    store.set_states([(job_id, 'done', '') for job_id in job_ids[:99]])
+    store.conn.set_trace_callback(None)
+    assert sum(statement == 'COMMIT' for statement in statements) == 1
+    assert store.unfinished_batches()[0]['counts'] == {'done': 99, 'pending': 1}
+
+# ---------- TransferQueue ----------
+
+@pytest.fixture(scope='module')
+def qapp():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+def wait_until(qapp, condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, '等待超时'
+        qapp.processEvents()
+        time.sleep(0.002)
+
+class GatedS3(FakeS3):
+    """上传在 gate 打开前阻塞，并按开始顺序记录对象键"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.gate = threading.Event()
+        self.started = []
+
+    def upload_file(self, Filename, Bucket, Key, **kwargs):
+        self.started.append(Key)
+        self.gate.wait(10)
+        super().upload_file(Filename, Bucket, Key, **kwargs)
+
+class SpyStore(TransferStore):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.flushes = []
+
+    def set_states(self, states):
+        self.flushes.append(len(states))
+        super().set_states(states)
+
+def make_queue(store, **kwargs):
+    queue = TransferQueue(TransferTelemetry(), store, **kwargs)
+    finished = []
+    results = []
+    queue.batch_finished.connect(finished.append)
+    queue.files_finished.connect(results.append)
+    return queue, finished, results
+
+def upload_tasks(tmp_path, batch, s3, names):
+    tasks = []
+    for name in names:
+        path = tmp_path / name
+        path.write_bytes(name.encode())
+        tasks.append(TransferTask(batch, s3, str(path), name, path.stat().st_size))
+    return tasks
+
+def test_higher_priority_batches_run_first(qapp, tmp_path):
+    s3 = GatedS3()
+    queue, finished, _ = make_queue(TransferStore(), max_workers=1)
+    low = TransferBatch('upload', '低', 'b', 'bucket', priority=0)
+    high = TransferBatch('upload', '高', 'b', 'bucket', priority=1)
+    later = TransferBatch('upload', '调高', 'b', 'bucket', priority=0)
+    queue.submit_batch(low, upload_tasks(tmp_path, low, s3, ['low0', 'low1', 'low2']))
+    queue.submit_batch(high, upload_tasks(tmp_path, high, s3, ['high0', 'high1']))
+    queue.submit_batch(later, upload_tasks(tmp_path, later, s3, ['later0']))
+    queue.set_priority(later, 2)
+    s3.gate.set()
+    wait_until(qapp, lambda: len(finished) == 3)
+    # 第一个任务在提交时已开始，其余按优先级、相同优先级按加入顺序执行
+    assert s3.started == ['low0', 'later0', 'high0', 'high1', 'low1', 'low2']
+    assert [batch.completed_files for batch in (low, high, later)] == [3, 2, 1]
+    queue.shutdown()
+
+def test_copy_and_delete_tasks_are_grouped(qapp):
+    keys = [f'src/{i:05}' for i in range(2500)]
+    s3 = FakeS3(keys + [f'old/{i:05}' for i in range(4500)])
+    queue, finished, _ = make_queue(TransferStore(), max_workers=2, delete_concurrency=4)
+
+    move = TransferBatch('copy', '移动', 'b', 'bucket', options={'delete_source': True})
+    queue.submit_batch(move, [TransferTask(move, s3, key, 'dst/' + key[4:], 1) for key in keys])
+    wait_until(qapp, lambda: finished == [move])
+    assert move.completed_files == 2500 and not move.failed_files
+    assert s3.calls['copy_object'] == 2500
+    # 每组 DELETE_BATCH_SIZE 个复制任务，复制完成后用一次 delete_objects 删除源对象
+    assert s3.deleted_batches == [DELETE_BATCH_SIZE, DELETE_BATCH_SIZE, 500]
+    assert not any(key.startswith('src/') for key in s3.keys)
+
+    s3.deleted_batches.clear()
+    delete = TransferBatch('delete', '删除', 'b', 'bucket')
+    queue.submit_batch(delete, [TransferTask(delete, s3, f'old/{i:05}') for i in range(4500)])
+    wait_until(qapp, lambda: finished == [move, delete])
+    assert delete.completed_files == 4500
+    assert sorted(s3.deleted_batches) == [500] + [DELETE_BATCH_SIZE] * 4
+    assert s3.keys == sorted('dst/' + key[4:] for key in keys)
+    queue.shutdown()
+
+def test_results_are_flushed_in_batches(qapp):
+    s3 = FakeS3([f'k{i:03}' for i in range(300)])
+    store = SpyStore()
+    queue, finished, results = make_queue(store, max_workers=4, delete_concurrency=1)
+    batch = TransferBatch('delete', '删除', 'b', 'bucket')
+    batch.sealed = False
+    queue.submit_batch(batch, [TransferTask(batch, s3, f'k{i:03}') for i in range(300)])
+
+    # 批次尚未结束时由定时器写入，一次写入一组任务的结果
+    wait_until(qapp, lambda: store.flushes)
+    assert store.flushes == [300]
+    assert [len(group) for group in results] == [300]
+    assert all(success for _, success, _ in results[0])
+    assert finished == []
+
+    queue.seal_batch(batch)
+    assert finished == [batch]
+    assert store.unfinished_batches() == []
+    queue.shutdown()
+
+def test_unfinished_tasks_are_restored_after_restart(qapp, tmp_path):
+    db_path = str(tmp_path / 'transfers.db')
+    store = TransferStore(db_path)
+    s3 = GatedS3()
+    queue, _, results = make_queue(store, max_workers=1)
+    batch = TransferBatch('upload', '上传', 'b', 'bucket', priority=3)
+    tasks = upload_tasks(tmp_path, batch, s3, [f'f{i}' for i in range(5)])
+    s3.gate.set()
+    first_done = threading.Event()
+
+    def upload_first_only(Filename, Bucket, Key, **kwargs):
+        # 第一个文件完成后，其余上传一直阻塞到退出
+        GatedS3.upload_file(s3, Filename, Bucket, Key, **kwargs)
+        first_done.set()
+        s3.gate.clear()
+
+    s3.upload_file = upload_first_only
+    queue.submit_batch(batch, tasks)
+    wait_until(qapp, lambda: first_done.is_set() and queue.running_tasks == {tasks[1]})
+    queue.shutdown()
+    s3.gate.set()
+    store.close()
+
+    store = TransferStore(db_path)
+    [record] = store.unfinished_batches()
+    assert record['counts'] == {'done': 1, 'pending': 4}
+    assert record['priority'] == 3
+    assert [dest for _, _, dest, _, _ in record['jobs']] == ['f1', 'f2', 'f3', 'f4']
+
+    # 与启动时一样按记录重建批次和任务，已有编号的任务不会重复写入
+    restored = TransferBatch(record['kind'], record['label'], record['bucket_id'], record['bucket_name'],
+                             record['priority'], record['options'])
+    restored.batch_id = record['batch_id']
+    restored.completed_files = restored.total_files = restored.finished_files = record['counts']['done']
+    new_s3 = FakeS3()
+    restored_tasks = []
+    for job_id, source, dest, size, etag in record['jobs']:
+        task = TransferTask(restored, new_s3, source, dest, size, etag)
+        task.job_id = job_id
+        restored_tasks.append(task)
+    queue, finished, _ = make_queue(store, max_workers=2)
+    queue.submit_batch(restored, restored_tasks)
+    wait_until(qapp, lambda: finished == [restored])
+    assert new_s3.keys == ['f1', 'f2', 'f3', 'f4']
+    assert restored.completed_files == restored.total_files == 5
+    assert store.unfinished_batches() == []
+    assert store.conn.execute("SELECT COUNT(*) FROM transfer_jobs").fetchone() == (0,)
+    queue.shutdown()
+    store.close()